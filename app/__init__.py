@@ -27,7 +27,94 @@ def create_app(config_class=None):
         SQLALCHEMY_TRACK_MODIFICATIONS=False,
         # Add other configurations here
         UPLOAD_FOLDER=os.path.join(app.root_path, '..', 'data', 'student_images'), # For student images
-        ALLOWED_EXTENSIONS={'png', 'jpg', 'jpeg'}
+        ALLOWED_EXTENSIONS={'png', 'jpg', 'jpeg'},
+        # Approximate nearest-neighbour face index (built offline with `flask build-face-index`)
+        FACE_INDEX_PATH=os.path.join(app.instance_path, 'face_index.npz'),
+        FACE_INDEX_N_PROBE=8, # Lists scanned per face; raise for recall, lower for latency
+        FACE_INDEX_MIN_GALLERY_SIZE=20000, # Smaller galleries are matched exactly
+        # Memory-mapped embedding snapshot (written by `flask export-embeddings`)
+        FACE_SNAPSHOT_PATH=os.path.join(app.instance_path, 'face_snapshot.npy'),
+        # Publish the face cache to POSIX shared memory so all workers map one copy and see each
+        # other's refreshes. The segment name defaults to one derived from the database URI.
+        FACE_GALLERY_SHARED_MEMORY=True,
+        FACE_GALLERY_SHM_NAME=None,
+        # Exam registrations can be edited in any worker; running streams re-read them this often
+        EXAM_REGISTRATION_REFRESH_SECONDS=5.0,
+        # Multi-frame face tracking: identities are carried across frames between re-encodes
+        FACE_TRACK_IOU_THRESHOLD=0.3,
+        FACE_TRACK_REVERIFY_SECONDS=5.0, # Re-encode confidently identified faces this often
+        FACE_TRACK_UNCERTAIN_REVERIFY_SECONDS=0.5, # Re-encode unknown / borderline faces this often
+        FACE_TRACK_MAX_MISSED_FRAMES=3,
+        # Face detection runs on a frame downscaled by this factor (boxes are mapped back and faces are
+        # encoded from the full-resolution frame). 1.0 detects on the full frame.
+        FACE_DETECTION_SCALE=0.5,
+        # Optional per-camera detection region: {camera_index: (left, top, right, bottom)} as fractions
+        # of the frame, e.g. {0: (0.3, 0.0, 0.7, 1.0)} to only look at a doorway in the middle.
+        FACE_DETECTION_ROIS={},
+        # Adaptive recognition cadence: recognition runs every N frames, with N chosen from the
+        # measured recognition latency so the video stream holds RECOGNITION_TARGET_FPS.
+        RECOGNITION_TARGET_FPS=10.0,
+        RECOGNITION_MAX_INTERVAL=30,
+        # Motion gate: on a static scene with no active face tracks, detection is skipped. A frame
+        # counts as changed when MOTION_AREA_THRESHOLD of its (downscaled) pixels changed by more
+        # than MOTION_PIXEL_THRESHOLD grey levels; detection still runs every MOTION_MAX_IDLE_SECONDS.
+        MOTION_GATE_ENABLED=True,
+        MOTION_PIXEL_THRESHOLD=25,
+        MOTION_AREA_THRESHOLD=0.01,
+        MOTION_MAX_IDLE_SECONDS=10.0,
+        # Frames buffered per viewer of a shared exam stream; slower viewers drop their oldest frames
+        STREAM_VIEWER_QUEUE_SIZE=2,
+        # Per-viewer stream profiles, picked with /video_feed/<exam_id>?profile=<name>. max_fps and
+        # max_width of None mean no limit; quality None keeps the stream's own encode (quality 70, or
+        # the camera's JPEG in client overlay mode). Viewers on the same profile share one encode per frame.
+        STREAM_PROFILES={
+            'full': {'max_fps': None, 'max_width': None, 'quality': None},
+            'medium': {'max_fps': 10, 'max_width': 640, 'quality': 60},
+            'low': {'max_fps': 5, 'max_width': 320, 'quality': 45}
+        },
+        STREAM_DEFAULT_PROFILE='full',
+        # Recognition worker processes (detection + encoding off the streaming thread). None uses one
+        # per CPU core; 0 runs recognition inline in the stream as before. Frames waiting for a free
+        # worker are limited to RECOGNITION_QUEUE_SIZE, dropping the oldest.
+        RECOGNITION_WORKERS=None,
+        RECOGNITION_QUEUE_SIZE=2,
+        # Unix socket of the recognition daemon (`flask recognition-daemon`). When set, web workers do
+        # not open the camera: /video_feed and the status endpoints read the daemon's shared memory.
+        RECOGNITION_DAEMON_SOCKET=os.environ.get('RECOGNITION_DAEMON_SOCKET'),
+        RECOGNITION_DAEMON_LEASE_SECONDS=15.0, # Viewers not renewed for this long are dropped
+        RECOGNITION_DAEMON_RING_SLOTS=4,
+        RECOGNITION_DAEMON_RING_SLOT_BYTES=1024 * 1024, # Largest encoded frame a ring slot can hold
+        # Attendance logs are written by a background thread in batches: when LOG_WRITER_BATCH_SIZE rows
+        # are waiting or the oldest has waited LOG_WRITER_FLUSH_SECONDS. Recognition blocks only while
+        # LOG_WRITER_QUEUE_SIZE rows are already waiting.
+        LOG_WRITER_BATCH_SIZE=50,
+        LOG_WRITER_FLUSH_SECONDS=1.0,
+        LOG_WRITER_QUEUE_SIZE=1000,
+        # Sightings of a student with the same status within one LOG_DEDUP_BUCKET_SECONDS window are
+        # merged into a single Log row (seen_count / last_seen) by a unique key in the database.
+        LOG_DEDUP_BUCKET_SECONDS=60,
+        # Live recognition statuses are kept on a shared memory board so any web worker can answer
+        # /live_auth_status; RECOGNITION_STATUS_BOARD_SLOTS exams can have a live status at once.
+        RECOGNITION_STATUS_SHARED_MEMORY=True,
+        RECOGNITION_STATUS_BOARD_SLOTS=256,
+        # 'server' draws face boxes into the video and re-encodes every frame; 'client' streams the
+        # camera's frames as they are (its own JPEGs when it delivers MJPG) and live_auth.html draws
+        # the boxes on a canvas from the face metadata pushed on /live_auth_events.
+        LIVE_AUTH_OVERLAY_MODE='server',
+        # Browser camera entry points (/ingest_camera/<exam_id>) post JPEG frames to /ingest_frame. Frames
+        # are decoded on INGEST_DECODE_THREADS threads and recognized in batches of up to INGEST_MAX_BATCH,
+        # waiting at most INGEST_BATCH_WAIT_SECONDS for a batch to fill (on RECOGNITION_WORKERS when set).
+        # Posts beyond INGEST_MAX_PENDING unanswered frames are refused with 503.
+        INGEST_DECODE_THREADS=4,
+        INGEST_MAX_BATCH=12,
+        INGEST_BATCH_WAIT_SECONDS=0.02,
+        INGEST_MAX_PENDING=48,
+        INGEST_MAX_FRAME_BYTES=2 * 1024 * 1024,
+        INGEST_RESULT_TIMEOUT_SECONDS=10.0,
+        INGEST_CLIENT_TTL_SECONDS=60.0, # Face tracks of an entry point that stopped posting are dropped after this
+        # Frame rate and JPEG quality (0-1) the entry point page captures and posts at
+        INGEST_CLIENT_FPS=4.0,
+        INGEST_CLIENT_JPEG_QUALITY=0.7
     )
 
     if config_class:
@@ -0,0 +1,296 @@
+# app/attendance_log.py
+
+import queue
+import time
+import atexit
+import calendar
+import threading
+from sqlalchemy import insert, case
+from sqlalchemy.dialects import sqlite, postgresql, mysql
+from app import db
+from app.models import Log
+
+DEFAULT_BATCH_SIZE = 50 # Flush as soon as this many log rows are waiting
+DEFAULT_FLUSH_SECONDS = 1.0 # ...or when the oldest waiting row is this old
+DEFAULT_QUEUE_SIZE = 1000 # Rows buffered before enqueue() starts blocking the caller (backpressure)
+MAX_FLUSH_ATTEMPTS = 4 # A row whose batch failed this many times is retried on its own, then dropped
+RETRY_BACKOFF_SECONDS = 1.0 # Wait before retrying a failed batch, doubled after every further failure
+MAX_RETRY_BACKOFF_SECONDS = 30.0
+DEFAULT_BUCKET_SECONDS = 60 # Sightings of a student with the same status within one bucket share a Log row
+_DEDUP_KEY = ("exam_id", "student_id", "status", "bucket") # Columns of uq_log_exam_student_status_bucket
+_STOP = object() # Queue sentinel asking the writer thread to drain and exit
+
+
+class AttendanceLogWriter:
+    """
+    Writes attendance Log rows from a background thread in bulk.
+
+    The recognition loop only puts plain row dicts on a bounded queue; the writer thread inserts
+    them with one multi-row INSERT and one commit per batch, flushing when `batch_size` rows are
+    waiting or the oldest has waited `flush_seconds`. On SQLite this turns one fsync per recognized
+    face into one per batch, so a class walking in together no longer stalls the video.
+
+    Rows are upserted on the Log table's unique (exam, student, status, bucket) key: a repeated
+    sighting within the same `bucket_seconds` window bumps the existing row's seen_count and
+    last_seen instead of adding a row. The database enforces this, so it holds across processes,
+    restarts and the recognition daemon, not just within this process's cooldown cache.
+
+    When the queue is full, enqueue() blocks until the writer catches up: rows are never dropped
+    for lack of space, and the time callers spent blocked is reported as backpressure. `stop()`
+    (registered with atexit) drains and flushes everything still queued.
+
+    A batch that fails (e.g. the database is locked) is set aside and retried with exponential
+    backoff, while new rows keep being written in their own batches. Attempts are counted per row;
+    once a row has failed MAX_FLUSH_ATTEMPTS times it is written on its own, so a single bad row
+    (say, of a student deleted meanwhile) is the only one dropped.
+    """
+
+    def __init__(self, app, batch_size=DEFAULT_BATCH_SIZE, flush_seconds=DEFAULT_FLUSH_SECONDS,
+                 queue_size=DEFAULT_QUEUE_SIZE, bucket_seconds=DEFAULT_BUCKET_SECONDS):
+        self.app = app
+        self.batch_size = batch_size
+        self.bucket_seconds = bucket_seconds
+        self.flush_seconds = flush_seconds
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "enqueued": 0, "written": 0, "merged": 0, "batches": 0, "failed_batches": 0, "dropped": 0,
+            "max_queue_depth": 0, "backpressure_waits": 0, "backpressure_seconds": 0.0,
+            "last_flush_ms": None, "max_flush_ms": 0.0, "avg_flush_ms": None
+        }
+        self._retry = [] # [(row, failed attempts)] waiting for their next retry
+        self._retry_delay = RETRY_BACKOFF_SECONDS
+        self._retry_due = None # Monotonic time of the next retry
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="attendance-log-writer", daemon=True)
+        self._thread.start()
+
+    def enqueue(self, student_id, exam_id, timestamp, status):
+        """Queues one Log row. Blocks (and records backpressure) only while the queue is full."""
+        row = {"student_id": student_id, "exam_id": exam_id, "timestamp": timestamp, "status": status,
+               "bucket": attendance_bucket(timestamp, self.bucket_seconds), "seen_count": 1, "last_seen": timestamp}
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            waited_from = time.monotonic()
+            self._queue.put(row)
+            with self._stats_lock:
+                self._stats["backpressure_waits"] += 1
+                self._stats["backpressure_seconds"] += time.monotonic() - waited_from
+        with self._stats_lock:
+            self._stats["enqueued"] += 1
+            self._stats["max_queue_depth"] = max(self._stats["max_queue_depth"], self._queue.qsize())
+
+    def flush(self, timeout=5.0):
+        """
+        Writes everything queued so far and waits for it (e.g. before deleting an exam's logs).
+        Returns True if the flush completed within `timeout`.
+        """
+        if self._stopped:
+            return True
+        done = threading.Event()
+        self._queue.put(done) # Reached by the writer only after every row queued before it
+        return done.wait(timeout)
+
+    def stop(self, timeout=10.0):
+        """Drains the queue, writes the remaining rows and stops the writer thread."""
+        if self._stopped:
+            return
+        self._stopped = True
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+
+    def stats(self):
+        """Counters plus the current queue depth, for the pipeline stats endpoint and logs."""
+        with self._stats_lock:
+            return dict(self._stats, queue_depth=self._queue.qsize(), retry_rows=len(self._retry))
+
+    def _run(self):
+        batch = []
+        batch_started = None
+        stopping = False
+        while not stopping:
+            deadlines = []
+            if batch:
+                deadlines.append(batch_started + self.flush_seconds)
+            if self._retry:
+                deadlines.append(self._retry_due)
+            timeout = max(0.0, min(deadlines) - time.monotonic()) if deadlines else None
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None # Time threshold reached
+            flush_done = None
+            if item is _STOP:
+                stopping = True
+            elif isinstance(item, threading.Event):
+                flush_done = item
+            elif item is not None:
+                if not batch:
+                    batch_started = time.monotonic()
+                batch.append(item)
+            if batch and (stopping or flush_done or len(batch) >= self.batch_size
+                          or time.monotonic() - batch_started >= self.flush_seconds):
+                if not self._write(batch):
+                    self._schedule_retry([(row, 1) for row in batch])
+                batch = []
+                batch_started = None
+            if self._retry and time.monotonic() >= self._retry_due:
+                self._write_retry() # On its own schedule: flush() does not cut the backoff short
+            if flush_done is not None:
+                flush_done.set() # Even if the batch failed: flush() callers only wait for an attempt
+        if self._retry:
+            # Last chance while stopping: whatever can still be written is written row by row
+            self._write_rows_individually([row for row, _ in self._retry])
+            self._retry = []
+
+    def _write(self, batch):
+        """Upserts a batch in one statement and commits. Returns True if the batch was written."""
+        started = time.monotonic()
+        rows = merge_log_rows(batch)
+        with self.app.app_context():
+            try:
+                db.session.execute(upsert_log_statement(db.engine.dialect.name), rows)
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                with self._stats_lock:
+                    self._stats["failed_batches"] += 1
+                self.app.logger.warning(f"Attendance log batch of {len(batch)} rows failed, will retry: {e}")
+                return False
+        elapsed_ms = (time.monotonic() - started) * 1000.0
+        with self._stats_lock:
+            self._stats["written"] += len(batch)
+            self._stats["merged"] += len(batch) - len(rows) # Duplicates folded together before reaching the database
+            self._stats["batches"] += 1
+            self._stats["last_flush_ms"] = round(elapsed_ms, 2)
+            self._stats["max_flush_ms"] = round(max(self._stats["max_flush_ms"], elapsed_ms), 2)
+            previous = self._stats["avg_flush_ms"]
+            self._stats["avg_flush_ms"] = round(elapsed_ms if previous is None else 0.8 * previous + 0.2 * elapsed_ms, 2)
+        return True
+
+    def _schedule_retry(self, entries):
+        """Sets failed rows aside; the first retry is due after the current backoff."""
+        if not self._retry:
+            self._retry_due = time.monotonic() + self._retry_delay
+        self._retry.extend(entries)
+
+    def _write_retry(self):
+        """Retries the rows set aside, backing off further (and isolating exhausted rows) on failure."""
+        entries, self._retry = self._retry, []
+        if self._write([row for row, _ in entries]):
+            self._retry_delay = RETRY_BACKOFF_SECONDS
+            return
+        entries = [(row, attempts + 1) for row, attempts in entries]
+        exhausted = [row for row, attempts in entries if attempts >= MAX_FLUSH_ATTEMPTS]
+        self._retry_delay = min(self._retry_delay * 2, MAX_RETRY_BACKOFF_SECONDS)
+        self._schedule_retry([(row, attempts) for row, attempts in entries if attempts < MAX_FLUSH_ATTEMPTS])
+        if exhausted:
+            self._write_rows_individually(exhausted)
+
+    def _write_rows_individually(self, batch):
+        """Writes rows one statement and commit each, dropping only those that still fail."""
+        with self.app.app_context():
+            for row in merge_log_rows(batch):
+                try:
+                    db.session.execute(upsert_log_statement(db.engine.dialect.name), [row])
+                    db.session.commit()
+                except Exception as e:
+                    db.session.rollback()
+                    with self._stats_lock:
+                        self._stats["dropped"] += row["seen_count"]
+                    self.app.logger.error(f"Dropping attendance log row (student {row['student_id']}, exam {row['exam_id']}, "
+                                          f"status {row['status']}) that cannot be written: {e}")
+                    continue
+                with self._stats_lock:
+                    self._stats["written"] += row["seen_count"]
+
+
+def attendance_bucket(timestamp, bucket_seconds=DEFAULT_BUCKET_SECONDS):
+    """Dedup bucket of a (naive UTC) timestamp: whole `bucket_seconds` windows since the epoch."""
+    return calendar.timegm(timestamp.utctimetuple()) // max(1, int(bucket_seconds))
+
+
+def merge_log_rows(batch):
+    """
+    Folds rows of a batch that share a dedup key into one (summed seen_count, first timestamp,
+    latest last_seen). A single upsert statement must not touch the same key twice.
+    """
+    merged = {}
+    for row in batch:
+        key = tuple(row[column] for column in _DEDUP_KEY)
+        existing = merged.get(key)
+        if existing is None:
+            merged[key] = dict(row)
+        else:
+            existing["seen_count"] += row["seen_count"]
+            existing["timestamp"] = min(existing["timestamp"], row["timestamp"])
+            existing["last_seen"] = max(existing["last_seen"], row["last_seen"])
+    return list(merged.values())
+
+
+def upsert_log_statement(dialect_name):
+    """
+    INSERT for Log rows that, on a dedup key conflict, adds to seen_count and advances last_seen.
+    SQLite (3.24+) and PostgreSQL use ON CONFLICT, MySQL/MariaDB ON DUPLICATE KEY UPDATE; any other
+    backend gets a plain INSERT and relies on the unique constraint failing the batch.
+    """
+    if dialect_name in ("sqlite", "postgresql"):
+        dialect_insert = sqlite.insert if dialect_name == "sqlite" else postgresql.insert
+        statement = dialect_insert(Log)
+        incoming = statement.excluded
+        return statement.on_conflict_do_update(
+            index_elements=list(_DEDUP_KEY),
+            set_={
+                "seen_count": Log.seen_count + incoming.seen_count,
+                "last_seen": case((incoming.last_seen > Log.last_seen, incoming.last_seen), else_=Log.last_seen)
+            }
+        )
+    if dialect_name in ("mysql", "mariadb"):
+        statement = mysql.insert(Log)
+        incoming = statement.inserted
+        return statement.on_duplicate_key_update(
+            seen_count=Log.seen_count + incoming.seen_count,
+            last_seen=case((incoming.last_seen > Log.last_seen, incoming.last_seen), else_=Log.last_seen)
+        )
+    return insert(Log)
+
+
+# One writer per process, created on first use by get_log_writer.
+_LOG_WRITER = {"writer": None}
+_LOG_WRITER_LOCK = threading.Lock()
+
+
+def get_log_writer(app):
+    """Returns this process's AttendanceLogWriter, starting it (configured from `app`) on first use."""
+    with _LOG_WRITER_LOCK:
+        if _LOG_WRITER["writer"] is None:
+            _LOG_WRITER["writer"] = AttendanceLogWriter(
+                app,
+                batch_size=app.config.get('LOG_WRITER_BATCH_SIZE', DEFAULT_BATCH_SIZE),
+                flush_seconds=app.config.get('LOG_WRITER_FLUSH_SECONDS', DEFAULT_FLUSH_SECONDS),
+                queue_size=app.config.get('LOG_WRITER_QUEUE_SIZE', DEFAULT_QUEUE_SIZE),
+                bucket_seconds=app.config.get('LOG_DEDUP_BUCKET_SECONDS', DEFAULT_BUCKET_SECONDS)
+            )
+        return _LOG_WRITER["writer"]
+
+
+def flush_attendance_logs():
+    """Flushes the running writer, if any. Returns True if nothing is left unwritten."""
+    writer = _LOG_WRITER["writer"]
+    return writer.flush() if writer is not None else True
+
+
+def log_writer_stats():
+    """Stats of the running writer, or None if no log has been queued in this process yet."""
+    writer = _LOG_WRITER["writer"]
+    return writer.stats() if writer is not None else None
+
+
+def _stop_log_writer():
+    writer = _LOG_WRITER["writer"]
+    if writer is not None:
+        writer.stop()
+
+
+atexit.register(_stop_log_writer) # A clean exit writes every queued row
@@ -0,0 +1,138 @@
+# app/camera_capture.py
+
+import threading
+import time
+import cv2
+
+DEFAULT_READ_TIMEOUT_SECONDS = 2.0 # How long a consumer waits for a new frame before giving up
+MAX_CONSECUTIVE_READ_FAILURES = 10 # The capture thread stops after this many failed grabs in a row
+
+
+class LatestFrameCapture:
+    """
+    Owns a cv2.VideoCapture and reads it continuously on a background thread, overwriting a single
+    latest-frame slot. Consumers always get the freshest frame; frames nobody asked for in time are
+    simply dropped instead of queueing up in the OpenCV/V4L2 buffer, so slow recognition no longer
+    turns into seconds of display lag.
+
+    Every captured frame gets an increasing sequence number. `read(after_seq)` blocks until a frame
+    newer than `after_seq` is available, so a consumer never processes the same frame twice.
+
+    With `jpeg_passthrough`, the camera is asked for MJPG without conversion; when the backend
+    honours that, each frame's original JPEG is kept next to the decoded frame (`read_with_jpeg`)
+    so a stream that does not draw on the frame can send it on without re-encoding. Backends that
+    ignore the request keep delivering decoded frames and the JPEG is None.
+    """
+
+    def __init__(self, capture, logger_instance=None, jpeg_passthrough=False):
+        self._capture = capture
+        self._logger = logger_instance
+        self._condition = threading.Condition()
+        self._frame = None
+        self._jpeg = None # Camera-encoded JPEG of self._frame, in passthrough mode
+        self._seq = 0
+        self._consumed_seq = 0
+        self._running = True
+        self.failed = False # Set once the camera stops delivering frames
+        # Counters for judging how many frames the consumers could not keep up with
+        self.stats = {"captured": 0, "dropped": 0, "passthrough": 0}
+        try:
+            # Keep the driver-side queue as short as possible; the slot below is the real buffer
+            self._capture.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        except Exception:
+            pass # Not every backend supports it
+        if jpeg_passthrough:
+            try:
+                self._capture.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*"MJPG"))
+                self._capture.set(cv2.CAP_PROP_CONVERT_RGB, 0) # V4L2 then returns the raw MJPG buffer
+            except Exception:
+                pass
+        self._thread = threading.Thread(target=self._run, name="camera-capture", daemon=True)
+        self._thread.start()
+
+    def _log(self, level, message):
+        if self._logger:
+            getattr(self._logger, level)(message)
+        else:
+            print(message)
+
+    def _run(self):
+        failures = 0
+        try:
+            while self._running:
+                success, frame = self._capture.read()
+                jpeg = None
+                if success and frame.ndim < 3 and frame.size > 2 and frame.flat[0] == 0xFF and frame.flat[1] == 0xD8:
+                    # Undecoded MJPG buffer (1 x N bytes): keep it for passthrough, decode for recognition
+                    jpeg = frame.reshape(-1) # A view: the capture returns a new buffer per read, so no copy is needed
+                    frame = cv2.imdecode(jpeg, cv2.IMREAD_COLOR)
+                    success = frame is not None # A corrupt JPEG from the camera counts as a failed grab
+                if not success:
+                    failures += 1
+                    if failures >= MAX_CONSECUTIVE_READ_FAILURES:
+                        self._log("warning", "Camera capture thread: too many failed grabs, stopping.")
+                        break
+                    time.sleep(0.05)
+                    continue
+                failures = 0
+                with self._condition:
+                    if self._seq > self._consumed_seq:
+                        self.stats["dropped"] += 1 # Previous frame was overwritten before anyone read it
+                    self._frame = frame
+                    if jpeg is not None:
+                        jpeg.flags.writeable = False
+                    self._jpeg = jpeg
+                    if jpeg is not None:
+                        self.stats["passthrough"] += 1
+                    self._seq += 1
+                    self.stats["captured"] += 1
+                    self._condition.notify_all()
+        except Exception as e:
+            self._log("error", f"Camera capture thread: reading the camera failed, stopping: {e}")
+        finally:
+            # However the thread ends, consumers must see the failure instead of timing out on every read
+            with self._condition:
+                self.failed = True
+                self._condition.notify_all()
+
+    def isOpened(self):
+        """Mirrors cv2.VideoCapture.isOpened(): True while frames are being delivered."""
+        return self._running and not self.failed
+
+    def read(self, after_seq=0, timeout=DEFAULT_READ_TIMEOUT_SECONDS):
+        """
+        Returns the latest frame once one newer than `after_seq` has been captured.
+
+        Args:
+            after_seq (int): Sequence number of the last frame the caller processed.
+            timeout (float): Seconds to wait for a new frame.
+
+        Returns:
+            tuple: (success, frame, seq). `frame` must be treated as read-only because other
+                   consumers may hold the same array.
+        """
+        success, frame, _, seq = self.read_with_jpeg(after_seq, timeout)
+        return success, frame, seq
+
+    def read_with_jpeg(self, after_seq=0, timeout=DEFAULT_READ_TIMEOUT_SECONDS):
+        """
+        Like read(), plus the camera's own JPEG of the frame: (success, frame, jpeg or None, seq).
+        The JPEG is a read-only uint8 array (any bytes-like consumer such as multipart_chunk accepts it).
+        """
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._seq > after_seq or self.failed or not self._running,
+                                            timeout=timeout):
+                return False, None, None, after_seq
+            if self._seq <= after_seq:
+                return False, None, None, after_seq # Stopped or failed without a new frame
+            self._consumed_seq = self._seq
+            return True, self._frame, self._jpeg, self._seq
+
+    def release(self):
+        """Stops the capture thread and releases the underlying camera."""
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        if self._thread is not threading.current_thread():
+            self._thread.join(timeout=DEFAULT_READ_TIMEOUT_SECONDS)
+        self._capture.release()
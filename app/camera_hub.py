@@ -0,0 +1,210 @@
+# app/camera_hub.py
+
+import time
+import queue
+import threading
+from app.stream_profiles import StreamProfile, DEFAULT_PROFILE_NAME
+
+DEFAULT_SUBSCRIBER_QUEUE_SIZE = 2 # Frames buffered per viewer; a slow viewer drops its oldest frames
+SUBSCRIBER_POLL_SECONDS = 1.0 # How often a waiting viewer re-checks whether the hub is still running
+THROTTLE_SLACK = 0.25 # Fraction of a throttled viewer's frame interval a frame may arrive early and still be sent
+_END_OF_STREAM = None # Sentinel published to every subscriber when the producer finishes
+_DEFAULT_RENDER_PROFILE = StreamProfile(DEFAULT_PROFILE_NAME, None, None, None) # Viewers subscribed without a profile
+
+
+class _Subscriber:
+    """One viewer of a hub: its frame queue, stream profile and counters."""
+
+    def __init__(self, queue_size, profile):
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.profile = profile
+        self.next_due = 0.0 # Monotonic time the next frame is due for a frame-rate limited viewer
+        self.stats = {"sent": 0, "dropped": 0, "throttled": 0}
+
+
+class FrameHub:
+    """
+    Broadcasts the output of one frame producer to any number of viewers.
+
+    The producer (a generator yielding ready-to-send stream chunks) runs once, on its own thread,
+    no matter how many viewers are attached, so capture, recognition and JPEG encoding happen once
+    per frame. Each viewer gets a small bounded queue; when a viewer falls behind, its oldest frames
+    are dropped instead of slowing down the producer or the other viewers.
+
+    Viewers may subscribe with a StreamProfile. The producer then yields StreamFrame objects and
+    each viewer's frames() encodes the variant its profile asks for (maximum width, JPEG quality),
+    shared with every other viewer of the same variant. A profile's max_fps is enforced here: frames
+    arriving sooner than the viewer's frame interval are not queued for it at all. Plain bytes
+    chunks (e.g. an error frame) are sent to every viewer as they are.
+
+    The producer is started by the first subscriber and stopped (its generator closed, so its
+    `finally` blocks release shared resources such as the camera) when the last one leaves.
+    """
+
+    def __init__(self, name, produce, on_stop=None, queue_size=DEFAULT_SUBSCRIBER_QUEUE_SIZE, logger_instance=None):
+        """
+        Args:
+            name (str): Label for logs and the thread name.
+            produce (callable): Returns the generator of chunks to broadcast.
+            on_stop (callable, optional): Called with this hub once the producer has finished.
+            queue_size (int): Per-viewer queue length.
+            logger_instance: Logger used for lifecycle messages (print is used if None).
+        """
+        self.name = name
+        self._produce = produce
+        self._on_stop = on_stop
+        self._queue_size = queue_size
+        self._logger = logger_instance
+        self._lock = threading.Lock()
+        self._subscribers = {} # {viewer_id: _Subscriber}
+        self._thread = None
+        self._running = False
+        self.stopped = False # True once the producer has finished; a new hub must be created
+        self.stats = {"frames": 0, "dropped": 0, "throttled": 0, "encodes": 0, "encode_cache_hits": 0}
+
+    def _log(self, message):
+        if self._logger:
+            self._logger.info(message)
+        else:
+            print(message)
+
+    @property
+    def viewer_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    def subscribe(self, viewer_id, profile=None):
+        """
+        Attaches a viewer, starting the producer if this is the first one.
+        `profile` (StreamProfile, optional) selects the viewer's frame rate, size and quality;
+        without one the viewer gets every frame at the stream's own encode.
+        Returns False if the hub has stopped or is stopping (the caller should create a new hub).
+        """
+        with self._lock:
+            if self.stopped or (self._thread is not None and not self._running):
+                return False # Finished, or shutting down after its last viewer left
+            self._subscribers[viewer_id] = _Subscriber(self._queue_size, profile)
+            if self._thread is None:
+                self._running = True
+                self._thread = threading.Thread(target=self._run, name=f"frame-hub-{self.name}", daemon=True)
+                self._thread.start()
+            count = len(self._subscribers)
+        profile_name = profile.name if profile is not None else "default"
+        self._log(f"Viewer {viewer_id} joined stream {self.name} with profile {profile_name} ({count} viewer(s)).")
+        return True
+
+    def unsubscribe(self, viewer_id):
+        """Detaches a viewer; the producer is stopped when no viewers remain."""
+        with self._lock:
+            subscriber = self._subscribers.pop(viewer_id, None)
+            if subscriber is None:
+                return
+            self._put_latest(subscriber, _END_OF_STREAM) # Ends the viewer's frames() if still waiting
+            if not self._subscribers:
+                self._running = False
+            count = len(self._subscribers)
+        self._log(f"Viewer {viewer_id} left stream {self.name} ({count} viewer(s)).")
+
+    def stop(self):
+        """Detaches every viewer and stops the producer."""
+        with self._lock:
+            viewer_ids = list(self._subscribers)
+        for viewer_id in viewer_ids:
+            self.unsubscribe(viewer_id)
+
+    def frames(self, viewer_id):
+        """
+        Generator of chunks for one subscribed viewer. Ends when the viewer is unsubscribed or the
+        producer finishes; closing it (e.g. the client disconnected) unsubscribes the viewer.
+        """
+        with self._lock:
+            subscriber = self._subscribers.get(viewer_id)
+        if subscriber is None:
+            return
+        try:
+            while True:
+                try:
+                    item = subscriber.queue.get(timeout=SUBSCRIBER_POLL_SECONDS)
+                except queue.Empty:
+                    if self.stopped:
+                        break
+                    continue
+                if item is _END_OF_STREAM:
+                    break
+                if isinstance(item, bytes):
+                    chunk = item
+                else:
+                    # Encoded on this viewer's thread, not the producer's; cached on the frame for the next viewer
+                    chunk, encoded = item.render(subscriber.profile or _DEFAULT_RENDER_PROFILE)
+                    with self._lock:
+                        self.stats["encodes" if encoded else "encode_cache_hits"] += 1
+                    if chunk is None:
+                        continue
+                subscriber.stats["sent"] += 1
+                yield chunk
+        finally:
+            self.unsubscribe(viewer_id)
+
+    def viewer_stats(self):
+        """Per-viewer profile name and sent / dropped / throttled frame counts."""
+        with self._lock:
+            return {
+                viewer_id: dict(subscriber.stats, profile=subscriber.profile.name if subscriber.profile else None)
+                for viewer_id, subscriber in self._subscribers.items()
+            }
+
+    def _put_latest(self, subscriber, chunk):
+        """Queues a chunk for a viewer, discarding that viewer's oldest chunk if its queue is full."""
+        while True:
+            try:
+                subscriber.queue.put_nowait(chunk)
+                return
+            except queue.Full:
+                try:
+                    subscriber.queue.get_nowait()
+                    self.stats["dropped"] += 1
+                    subscriber.stats["dropped"] += 1
+                except queue.Empty:
+                    pass # The viewer consumed it meanwhile; retry the put
+
+    def _throttled(self, subscriber, now):
+        """True if a frame-rate limited viewer is not due a frame yet (and books the frame otherwise)."""
+        max_fps = subscriber.profile.max_fps if subscriber.profile is not None else None
+        if not max_fps:
+            return False
+        interval = 1.0 / max_fps
+        if now < subscriber.next_due - THROTTLE_SLACK * interval:
+            return True
+        # Keeps to the viewer's schedule, without letting a stall turn into a burst of catch-up frames
+        subscriber.next_due = max(subscriber.next_due, now - interval) + interval
+        return False
+
+    def _run(self):
+        producer = self._produce()
+        try:
+            for chunk in producer:
+                with self._lock:
+                    if not self._running:
+                        break
+                    self.stats["frames"] += 1
+                    now = time.monotonic()
+                    for subscriber in self._subscribers.values():
+                        if self._throttled(subscriber, now):
+                            subscriber.stats["throttled"] += 1
+                            self.stats["throttled"] += 1
+                            continue
+                        self._put_latest(subscriber, chunk)
+        except Exception as e:
+            self._log(f"Stream {self.name} producer failed: {e}")
+        finally:
+            producer.close() # Runs the producer's cleanup (e.g. dropping its camera reference)
+            with self._lock:
+                self.stopped = True
+                self._running = False
+                for subscriber in self._subscribers.values():
+                    self._put_latest(subscriber, _END_OF_STREAM)
+            self._log(f"Stream {self.name} stopped after {self.stats['frames']} frames "
+                      f"({self.stats['dropped']} dropped for slow viewers, {self.stats['throttled']} throttled, "
+                      f"{self.stats['encodes']} encodes, {self.stats['encode_cache_hits']} shared).")
+            if self._on_stop:
+                self._on_stop(self)
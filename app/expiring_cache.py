@@ -0,0 +1,99 @@
+# app/expiring_cache.py
+
+import time
+import threading
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class ExpiringCache:
+    """
+    Bounded key/value store whose entries expire `ttl_seconds` after they were last set.
+
+    Every entry shares the same TTL, so the order entries were (re)written in is also the order
+    they expire in: entries live in an OrderedDict that is moved-to-end on every set, expired
+    entries are purged from the front, and when `max_entries` is reached the front entry (the one
+    closest to expiring anyway) is evicted. Sets, lookups and expiry are all O(1) (amortized), and
+    memory is capped no matter how long the process runs or how many exams it sees.
+
+    Counters for hits, misses, expirations and capacity evictions are kept for the stats endpoint.
+    Safe to use from several threads.
+    """
+
+    def __init__(self, ttl_seconds, max_entries, clock=time.monotonic):
+        """
+        Args:
+            ttl_seconds (float): Lifetime of an entry after its last set().
+            max_entries (int): Memory cap; the entry closest to expiry is evicted beyond it.
+            clock (callable): Monotonic time source (injectable for tests and simulations).
+        """
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max(1, int(max_entries))
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries = OrderedDict() # {key: (expires_at, value)}, oldest write first
+        self._stats = {"hits": 0, "misses": 0, "expired": 0, "evicted": 0}
+
+    def _purge_expired_locked(self, now):
+        while self._entries:
+            key, (expires_at, _) = next(iter(self._entries.items()))
+            if expires_at > now:
+                break
+            del self._entries[key]
+            self._stats["expired"] += 1
+
+    def set(self, key, value):
+        """Stores a value, (re)starting its TTL."""
+        with self._lock:
+            now = self._clock()
+            self._purge_expired_locked(now)
+            self._entries[key] = (now + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evicted"] += 1
+
+    def get(self, key, default=None):
+        """Returns the live value for `key`, or `default` if it is missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= self._clock():
+                del self._entries[key]
+                self._stats["expired"] += 1
+                entry = None
+            self._stats["hits" if entry is not None else "misses"] += 1
+            return entry[1] if entry is not None else default
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def pop(self, key, default=None):
+        """Removes `key` and returns its value (expired entries count as missing)."""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None or entry[0] <= self._clock():
+                return default
+            return entry[1]
+
+    def discard_where(self, predicate):
+        """Removes every entry whose key matches `predicate` (O(n); for rare bulk clears)."""
+        with self._lock:
+            for key in [key for key in self._entries if predicate(key)]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        with self._lock:
+            self._purge_expired_locked(self._clock())
+            return len(self._entries)
+
+    def stats(self):
+        """Counters plus the current size and limits."""
+        with self._lock:
+            self._purge_expired_locked(self._clock())
+            return dict(self._stats, entries=len(self._entries), max_entries=self.max_entries,
+                        ttl_seconds=self.ttl_seconds)
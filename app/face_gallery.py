@@ -0,0 +1,384 @@
+# app/face_gallery.py
+
+import os
+import json
+import time
+import numpy as np
+
+EMBEDDING_DIM = 128 # face_recognition (dlib) produces 128-d embeddings
+DEFAULT_MATCH_TOLERANCE = 0.50 # Same tolerance used by find_and_log_recognized_faces
+DEFAULT_INITIAL_CAPACITY = 256
+SNAPSHOT_FORMAT_VERSION = 1
+
+
+class FaceGallery:
+    """
+    In-memory gallery of known face embeddings.
+
+    Embeddings are stored row-wise in a preallocated, contiguous float32 matrix together with
+    their precomputed squared norms, and parallel id / name / student ID number arrays.
+    Matching all faces of a frame is a single matrix product instead of one Python-level
+    pass over a list of arrays per face.
+
+    An approximate index (see app/face_index.py) can be attached for very large galleries;
+    `match` then delegates to it once the gallery reaches the index's minimum size.
+
+    Rows can be added, updated and removed individually (`upsert` / `remove`). Every mutation
+    bumps `generation`, so derived structures (e.g. exam sub-galleries) can tell when they are stale.
+
+    The matrix can also be a read-only memory map of an exported snapshot (`load_snapshot`) or a
+    view of a gallery published in shared memory (`load_shared`); either is copied into private
+    memory only when the gallery is first modified.
+
+    A gallery is not thread-safe: mutations update several arrays one after another, and the rows
+    returned by `match` are only valid for the generation they were computed on. The process-wide
+    face cache is guarded by a lock in app/face_rec_utils.py.
+    """
+
+    def __init__(self, capacity=DEFAULT_INITIAL_CAPACITY, dim=EMBEDDING_DIM):
+        self.dim = dim
+        self.size = 0
+        self._matrix = np.zeros((max(capacity, 1), dim), dtype=np.float32)
+        self._sq_norms = np.zeros(max(capacity, 1), dtype=np.float32)
+        self._ids = np.zeros(max(capacity, 1), dtype=np.int64)
+        self.names = []
+        self.student_id_numbers = []
+        self.index = None
+        self.generation = 0
+        self._rows_by_id = {}
+        self._backing = None # Shared memory segment the arrays view (see load_shared), if any
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def capacity(self):
+        return self._matrix.shape[0]
+
+    @property
+    def embeddings(self):
+        """Read-only view of the populated rows of the embedding matrix."""
+        view = self._matrix[:self.size]
+        view.flags.writeable = False
+        return view
+
+    @property
+    def ids(self):
+        """Student primary keys, parallel to the rows of `embeddings`."""
+        return self._ids[:self.size]
+
+    @property
+    def sq_norms(self):
+        """Precomputed squared L2 norms of the populated rows."""
+        return self._sq_norms[:self.size]
+
+    def _ensure_capacity(self, required):
+        """Grows the preallocated arrays (doubling) so that `required` rows fit."""
+        if required <= self.capacity:
+            return
+        new_capacity = self.capacity
+        while new_capacity < required:
+            new_capacity *= 2
+        matrix = np.zeros((new_capacity, self.dim), dtype=np.float32)
+        matrix[:self.size] = self._matrix[:self.size]
+        sq_norms = np.zeros(new_capacity, dtype=np.float32)
+        sq_norms[:self.size] = self._sq_norms[:self.size]
+        ids = np.zeros(new_capacity, dtype=np.int64)
+        ids[:self.size] = self._ids[:self.size]
+        self._matrix, self._sq_norms, self._ids = matrix, sq_norms, ids
+
+    def _is_private(self):
+        return self._matrix.flags.writeable and self._sq_norms.flags.writeable and self._ids.flags.writeable
+
+    def _ensure_writable(self):
+        """Copies memory-mapped or shared (read-only) arrays into private memory before the first write."""
+        if self._is_private():
+            return
+        capacity = max(self.capacity, DEFAULT_INITIAL_CAPACITY)
+        matrix = np.zeros((capacity, self.dim), dtype=np.float32)
+        matrix[:self.size] = self._matrix[:self.size]
+        sq_norms = np.zeros(capacity, dtype=np.float32)
+        sq_norms[:self.size] = self._sq_norms[:self.size]
+        ids = np.zeros(capacity, dtype=np.int64)
+        ids[:self.size] = self._ids[:self.size]
+        self._matrix, self._sq_norms, self._ids = matrix, sq_norms, ids
+        self._backing = None # Released after the arrays viewing it
+
+    def clear(self):
+        """Empties the gallery while keeping the allocated buffers for reuse."""
+        if not self._is_private():
+            self._matrix = np.zeros((DEFAULT_INITIAL_CAPACITY, self.dim), dtype=np.float32) # Drop the memory map
+            self._sq_norms = np.zeros(DEFAULT_INITIAL_CAPACITY, dtype=np.float32)
+            self._ids = np.zeros(DEFAULT_INITIAL_CAPACITY, dtype=np.int64)
+            self._backing = None
+        self.size = 0
+        self.names = []
+        self.student_id_numbers = []
+        self._rows_by_id = {}
+        self.generation += 1
+
+    def row_of(self, student_id):
+        """Returns the gallery row holding `student_id`, or None if the student is not cached."""
+        return self._rows_by_id.get(student_id)
+
+    def add(self, student_id, name, student_id_number, embedding):
+        """
+        Appends one known face to the gallery.
+        Returns the row index the face was stored at.
+        """
+        self._ensure_writable()
+        self._ensure_capacity(self.size + 1)
+        row = self.size
+        self._matrix[row] = np.asarray(embedding, dtype=np.float32).reshape(self.dim)
+        self._sq_norms[row] = np.dot(self._matrix[row], self._matrix[row])
+        self._ids[row] = student_id
+        self.names.append(name)
+        self.student_id_numbers.append(student_id_number)
+        self._rows_by_id[student_id] = row
+        self.size += 1
+        self.generation += 1
+        if self.index is not None:
+            self.index.assign_row(self, row)
+        return row
+
+    def upsert(self, student_id, name, student_id_number, embedding):
+        """
+        Adds a student's face, or overwrites it in place if the student is already cached.
+        Returns the row index the face is stored at.
+        """
+        row = self._rows_by_id.get(student_id)
+        if row is None:
+            return self.add(student_id, name, student_id_number, embedding)
+        vector = np.asarray(embedding, dtype=np.float32).reshape(self.dim)
+        if (self.names[row] == name and self.student_id_numbers[row] == student_id_number
+                and np.array_equal(self._matrix[row], vector)):
+            return row # Unchanged; avoids a generation bump (and copying a memory-mapped matrix)
+        self._ensure_writable()
+        self._matrix[row] = vector
+        self._sq_norms[row] = np.dot(self._matrix[row], self._matrix[row])
+        self.names[row] = name
+        self.student_id_numbers[row] = student_id_number
+        self.generation += 1
+        if self.index is not None:
+            self.index.assign_row(self, row)
+        return row
+
+    def remove(self, student_id):
+        """
+        Removes a student's face by moving the last row into its slot (O(1), keeps rows contiguous).
+        Returns True if the student was cached.
+        """
+        row = self._rows_by_id.pop(student_id, None)
+        if row is None:
+            return False
+        last = self.size - 1
+        if row != last:
+            self._ensure_writable()
+            self._matrix[row] = self._matrix[last]
+            self._sq_norms[row] = self._sq_norms[last]
+            self._ids[row] = self._ids[last]
+            self.names[row] = self.names[last]
+            self.student_id_numbers[row] = self.student_id_numbers[last]
+            self._rows_by_id[int(self._ids[row])] = row
+            if self.index is not None:
+                self.index.move_row(last, row)
+        self.names.pop()
+        self.student_id_numbers.pop()
+        self.size -= 1
+        self.generation += 1
+        if self.index is not None:
+            self.index.invalidate()
+        return True
+
+    def load(self, rows):
+        """
+        Replaces the gallery contents.
+        Args:
+            rows: Sequence of (student_id, name, student_id_number, embedding) tuples.
+        Returns:
+            The number of faces loaded.
+        """
+        self.clear()
+        self._ensure_capacity(len(rows))
+        for student_id, name, student_id_number, embedding in rows:
+            self._matrix[self.size] = np.asarray(embedding, dtype=np.float32).reshape(self.dim)
+            self._ids[self.size] = student_id
+            self.names.append(name)
+            self.student_id_numbers.append(student_id_number)
+            self._rows_by_id[student_id] = self.size
+            self.size += 1
+        populated = self._matrix[:self.size]
+        np.einsum('ij,ij->i', populated, populated, out=self._sq_norms[:self.size])
+        if self.index is not None:
+            self.index.assign_all(self)
+        return self.size
+
+    def load_snapshot(self, path):
+        """
+        Replaces the gallery contents with a snapshot written by `write_snapshot`. The embedding
+        matrix is memory-mapped read-only, so loading costs milliseconds and every process that
+        maps the same file shares one copy in the OS page cache.
+        Returns the snapshot metadata dict (including 'exported_until'), or None if the snapshot
+        is missing or inconsistent.
+        """
+        meta_path = snapshot_meta_path(path)
+        if not os.path.exists(path) or not os.path.exists(meta_path):
+            return None
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        matrix = np.load(path, mmap_mode='r')
+        if (meta.get('version') != SNAPSHOT_FORMAT_VERSION or matrix.dtype != np.float32
+                or matrix.shape != (meta['count'], self.dim)):
+            return None # Half-written or foreign snapshot; caller falls back to the database
+
+        count = meta['count']
+        self._matrix = matrix
+        self._sq_norms = np.empty(max(count, 1), dtype=np.float32)
+        np.einsum('ij,ij->i', matrix, matrix, out=self._sq_norms[:count])
+        self._ids = np.zeros(max(count, 1), dtype=np.int64)
+        self._ids[:count] = meta['ids']
+        self._backing = None
+        self.names = list(meta['names'])
+        self.student_id_numbers = list(meta['student_id_numbers'])
+        self._rows_by_id = {student_id: row for row, student_id in enumerate(meta['ids'])}
+        self.size = count
+        self.generation += 1
+        if self.index is not None:
+            self.index.assign_all(self)
+        return meta
+
+    def load_shared(self, ids, embeddings, sq_norms, names, student_id_numbers, backing=None):
+        """
+        Replaces the gallery contents with read-only arrays owned by someone else, typically views
+        of a generation published in shared memory (see app/shared_gallery.py). Nothing is copied;
+        `backing` (the segment) is kept alive for as long as the gallery uses the arrays.
+        """
+        self._matrix, self._sq_norms, self._ids = embeddings, sq_norms, ids
+        self._backing = backing
+        self.names = list(names)
+        self.student_id_numbers = list(student_id_numbers)
+        self._rows_by_id = {int(student_id): row for row, student_id in enumerate(ids.tolist())}
+        self.size = len(ids)
+        self.generation += 1
+        if self.index is not None:
+            self.index.assign_all(self)
+
+    def attach_index(self, index):
+        """
+        Attaches an approximate nearest-neighbour index (or detaches it when `index` is None).
+        The index is kept in sync with later `add` / `upsert` / `remove` / `load` calls.
+        """
+        self.index = index
+        if index is not None:
+            index.assign_all(self)
+
+    def match(self, face_encodings):
+        """
+        Finds the closest known face for every encoding in one matrix operation.
+
+        Args:
+            face_encodings: Sequence (or k x dim array) of face encodings from one frame.
+
+        Returns:
+            (best_indices, best_distances): two length-k NumPy arrays holding the gallery row of
+            the nearest known face and its Euclidean distance. Both are empty if the gallery
+            or the input is empty.
+        """
+        if self.size == 0 or len(face_encodings) == 0:
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.float32)
+
+        queries = np.asarray(face_encodings, dtype=np.float32).reshape(-1, self.dim)
+        if self.index is not None and self.size >= self.index.min_gallery_size:
+            return self.index.search(self, queries)
+
+        gallery = self._matrix[:self.size]
+        # ||q - g||^2 = ||q||^2 + ||g||^2 - 2 q.g, with ||g||^2 precomputed at load time
+        sq_distances = queries @ gallery.T
+        sq_distances *= -2.0
+        sq_distances += self._sq_norms[:self.size]
+        best_indices = np.argmin(sq_distances, axis=1)
+        best_sq = sq_distances[np.arange(len(queries)), best_indices]
+        best_sq += np.einsum('ij,ij->i', queries, queries)
+        np.maximum(best_sq, 0.0, out=best_sq) # Guard against tiny negative values from rounding
+        return best_indices, np.sqrt(best_sq)
+
+    def subset(self, student_ids):
+        """
+        Returns a new, independent FaceGallery holding only the rows of the given students
+        (e.g. the students registered for one exam). No index is attached to the subset.
+        """
+        rows = np.flatnonzero(np.isin(self.ids, np.fromiter(student_ids, dtype=np.int64)))
+        sub_gallery = FaceGallery(capacity=len(rows), dim=self.dim)
+        sub_gallery._matrix[:len(rows)] = self._matrix[rows]
+        sub_gallery._sq_norms[:len(rows)] = self._sq_norms[rows]
+        sub_gallery._ids[:len(rows)] = self._ids[rows]
+        sub_gallery.names = [self.names[row] for row in rows]
+        sub_gallery.student_id_numbers = [self.student_id_numbers[row] for row in rows]
+        sub_gallery._rows_by_id = {int(student_id): row for row, student_id in enumerate(sub_gallery._ids[:len(rows)])}
+        sub_gallery.size = len(rows)
+        return sub_gallery
+
+    def identity(self, row):
+        """Returns (student_id, name, student_id_number) for a gallery row."""
+        return int(self._ids[row]), self.names[row], self.student_id_numbers[row]
+
+
+def snapshot_meta_path(path):
+    """Path of the JSON sidecar (ids, names, student numbers) that accompanies a snapshot .npy file."""
+    return os.path.splitext(path)[0] + '.meta.json'
+
+
+def write_snapshot(path, rows, exported_until=None, dim=EMBEDDING_DIM):
+    """
+    Writes an embedding snapshot: a float32 (n x dim) .npy matrix plus a JSON sidecar.
+    Both files are written to temporary names and swapped in atomically.
+    Args:
+        rows: Sequence of (student_id, name, student_id_number, embedding) tuples.
+        exported_until: Latest Student.updated_at included; rows changed later are read from the DB.
+    Returns: the number of rows written.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    matrix = np.zeros((len(rows), dim), dtype=np.float32)
+    for row, (_, _, _, embedding) in enumerate(rows):
+        matrix[row] = np.asarray(embedding, dtype=np.float32).reshape(dim)
+    meta = {
+        'version': SNAPSHOT_FORMAT_VERSION,
+        'count': len(rows),
+        'exported_until': exported_until.isoformat() if exported_until else None,
+        'ids': [int(student_id) for student_id, _, _, _ in rows],
+        'names': [name for _, name, _, _ in rows],
+        'student_id_numbers': [student_id_number for _, _, student_id_number, _ in rows]
+    }
+
+    meta_path = snapshot_meta_path(path)
+    with open(path + '.tmp', 'wb') as f:
+        np.save(f, matrix)
+    with open(meta_path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(meta, f, separators=(',', ':'))
+    os.replace(path + '.tmp', path)
+    os.replace(meta_path + '.tmp', meta_path)
+    return len(rows)
+
+
+def benchmark_match(gallery_sizes=(100, 1000, 8000, 20000), faces_per_frame=3, repeats=50, seed=0):
+    """
+    Microbenchmark for FaceGallery.match on random unit-scale embeddings.
+    Returns a list of (gallery_size, mean_ms_per_frame) tuples.
+    """
+    rng = np.random.default_rng(seed)
+    results = []
+    for size in gallery_sizes:
+        gallery = FaceGallery(capacity=size)
+        embeddings = rng.normal(scale=0.09, size=(size, EMBEDDING_DIM))
+        gallery.load([(i, f"Student {i}", str(i), embeddings[i]) for i in range(size)])
+        frame_encodings = rng.normal(scale=0.09, size=(faces_per_frame, EMBEDDING_DIM))
+
+        gallery.match(frame_encodings) # Warm-up (BLAS thread start-up, page faults)
+        start = time.perf_counter()
+        for _ in range(repeats):
+            gallery.match(frame_encodings)
+        elapsed = time.perf_counter() - start
+        results.append((size, elapsed * 1000.0 / repeats))
+    return results
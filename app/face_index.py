@@ -0,0 +1,188 @@
+# app/face_index.py
+
+import os
+import numpy as np
+
+DEFAULT_N_PROBE = 8 # Inverted lists scanned per query; higher = better recall, slower search
+DEFAULT_MIN_GALLERY_SIZE = 20000 # Below this, exact brute-force matching is fast enough
+KMEANS_SAMPLES_PER_LIST = 256 # Training sample size per list for k-means
+ASSIGN_CHUNK_ROWS = 8192 # Rows per chunk when assigning vectors to centroids (bounds memory)
+
+
+def _nearest_centroid(vectors, centroids):
+    """Returns the index of the nearest centroid for every row of `vectors`, chunked."""
+    centroid_sq_norms = np.einsum('ij,ij->i', centroids, centroids)
+    labels = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), ASSIGN_CHUNK_ROWS):
+        chunk = vectors[start:start + ASSIGN_CHUNK_ROWS]
+        # ||x||^2 is constant per row, so it does not affect the argmin
+        scores = centroid_sq_norms - 2.0 * (chunk @ centroids.T)
+        labels[start:start + len(chunk)] = np.argmin(scores, axis=1)
+    return labels
+
+
+def _kmeans(vectors, n_lists, iterations, rng):
+    """Plain Lloyd's k-means on a random training sample. Returns float32 centroids."""
+    sample_size = min(len(vectors), n_lists * KMEANS_SAMPLES_PER_LIST)
+    sample = vectors[rng.choice(len(vectors), sample_size, replace=False)]
+    centroids = sample[rng.choice(len(sample), n_lists, replace=False)].copy()
+
+    for _ in range(iterations):
+        labels = _nearest_centroid(sample, centroids)
+        counts = np.bincount(labels, minlength=n_lists)
+        non_empty = counts > 0
+        # Per-list sums via one sort + segmented reduction (much faster than np.add.at)
+        order = np.argsort(labels, kind='stable')
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        sums = np.zeros_like(centroids, dtype=np.float64)
+        sums[non_empty] = np.add.reduceat(sample[order].astype(np.float64), starts[non_empty], axis=0)
+        centroids[non_empty] = (sums[non_empty] / counts[non_empty, None]).astype(np.float32)
+        # Re-seed empty lists with random training points so every list stays useful
+        empty = np.flatnonzero(~non_empty)
+        if len(empty):
+            centroids[empty] = sample[rng.choice(len(sample), len(empty), replace=False)]
+    return centroids
+
+
+class IVFFaceIndex:
+    """
+    Inverted-file (IVF) approximate nearest-neighbour index for a FaceGallery.
+
+    Gallery rows are partitioned into `n_lists` k-means cells. A query only scans the
+    `n_probe` cells whose centroids are closest, and the candidates found there are re-ranked
+    with exact Euclidean distances against the gallery's float32 matrix, so the 0.50
+    tolerance check downstream is applied to true distances, never to approximations.
+    """
+
+    def __init__(self, centroids, student_ids=None, assignments=None,
+                 n_probe=DEFAULT_N_PROBE, min_gallery_size=DEFAULT_MIN_GALLERY_SIZE):
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        self._centroid_sq_norms = np.einsum('ij,ij->i', self.centroids, self.centroids)
+        self.n_probe = max(1, min(int(n_probe), self.n_lists))
+        self.min_gallery_size = min_gallery_size
+        # Offline list assignments, keyed by student id (sorted for searchsorted lookups)
+        if student_ids is not None and len(student_ids):
+            order = np.argsort(student_ids)
+            self._trained_student_ids = np.asarray(student_ids, dtype=np.int64)[order]
+            self._trained_assignments = np.asarray(assignments, dtype=np.int32)[order]
+        else:
+            self._trained_student_ids = np.empty(0, dtype=np.int64)
+            self._trained_assignments = np.empty(0, dtype=np.int32)
+        # Per gallery row list assignment, and the inverted lists derived from it
+        self._row_lists = np.empty(0, dtype=np.int32)
+        self._inverted_lists = None
+
+    @property
+    def n_lists(self):
+        return len(self.centroids)
+
+    def assign_all(self, gallery):
+        """
+        Assigns every gallery row to a list. Rows whose student was present when the index
+        was built reuse the offline assignment; any newer rows go to their nearest centroid.
+        """
+        ids = gallery.ids
+        row_lists = np.full(gallery.capacity, -1, dtype=np.int32)
+        if len(self._trained_student_ids) and len(ids):
+            positions = np.searchsorted(self._trained_student_ids, ids)
+            positions = np.minimum(positions, len(self._trained_student_ids) - 1)
+            known = self._trained_student_ids[positions] == ids
+            row_lists[:len(ids)][known] = self._trained_assignments[positions[known]]
+        unassigned = np.flatnonzero(row_lists[:len(ids)] < 0)
+        if len(unassigned):
+            row_lists[unassigned] = _nearest_centroid(gallery.embeddings[unassigned], self.centroids)
+        self._row_lists = row_lists
+        self._inverted_lists = None
+
+    def assign_row(self, gallery, row):
+        """Assigns (or re-assigns) a single gallery row to its nearest list."""
+        if len(self._row_lists) < gallery.capacity:
+            grown = np.full(gallery.capacity, -1, dtype=np.int32)
+            grown[:len(self._row_lists)] = self._row_lists
+            self._row_lists = grown
+        self._row_lists[row] = _nearest_centroid(gallery.embeddings[row:row + 1], self.centroids)[0]
+        self._inverted_lists = None
+
+    def move_row(self, source_row, target_row):
+        """Mirrors a gallery row move (used when the gallery compacts after a removal)."""
+        self._row_lists[target_row] = self._row_lists[source_row]
+        self._inverted_lists = None
+
+    def invalidate(self):
+        """Forces the inverted lists to be rebuilt on the next search."""
+        self._inverted_lists = None
+
+    def _lists(self, size):
+        """Builds (lazily) the inverted lists: one array of gallery rows per k-means cell."""
+        if self._inverted_lists is None:
+            row_lists = self._row_lists[:size]
+            order = np.argsort(row_lists, kind='stable')
+            bounds = np.searchsorted(row_lists[order], np.arange(self.n_lists + 1))
+            self._inverted_lists = [order[bounds[i]:bounds[i + 1]] for i in range(self.n_lists)]
+        return self._inverted_lists
+
+    def search(self, gallery, queries):
+        """
+        Approximate counterpart of FaceGallery.match: returns (best_indices, best_distances).
+        Queries whose probed lists are all empty get an infinite distance (i.e. unknown).
+        """
+        inverted_lists = self._lists(gallery.size)
+        matrix = gallery.embeddings
+        sq_norms = gallery.sq_norms
+        best_indices = np.zeros(len(queries), dtype=np.intp)
+        best_distances = np.full(len(queries), np.inf, dtype=np.float32)
+
+        for i, query in enumerate(queries):
+            centroid_scores = self._centroid_sq_norms - 2.0 * (self.centroids @ query)
+            if self.n_probe < self.n_lists:
+                probe = np.argpartition(centroid_scores, self.n_probe - 1)[:self.n_probe]
+            else:
+                probe = np.arange(self.n_lists)
+            candidates = np.concatenate([inverted_lists[list_id] for list_id in probe])
+            if len(candidates) == 0:
+                continue
+            # Exact re-rank of the candidates from the probed lists
+            sq_distances = sq_norms[candidates] - 2.0 * (matrix[candidates] @ query)
+            best = np.argmin(sq_distances)
+            best_indices[i] = candidates[best]
+            best_distances[i] = np.sqrt(max(sq_distances[best] + np.dot(query, query), 0.0))
+        return best_indices, best_distances
+
+    def save(self, path):
+        """Writes the centroids and offline assignments to a .npz file."""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, 'wb') as f:
+            np.savez(f, centroids=self.centroids,
+                     student_ids=self._trained_student_ids,
+                     assignments=self._trained_assignments)
+
+    @classmethod
+    def load(cls, path, n_probe=DEFAULT_N_PROBE, min_gallery_size=DEFAULT_MIN_GALLERY_SIZE):
+        """Loads an index previously written by `save` / `flask build-face-index`."""
+        with np.load(path) as data:
+            return cls(data['centroids'], data['student_ids'], data['assignments'],
+                       n_probe=n_probe, min_gallery_size=min_gallery_size)
+
+
+def build_ivf_index(embeddings, student_ids, n_lists=None, iterations=10, seed=0, **kwargs):
+    """
+    Trains an IVFFaceIndex offline.
+    Args:
+        embeddings: (n x dim) array of face embeddings.
+        student_ids: Length-n sequence of Student primary keys, parallel to `embeddings`.
+        n_lists: Number of k-means cells. Defaults to ~4 * sqrt(n).
+        iterations: k-means iterations.
+    Returns: IVFFaceIndex with offline assignments for every given student.
+    """
+    vectors = np.ascontiguousarray(embeddings, dtype=np.float32)
+    if len(vectors) == 0:
+        raise ValueError("Cannot build a face index from an empty gallery.")
+    if n_lists is None:
+        n_lists = int(4 * np.sqrt(len(vectors)))
+    n_lists = max(1, min(n_lists, len(vectors)))
+    rng = np.random.default_rng(seed)
+    centroids = _kmeans(vectors, n_lists, iterations, rng)
+    assignments = _nearest_centroid(vectors, centroids)
+    return IVFFaceIndex(centroids, np.asarray(student_ids, dtype=np.int64), assignments, **kwargs)
@@ -2,54 +2,361 @@
 
 import face_recognition
 import numpy as np
-from app.models import Student, Log, Exam
+import cv2
+from app.models import Student, Exam, exam_registrations
 from app import db # Assuming db is your SQLAlchemy instance from app/__init__.py
-from datetime import datetime, timedelta
+from datetime import datetime
 from flask import current_app
+from sqlalchemy import func
+from app.face_gallery import FaceGallery, DEFAULT_MATCH_TOLERANCE, write_snapshot
+from app.face_index import IVFFaceIndex
+from app.attendance_log import get_log_writer
+from app.expiring_cache import ExpiringCache
+from app.shared_gallery import SharedGallery, default_gallery_name, shared_gallery_supported
+import os
+import time
+import itertools
+import threading
 
-# In-memory cache for known faces. For multi-worker setups, a shared cache (e.g., Redis) is better.
-CACHED_KNOWN_FACES = {
-    "ids": [],
-    "names": [],
-    "student_id_numbers": [], # Added student_id_numbers
-    "embeddings": []
-}
+# In-memory cache for known faces, held as a contiguous float32 matrix (see app/face_gallery.py).
+# With FACE_GALLERY_SHARED_MEMORY the matrix is published to shared memory and every process
+# (web workers, the recognition daemon) maps the same copy; see _adopt_shared_face_cache.
+CACHED_KNOWN_FACES = FaceGallery()
+
+# Guards CACHED_KNOWN_FACES, EXAM_GALLERIES and _FACE_CACHE_SYNC. The gallery is mutated in place
+# (adopting a shared generation, deltas, single-student edits) while stream, ingest, daemon and
+# request threads match against it, and a row index from match() is only meaningful for the
+# generation it came from; so every mutation, and every match together with the identity()
+# lookups of its rows, runs under this lock. Reentrant: the mutators call each other.
+_FACE_CACHE_LOCK = threading.RLock()
+
+# This process's handle on the shared memory gallery. Structure: {"name": str, "store": SharedGallery}
+_SHARED_GALLERY = {"name": None, "store": None}
+
+# Offline-built ANN index, kept between reloads. Structure: {"path": str, "mtime": float, "index": IVFFaceIndex}
+_LOADED_FACE_INDEX = {"path": None, "mtime": None, "index": None}
+
+# What the face cache was last synced to. "fingerprint" is (count, max id, max updated_at) over
+# students with face data; when it is unchanged, reloading the cache is a no-op.
+_FACE_CACHE_SYNC = {"fingerprint": None, "synced_until": None}
+
+# Per-exam sub-galleries holding only the students registered for that exam, built when a
+# live_auth session starts. Faces are matched against these first, so the common case costs
+# O(room size) instead of O(institution size). "generation" is the CACHED_KNOWN_FACES generation
+# the subset was taken from; a stale subset is re-derived from the cache without touching the DB.
+# Registrations can be edited in any worker, so "registered_ids" is re-read from the database
+# every EXAM_REGISTRATION_REFRESH_SECONDS. "version" is new whenever the entry is (re)built or its
+# set changed, process-wide unique so a dropped and rebuilt entry never repeats an old one.
+# Structure: {exam_id: {"gallery": FaceGallery, "registered_ids": set_of_student_ids, "generation": int,
+#                       "version": int, "checked_at": monotonic seconds}}
+EXAM_GALLERIES = {}
+DEFAULT_EXAM_REGISTRATION_REFRESH_SECONDS = 5.0
+_EXAM_GALLERY_VERSIONS = itertools.count(1)
 
 # Tracks recently logged students to prevent log spam for a single recognition event.
-RECENTLY_LOGGED_STUDENTS = {}  # Structure: {exam_id: {student_id: last_log_timestamp}}
 LOG_COOLDOWN_SECONDS = 60  # Log a student only once per this interval for an exam.
+RECENT_LOGS_MAX_ENTRIES = 20000 # Memory cap; entries closest to the end of their cooldown are evicted first
+# Entries expire on their own after the cooldown, so a kiosk running for weeks stays bounded.
+# Structure: {(exam_id, student_id): last_log_timestamp}
+RECENTLY_LOGGED_STUDENTS = ExpiringCache(LOG_COOLDOWN_SECONDS, RECENT_LOGS_MAX_ENTRIES)
+# (This in-process cooldown only saves queue traffic; the Log table's unique bucket key is what
+# guarantees one row per student, status and LOG_DEDUP_BUCKET_SECONDS window across processes.)
 
-def load_known_faces_from_db():
+def _face_rows_query():
+    """
+    Column-only query of (id, name, student_id_number, face_embedding) for students with face data.
+    Skips ORM object construction, which dominates bulk loads of large galleries.
     """
-    Loads all student face embeddings, IDs, and names from the database into the cache.
-    Returns the number of faces loaded.
+    return db.session.query(
+        Student.id, Student.name, Student.student_id_number, Student.face_embedding
+    ).filter(Student.face_embedding.isnot(None))
+
+def _face_data_fingerprint():
+    """One aggregate query summarising the students that have face data."""
+    return tuple(db.session.query(
+        func.count(Student.id), func.max(Student.id), func.max(Student.updated_at)
+    ).filter(Student.face_embedding.isnot(None)).one())
+
+def load_known_faces_from_db(force=False):
+    """
+    Brings the in-memory face cache up to date with the database.
+    The first call (or force=True) loads every student embedding. Later calls compare a cheap
+    aggregate fingerprint and do nothing if it is unchanged; otherwise only students updated since
+    the last sync are re-read, and students that no longer have face data are dropped.
+    Returns the number of faces in the cache.
     """
-    global CACHED_KNOWN_FACES
     try:
         # Ensure app context for database query if called outside a request/CLI command context
         # However, this function is typically called from within a route or CLI command context.
-        students_with_embeddings = Student.query.filter(Student.face_embedding.isnot(None)).all()
-        
-        CACHED_KNOWN_FACES["ids"] = [student.id for student in students_with_embeddings]
-        CACHED_KNOWN_FACES["names"] = [student.name for student in students_with_embeddings]
-        CACHED_KNOWN_FACES["student_id_numbers"] = [student.student_id_number for student in students_with_embeddings]
-        CACHED_KNOWN_FACES["embeddings"] = [student.face_embedding for student in students_with_embeddings]
-        
-        count = len(CACHED_KNOWN_FACES["ids"])
+        fingerprint = _face_data_fingerprint()
+        with _FACE_CACHE_LOCK:
+            if not force:
+                _adopt_shared_face_cache() # Another process may already have loaded (or refreshed) the gallery
+            if not force and _FACE_CACHE_SYNC["fingerprint"] == fingerprint:
+                if current_app:
+                    current_app.logger.debug("Face cache unchanged (generation %s); skipping reload.", CACHED_KNOWN_FACES.generation)
+                return len(CACHED_KNOWN_FACES)
+
+            if force or _FACE_CACHE_SYNC["fingerprint"] is None:
+                snapshot_meta = _load_face_snapshot()
+                if snapshot_meta is not None:
+                    # Memory-mapped snapshot; only rows changed after the export come from the DB
+                    exported_until = snapshot_meta['exported_until']
+                    changed = _apply_face_cache_deltas(datetime.fromisoformat(exported_until) if exported_until else None)
+                    count = len(CACHED_KNOWN_FACES)
+                    message = f"Loaded {snapshot_meta['count']} known face(s) from snapshot, {changed} newer change(s) from the database; {count} cached."
+                else:
+                    count = CACHED_KNOWN_FACES.load(_face_rows_query().all())
+                    message = f"Loaded {count} known face(s) from the database into cache."
+                _attach_face_index()
+                publish = True
+            else:
+                changed = _apply_face_cache_deltas(_FACE_CACHE_SYNC["synced_until"])
+                count = len(CACHED_KNOWN_FACES)
+                message = f"Applied {changed} face cache change(s); {count} known face(s) cached."
+                # Nothing to share if the rows were already in the adopted generation (e.g. the
+                # fingerprint only moved because of a re-save); other workers reach the same result
+                publish = changed > 0
+
+            _FACE_CACHE_SYNC["fingerprint"] = fingerprint
+            _FACE_CACHE_SYNC["synced_until"] = fingerprint[2]
+            if publish:
+                _publish_shared_face_cache()
         if current_app: # current_app might not be available if called at module load time by some tools
-            current_app.logger.info(f"Loaded {count} known face(s) from the database into cache.")
+            current_app.logger.info(message)
         else:
-            print(f"(No app context) Loaded {count} known face(s) from the database into cache.")
+            print(f"(No app context) {message}")
         return count
     except Exception as e:
         if current_app:
             current_app.logger.error(f"Error loading known faces from DB: {e}")
         else:
             print(f"(No app context) Error loading known faces from DB: {e}")
-        CACHED_KNOWN_FACES = {"ids": [], "names": [], "embeddings": []} # Clear cache on error
+        with _FACE_CACHE_LOCK:
+            CACHED_KNOWN_FACES.clear() # Clear cache on error
+            _FACE_CACHE_SYNC.update({"fingerprint": None, "synced_until": None})
         return 0
 
-def find_and_log_recognized_faces(frame_rgb, exam_id):
+def _shared_gallery():
+    """This process's SharedGallery for the configured database, or None if sharing is disabled."""
+    if not current_app.config.get('FACE_GALLERY_SHARED_MEMORY', True) or not shared_gallery_supported():
+        return None
+    name = current_app.config.get('FACE_GALLERY_SHM_NAME') or default_gallery_name(current_app.config['SQLALCHEMY_DATABASE_URI'])
+    if _SHARED_GALLERY["name"] != name:
+        lock_path = os.path.join(current_app.instance_path, f"{name}.lock")
+        _SHARED_GALLERY.update({"name": name, "store": SharedGallery(name, lock_path)})
+    return _SHARED_GALLERY["store"]
+
+def _encode_fingerprint(fingerprint):
+    count, max_id, max_updated_at = fingerprint
+    return [count, max_id, max_updated_at.isoformat() if max_updated_at else None]
+
+def _decode_fingerprint(encoded):
+    count, max_id, max_updated_at = encoded
+    return (count, max_id, datetime.fromisoformat(max_updated_at) if max_updated_at else None)
+
+def _adopt_shared_face_cache():
+    """
+    Switches the face cache to a newer gallery generation published by any process (including a
+    refresh made by another worker). Cheap when nothing changed: one 64-byte shared memory read.
+    Returns True if a new generation was adopted.
+    """
+    store = _shared_gallery()
+    if store is None:
+        return False
+    with _FACE_CACHE_LOCK:
+        try:
+            meta = store.adopt(CACHED_KNOWN_FACES)
+        except Exception as e:
+            current_app.logger.error(f"Error adopting the shared face gallery, keeping the local cache: {e}")
+            return False
+        if meta is None:
+            return False
+        fingerprint = _decode_fingerprint(meta["fingerprint"]) if meta.get("fingerprint") else None
+        _FACE_CACHE_SYNC.update({"fingerprint": fingerprint, "synced_until": fingerprint[2] if fingerprint else None})
+        _attach_face_index()
+    current_app.logger.info(f"Adopted shared face gallery generation {store.adopted_generation} ({len(CACHED_KNOWN_FACES)} faces).")
+    return True
+
+def _publish_shared_face_cache():
+    """
+    Publishes the face cache as a new shared generation and switches this process to it.
+    The generation is stamped with _FACE_CACHE_SYNC["fingerprint"], so callers must have brought
+    the cache up to that fingerprint first; workers adopting it then skip their own reload.
+    """
+    store = _shared_gallery()
+    if store is None:
+        return
+    with _FACE_CACHE_LOCK:
+        fingerprint = _FACE_CACHE_SYNC["fingerprint"]
+        try:
+            store.publish(CACHED_KNOWN_FACES, {"fingerprint": _encode_fingerprint(fingerprint) if fingerprint else None})
+            store.adopt(CACHED_KNOWN_FACES) # Drop the private copy; this process maps the shared one too
+        except Exception as e:
+            current_app.logger.error(f"Error publishing the face gallery to shared memory: {e}")
+
+def _load_face_snapshot():
+    """
+    Memory-maps the exported embedding snapshot (FACE_SNAPSHOT_PATH) into the face cache.
+    Returns the snapshot metadata, or None if there is no usable snapshot.
+    """
+    snapshot_path = current_app.config.get('FACE_SNAPSHOT_PATH')
+    if not snapshot_path:
+        return None
+    try:
+        return CACHED_KNOWN_FACES.load_snapshot(snapshot_path)
+    except Exception as e:
+        current_app.logger.error(f"Error loading face snapshot from {snapshot_path}, falling back to the database: {e}")
+        return None
+
+def export_face_snapshot(path):
+    """
+    Exports every student embedding to a memory-mappable snapshot (see write_snapshot).
+    Returns the number of embeddings exported.
+    """
+    # Take the high-water mark first: rows updated while exporting are re-read from the DB later
+    exported_until = db.session.query(func.max(Student.updated_at)).scalar()
+    return write_snapshot(path, _face_rows_query().order_by(Student.id).all(), exported_until=exported_until)
+
+def _apply_face_cache_deltas(synced_until):
+    """
+    Applies row-level changes made since `synced_until` (e.g. by another process) to the cache.
+    Returns the number of rows added, updated or removed.
+    """
+    changed_query = _face_rows_query()
+    if synced_until is not None:
+        # >= rather than > so rows sharing the last timestamp are not missed (re-applying is harmless)
+        changed_query = changed_query.filter(Student.updated_at >= synced_until)
+    else:
+        changed_query = changed_query.filter(Student.updated_at.isnot(None))
+    changes = 0
+    for student_id, name, student_id_number, embedding in changed_query.all():
+        CACHED_KNOWN_FACES.upsert(student_id, name, student_id_number, embedding)
+        changes += 1
+
+    # Deletions leave no row behind, so compare primary keys only (no embeddings are loaded)
+    current_ids = {student_id for (student_id,) in db.session.query(Student.id).filter(Student.face_embedding.isnot(None))}
+    for student_id in set(CACHED_KNOWN_FACES.ids.tolist()) - current_ids:
+        CACHED_KNOWN_FACES.remove(student_id)
+        changes += 1
+    return changes
+
+def update_cached_face(student):
+    """
+    Applies one student's add/edit to the face cache without reloading it.
+    Call after the change is committed. Students without face data are removed from the cache.
+    """
+    with _FACE_CACHE_LOCK:
+        _adopt_shared_face_cache() # Apply the change on top of the newest shared generation
+        if _FACE_CACHE_SYNC["fingerprint"] is None:
+            return # Cache not loaded yet; the next full load will include this student
+        generation = CACHED_KNOWN_FACES.generation
+        if student.face_embedding is None:
+            CACHED_KNOWN_FACES.remove(student.id)
+        else:
+            CACHED_KNOWN_FACES.upsert(student.id, student.name, student.student_id_number, student.face_embedding)
+        if CACHED_KNOWN_FACES.generation != generation:
+            _sync_and_publish_face_cache()
+    if current_app:
+        current_app.logger.info(f"Face cache updated for student ID {student.id} (generation {CACHED_KNOWN_FACES.generation}).")
+
+def remove_cached_face(student_id):
+    """Removes a deleted student from the face cache without reloading it."""
+    with _FACE_CACHE_LOCK:
+        _adopt_shared_face_cache()
+        if not CACHED_KNOWN_FACES.remove(student_id):
+            return
+        if _FACE_CACHE_SYNC["fingerprint"] is not None:
+            _sync_and_publish_face_cache()
+    if current_app:
+        current_app.logger.info(f"Face cache entry removed for student ID {student_id} (generation {CACHED_KNOWN_FACES.generation}).")
+
+def _sync_and_publish_face_cache():
+    """
+    Publishes the cache after a single-student change. The generation must carry the fingerprint
+    of the database it reflects, not the one from before the change (workers adopting a stale
+    fingerprint would each re-sync and republish). A fresh fingerprint may also cover other
+    processes' changes that are not in the adopted generation yet, so those are applied first.
+    """
+    fingerprint = _face_data_fingerprint()
+    _apply_face_cache_deltas(_FACE_CACHE_SYNC["synced_until"])
+    _FACE_CACHE_SYNC["fingerprint"] = fingerprint
+    _FACE_CACHE_SYNC["synced_until"] = fingerprint[2]
+    _publish_shared_face_cache()
+
+def _attach_face_index():
+    """
+    Attaches the offline-built ANN index (FACE_INDEX_PATH) to the face cache when the file exists
+    and the gallery is large enough to benefit. The index file is only re-read when it changes.
+    """
+    index_path = current_app.config.get('FACE_INDEX_PATH')
+    min_gallery_size = current_app.config.get('FACE_INDEX_MIN_GALLERY_SIZE', 20000)
+    if not index_path or not os.path.exists(index_path) or len(CACHED_KNOWN_FACES) < min_gallery_size:
+        CACHED_KNOWN_FACES.attach_index(None)
+        return
+
+    mtime = os.path.getmtime(index_path)
+    if _LOADED_FACE_INDEX["path"] != index_path or _LOADED_FACE_INDEX["mtime"] != mtime:
+        try:
+            _LOADED_FACE_INDEX["index"] = IVFFaceIndex.load(
+                index_path,
+                n_probe=current_app.config.get('FACE_INDEX_N_PROBE', 8),
+                min_gallery_size=min_gallery_size
+            )
+            _LOADED_FACE_INDEX["path"], _LOADED_FACE_INDEX["mtime"] = index_path, mtime
+            current_app.logger.info(f"Loaded face index from {index_path} ({_LOADED_FACE_INDEX['index'].n_lists} lists).")
+        except Exception as e:
+            current_app.logger.error(f"Error loading face index from {index_path}, falling back to exact matching: {e}")
+            _LOADED_FACE_INDEX.update({"path": None, "mtime": None, "index": None})
+    CACHED_KNOWN_FACES.attach_index(_LOADED_FACE_INDEX["index"])
+
+def detect_face_locations(frame_rgb, scale=1.0, roi=None, buffers=None):
+    """
+    Runs HOG face detection on a cropped and/or downscaled copy of the frame and maps the boxes back
+    to full-resolution frame coordinates, so encodings can still be computed from the full frame.
+
+    Args:
+        frame_rgb: An RGB image (NumPy array).
+        scale: Detection scale factor (e.g. 0.5 detects on a half-size frame). 1.0 disables scaling.
+        roi: Optional region of interest (left, top, right, bottom) as fractions of the frame width
+            and height, e.g. (0.25, 0.0, 0.75, 1.0) for a doorway in the middle of the picture.
+        buffers: Optional FrameBuffers (app/video_pipeline.py) of the calling stream; the scaled or
+            cropped region is then written into its "detection" buffer instead of a new array.
+
+    Returns:
+        A list of (top, right, bottom, left) boxes in full-frame pixel coordinates.
+    """
+    height, width = frame_rgb.shape[:2]
+    offset_x, offset_y = 0, 0
+    region = frame_rgb
+    if roi:
+        offset_x, offset_y = int(roi[0] * width), int(roi[1] * height)
+        region = frame_rgb[offset_y:int(roi[3] * height), offset_x:int(roi[2] * width)]
+    if scale != 1.0:
+        # INTER_AREA averages pixels when shrinking, which keeps faces clean for HOG.
+        # OpenCV reads the cropped view in place, so the crop itself is never copied.
+        size = (max(1, int(round(region.shape[1] * scale))), max(1, int(round(region.shape[0] * scale))))
+        dst = buffers.get("detection", (size[1], size[0], 3)) if buffers is not None else None
+        region = cv2.resize(region, size, dst=dst, interpolation=cv2.INTER_AREA)
+    elif roi:
+        if buffers is not None:
+            contiguous = buffers.get("detection", region.shape)
+            np.copyto(contiguous, region) # dlib needs a contiguous buffer
+            region = contiguous
+        else:
+            region = np.ascontiguousarray(region) # dlib needs a contiguous buffer
+
+    locations = []
+    for top, right, bottom, left in face_recognition.face_locations(region):
+        locations.append((
+            max(0, offset_y + int(round(top / scale))),
+            min(width, offset_x + int(round(right / scale))),
+            min(height, offset_y + int(round(bottom / scale))),
+            max(0, offset_x + int(round(left / scale)))
+        ))
+    return locations
+
+def find_and_log_recognized_faces(frame_rgb, exam_id, tracker=None, detection_scale=1.0, roi=None, buffers=None):
     """
     Detects faces in a frame, recognizes them against cached known faces, logs attendance,
     and returns data for drawing annotations on the frame.
@@ -57,64 +364,219 @@ def find_and_log_recognized_faces(frame_rgb, exam_id):
     Args:
         frame_rgb: An RGB image (NumPy array).
         exam_id: The ID of the current exam session.
+        tracker: Optional FaceTracker (app/face_tracking.py). When given, faces that continue an
+            already identified track reuse its identity instead of being re-encoded.
+        detection_scale, roi, buffers: Passed to detect_face_locations. Encodings always use the full frame.
 
     Returns:
         A list of dictionaries, where each dictionary contains:
         {'name': str, 'student_id': int or None, 'box': (top, right, bottom, left)}
         for each detected face. 'student_id' is None for unknown faces.
     """
-    if not CACHED_KNOWN_FACES["embeddings"]:
-        if current_app:
-            current_app.logger.warning("No known faces in cache to compare against for exam_id %s.", exam_id)
-        face_locations = face_recognition.face_locations(frame_rgb)
-        return [{'name': 'Unknown', 'student_id': None, 'student_id_number': None, 'box': box, 'status': 'Unknown_Student'} for box in face_locations]
+    face_locations = detect_face_locations(frame_rgb, scale=detection_scale, roi=roi, buffers=buffers)
 
-    face_locations = face_recognition.face_locations(frame_rgb)
-    face_encodings = face_recognition.face_encodings(frame_rgb, face_locations)
+    def encode(indices):
+        return face_recognition.face_encodings(frame_rgb, [face_locations[i] for i in indices]) if indices else []
+
+    return identify_and_log_faces(face_locations, encode, exam_id, tracker=tracker)
+
+def identify_and_log_faces(face_locations, encode, exam_id, tracker=None):
+    """
+    The part of find_and_log_recognized_faces that follows detection: decides (with the tracker)
+    which faces need encoding, identifies them, logs attendance and builds the annotation data.
+    Also used for detections and encodings computed in a recognition worker process.
+
+    Args:
+        face_locations: Detected (top, right, bottom, left) boxes of one frame.
+        encode: Callable taking a list of indices into face_locations and returning their encodings.
+            An entry may be None if the encoding is unavailable (e.g. a worker did not compute it);
+            such faces are reported as Unknown for this frame and encoded on a later one.
+        exam_id: The ID of the current exam session.
+        tracker: Optional FaceTracker.
+
+    Returns:
+        The same list of dictionaries as find_and_log_recognized_faces.
+    """
+    with _FACE_CACHE_LOCK:
+        _adopt_shared_face_cache() # Picks up a refresh published by another worker (or the daemon)
+        if len(CACHED_KNOWN_FACES) == 0:
+            if current_app:
+                current_app.logger.warning("No known faces in cache to compare against for exam_id %s.", exam_id)
+            return [{'name': 'Unknown', 'student_id': None, 'student_id_number': None, 'box': box, 'status': 'Unknown_Student'} for box in face_locations]
+
+        exam_gallery = _get_exam_gallery(exam_id)
+        if exam_gallery is None:
+            if current_app:
+                current_app.logger.error(f"Exam with ID {exam_id} not found in find_and_log_recognized_faces.")
+            return [{'name': 'Error', 'student_id': None, 'student_id_number': None, 'box': box, 'status': 'Error_Exam_Not_Found'} for box in face_locations]
+        # Tracks are reset when the face cache or the exam's registrations change under them
+        generation = (CACHED_KNOWN_FACES.generation, exam_gallery["version"])
 
     detected_faces_data = []
-    current_exam = Exam.query.get(exam_id)
-    if not current_exam:
-        if current_app:
-            current_app.logger.error(f"Exam with ID {exam_id} not found in find_and_log_recognized_faces.")
-        return [{'name': 'Error', 'student_id': None, 'student_id_number': None, 'box': box, 'status': 'Error_Exam_Not_Found'} for box in face_locations]
+    # Only encode faces whose track is new, uncertain or due for re-verification
+    if tracker is not None:
+        if tracker.generation != generation:
+            tracker.reset() # Identities carried by tracks may refer to changed or removed students
+            tracker.generation = generation
+        tracks = tracker.update(face_locations)
+        to_encode = [i for i, track in enumerate(tracks) if tracker.needs_encoding(track)]
+    else:
+        tracks = None
+        to_encode = list(range(len(face_locations)))
+
+    # Encoding runs outside the lock; exam_gallery["gallery"] is replaced, never mutated, so the
+    # reference taken above stays consistent, and the full cache is only read under the lock
+    encoded = [(i, encoding) for i, encoding in zip(to_encode, encode(to_encode)) if encoding is not None]
+    with _FACE_CACHE_LOCK:
+        identified = dict(zip([i for i, _ in encoded], _identify_encodings([encoding for _, encoding in encoded], exam_gallery)))
+
+    for i, current_face_box in enumerate(face_locations):
+        if i in identified:
+            face_data, distance = identified[i]
+            if tracks is not None:
+                tracker.record(tracks[i], face_data, distance)
+        elif tracks is not None and tracks[i]["result"] is not None:
+            face_data = tracks[i]["result"] # Identity carried over from an earlier frame
+        else:
+            # Not encoded for this frame (a worker skipped it); the track is encoded on a later frame
+            face_data = {'name': 'Verifying...', 'student_id': None, 'student_id_number': None, 'status': 'Pending'}
+
+        if face_data['student_id'] is not None:
+            _log_student_attendance(face_data['student_id'], exam_id, face_data['name'], face_data['status'])
+
+        detected_faces_data.append(dict(face_data, box=current_face_box))
 
-    registered_student_ids_for_exam = {s.id for s in current_exam.registered_students}
+    return detected_faces_data
+
+def identify_encodings(face_encodings, exam_id):
+    """
+    Identifies face encodings for an exam with the live matching rules, without logging anything
+    (offline video recognition logs on the video's own timeline; see app/video_recognition.py).
+
+    Returns:
+        A list of (face_data, distance) tuples parallel to `face_encodings` (see _identify_encodings),
+        or None if the exam does not exist.
+    """
+    with _FACE_CACHE_LOCK:
+        _adopt_shared_face_cache()
+        exam_gallery = _get_exam_gallery(exam_id)
+        if exam_gallery is None:
+            return None
+        if len(CACHED_KNOWN_FACES) == 0 or len(face_encodings) == 0:
+            return [({'name': 'Unknown', 'student_id': None, 'student_id_number': None, 'status': 'Unknown_Student'}, None)
+                    for _ in face_encodings]
+        return _identify_encodings(face_encodings, exam_gallery)
 
-    for i, face_encoding in enumerate(face_encodings):
-        current_face_box = face_locations[i]
+def _identify_encodings(face_encodings, exam_gallery):
+    """
+    Identifies face encodings against an exam sub-gallery and, for misses, the full face cache.
+    Returns a list of (face_data, distance) tuples parallel to `face_encodings`, where face_data is
+    {'name', 'student_id', 'student_id_number', 'status'} and distance is the best match distance
+    (None if nothing was within tolerance). The caller must hold _FACE_CACHE_LOCK, so the rows
+    returned by CACHED_KNOWN_FACES.match() are resolved against the same generation.
+    """
+    registered_student_ids_for_exam = exam_gallery["registered_ids"]
+
+    # Match every face against the small registered-students gallery first (one matrix operation),
+    # then search the full gallery only for the faces that missed, to detect Verified_Not_Eligible.
+    exam_indices, exam_distances = exam_gallery["gallery"].match(face_encodings)
+    unmatched = [i for i in range(len(face_encodings))
+                 if len(exam_distances) == 0 or exam_distances[i] > DEFAULT_MATCH_TOLERANCE]
+    full_indices, full_distances = CACHED_KNOWN_FACES.match([face_encodings[i] for i in unmatched])
+    full_matches = {i: (full_indices[j], full_distances[j]) for j, i in enumerate(unmatched)}
+
+    identified = []
+    for i in range(len(face_encodings)):
         name = "Unknown"
         student_id_recognized = None
         student_id_number_recognized = None
         recognition_status = "Unknown_Student"
+        distance = None
 
-        matches = face_recognition.compare_faces(CACHED_KNOWN_FACES["embeddings"], face_encoding, tolerance=0.50)
-        
-        if True in matches:
-            face_distances = face_recognition.face_distance(CACHED_KNOWN_FACES["embeddings"], face_encoding)
-            best_match_index = np.argmin(face_distances)
-            
-            if matches[best_match_index]:
-                name = CACHED_KNOWN_FACES["names"][best_match_index]
-                student_id_recognized = CACHED_KNOWN_FACES["ids"][best_match_index]
-                student_id_number_recognized = CACHED_KNOWN_FACES["student_id_numbers"][best_match_index]
-
-                if student_id_recognized in registered_student_ids_for_exam:
-                    recognition_status = "Verified_Eligible"
-                else:
-                    recognition_status = "Verified_Not_Eligible"
-                
-                _log_student_attendance(student_id_recognized, exam_id, name, recognition_status)
-        
-        detected_faces_data.append({
+        if i not in full_matches:
+            student_id_recognized, name, student_id_number_recognized = exam_gallery["gallery"].identity(exam_indices[i])
+            recognition_status = "Verified_Eligible"
+            distance = float(exam_distances[i])
+        elif full_matches[i][1] <= DEFAULT_MATCH_TOLERANCE:
+            student_id_recognized, name, student_id_number_recognized = CACHED_KNOWN_FACES.identity(full_matches[i][0])
+            distance = float(full_matches[i][1])
+
+            if student_id_recognized in registered_student_ids_for_exam:
+                recognition_status = "Verified_Eligible"
+            else:
+                recognition_status = "Verified_Not_Eligible"
+
+        identified.append(({
             'name': name,
             'student_id': student_id_recognized,
             'student_id_number': student_id_number_recognized,
-            'box': current_face_box,
             'status': recognition_status
-        })
+        }, distance))
+    return identified
 
-    return detected_faces_data
+def build_exam_gallery(exam_id):
+    """
+    Builds (or rebuilds) the sub-gallery of students registered for an exam from the
+    current face cache.
+    Returns the EXAM_GALLERIES entry, or None if the exam does not exist.
+    """
+    current_exam = Exam.query.get(exam_id)
+    if not current_exam:
+        EXAM_GALLERIES.pop(exam_id, None)
+        return None
+
+    registered_ids = _registered_student_ids(exam_id)
+    with _FACE_CACHE_LOCK:
+        entry = {
+            "gallery": CACHED_KNOWN_FACES.subset(registered_ids),
+            "registered_ids": registered_ids,
+            "generation": CACHED_KNOWN_FACES.generation,
+            # A rebuild may change eligibility, so trackers carrying statuses of the old set are reset
+            "version": next(_EXAM_GALLERY_VERSIONS),
+            "checked_at": time.monotonic()
+        }
+        EXAM_GALLERIES[exam_id] = entry
+    if current_app:
+        current_app.logger.info(f"Built exam sub-gallery for exam ID {exam_id}: {len(entry['gallery'])} of {len(registered_ids)} registered student(s) have face data.")
+    return entry
+
+def _get_exam_gallery(exam_id):
+    """
+    Returns the exam's sub-gallery, building it on first use and re-deriving it when the cache changed.
+    Registrations are re-read every EXAM_REGISTRATION_REFRESH_SECONDS, as they may have been edited
+    by another worker. The caller holds _FACE_CACHE_LOCK.
+    """
+    entry = EXAM_GALLERIES.get(exam_id)
+    if entry is None:
+        return build_exam_gallery(exam_id)
+    now = time.monotonic()
+    refresh_seconds = current_app.config.get('EXAM_REGISTRATION_REFRESH_SECONDS', DEFAULT_EXAM_REGISTRATION_REFRESH_SECONDS)
+    if now - entry["checked_at"] >= refresh_seconds:
+        entry["checked_at"] = now
+        registered_ids = _registered_student_ids(exam_id)
+        if registered_ids != entry["registered_ids"]:
+            entry["registered_ids"] = registered_ids
+            entry["gallery"] = CACHED_KNOWN_FACES.subset(registered_ids)
+            entry["generation"] = CACHED_KNOWN_FACES.generation
+            entry["version"] = next(_EXAM_GALLERY_VERSIONS)
+            current_app.logger.info(f"Registrations of exam ID {exam_id} changed; exam sub-gallery rebuilt ({len(entry['gallery'])} face(s)).")
+    if entry["generation"] != CACHED_KNOWN_FACES.generation:
+        entry["gallery"] = CACHED_KNOWN_FACES.subset(entry["registered_ids"])
+        entry["generation"] = CACHED_KNOWN_FACES.generation
+    return entry
+
+def _registered_student_ids(exam_id):
+    """IDs of the students registered for an exam, straight from the association table."""
+    return {student_id for (student_id,) in db.session.query(exam_registrations.c.student_id)
+            .filter(exam_registrations.c.exam_id == exam_id)}
+
+def clear_exam_galleries(exam_id=None):
+    """Drops cached exam sub-galleries, optionally for a specific exam only."""
+    with _FACE_CACHE_LOCK:
+        if exam_id:
+            EXAM_GALLERIES.pop(exam_id, None)
+        else:
+            EXAM_GALLERIES.clear()
 
 def _log_student_attendance(student_id, exam_id, student_name_for_log, status_to_log):
     """
@@ -122,28 +584,23 @@ def _log_student_attendance(student_id, exam_id, student_name_for_log, status_to
     with the determined status.
     Returns True if logged, False otherwise.
     """
-    global RECENTLY_LOGGED_STUDENTS
     now = datetime.utcnow()
 
-    if exam_id not in RECENTLY_LOGGED_STUDENTS:
-        RECENTLY_LOGGED_STUDENTS[exam_id] = {}
+    # Present only while the student's cooldown for this exam is running
+    last_log_time = RECENTLY_LOGGED_STUDENTS.get((exam_id, student_id))
 
-    last_log_time = RECENTLY_LOGGED_STUDENTS[exam_id].get(student_id)
-
-    if last_log_time is None or (now - last_log_time) > timedelta(seconds=LOG_COOLDOWN_SECONDS):
+    if last_log_time is None:
         try:
             # Student and Exam objects should exist if we've reached this point through valid IDs.
             # No need to query Student.query.get(student_id) again if student_id is from cache.
             # Exam.query.get(exam_id) was already done in the calling function.
-            log_entry = Log(student_id=student_id, exam_id=exam_id, timestamp=now, status=status_to_log)
-            db.session.add(log_entry)
-            db.session.commit()
-            RECENTLY_LOGGED_STUDENTS[exam_id][student_id] = now
+            # The row is written by the background writer in a batch with other logs (no commit here).
+            get_log_writer(current_app._get_current_object()).enqueue(student_id, exam_id, now, status_to_log)
+            RECENTLY_LOGGED_STUDENTS.set((exam_id, student_id), now)
             if current_app:
-                current_app.logger.info(f"Attendance logged for {student_name_for_log} (ID: {student_id}) for Exam ID: {exam_id} with status: {status_to_log}.")
+                current_app.logger.info(f"Attendance queued for {student_name_for_log} (ID: {student_id}) for Exam ID: {exam_id} with status: {status_to_log}.")
             return True
         except Exception as e:
-            db.session.rollback()
             if current_app:
                 current_app.logger.error(f"Error logging attendance for Student {student_name_for_log} (ID: {student_id}), Status: {status_to_log}: {e}")
             return False
@@ -156,8 +613,12 @@ def get_active_or_upcoming_exams():
 
 def clear_face_cache():
     """Clears the in-memory face cache."""
-    global CACHED_KNOWN_FACES
-    CACHED_KNOWN_FACES = {"ids": [], "names": [], "embeddings": []}
+    with _FACE_CACHE_LOCK:
+        CACHED_KNOWN_FACES.clear()
+        EXAM_GALLERIES.clear()
+        _FACE_CACHE_SYNC.update({"fingerprint": None, "synced_until": None}) # Next load is a full load
+        if _SHARED_GALLERY["store"] is not None:
+            _SHARED_GALLERY["store"].adopted_generation = 0 # ...starting from the shared gallery, if one is published
     if current_app:
         current_app.logger.info("In-memory face cache cleared.")
     else:
@@ -165,13 +626,11 @@ def clear_face_cache():
 
 def clear_recent_logs_cache(exam_id=None):
     """Clears the recent logs cache, optionally for a specific exam."""
-    global RECENTLY_LOGGED_STUDENTS
     if exam_id:
-        if exam_id in RECENTLY_LOGGED_STUDENTS:
-            del RECENTLY_LOGGED_STUDENTS[exam_id]
-            if current_app:
-                current_app.logger.info(f"Recent logs cache cleared for exam ID {exam_id}.")
+        RECENTLY_LOGGED_STUDENTS.discard_where(lambda key: key[0] == exam_id)
+        if current_app:
+            current_app.logger.info(f"Recent logs cache cleared for exam ID {exam_id}.")
     else:
-        RECENTLY_LOGGED_STUDENTS = {}
+        RECENTLY_LOGGED_STUDENTS.clear()
         if current_app:
             current_app.logger.info("Entire recent logs cache cleared.")
\ No newline at end of file
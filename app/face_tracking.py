@@ -0,0 +1,133 @@
+# app/face_tracking.py
+
+import time
+import itertools
+
+DEFAULT_IOU_THRESHOLD = 0.3 # Minimum box overlap for a detection to continue an existing track
+DEFAULT_REVERIFY_SECONDS = 5.0 # Re-encode a confidently identified track at least this often
+DEFAULT_UNCERTAIN_REVERIFY_SECONDS = 0.5 # Re-encode unknown / borderline tracks this often
+DEFAULT_MAX_MISSED_FRAMES = 3 # Drop a track after this many consecutive frames without a detection
+UNCERTAIN_DISTANCE = 0.42 # Matches closer to the 0.50 tolerance than this are treated as uncertain
+
+
+def box_iou(box_a, box_b):
+    """Intersection-over-union of two (top, right, bottom, left) boxes."""
+    top, right = max(box_a[0], box_b[0]), min(box_a[1], box_b[1])
+    bottom, left = min(box_a[2], box_b[2]), max(box_a[3], box_b[3])
+    intersection = max(0, right - left) * max(0, bottom - top)
+    if intersection == 0:
+        return 0.0
+    area_a = (box_a[1] - box_a[3]) * (box_a[2] - box_a[0])
+    area_b = (box_b[1] - box_b[3]) * (box_b[2] - box_b[0])
+    return intersection / float(area_a + area_b - intersection)
+
+
+def associate_boxes(track_boxes, face_locations, iou_threshold=DEFAULT_IOU_THRESHOLD):
+    """
+    Greedy IoU association of detections with existing track boxes (best overlaps first).
+    Returns a list parallel to `face_locations` holding the matched track index, or None.
+    """
+    pairs = sorted(
+        ((box_iou(track_box, box), t, d)
+         for t, track_box in enumerate(track_boxes)
+         for d, box in enumerate(face_locations)),
+        reverse=True
+    )
+    assigned = [None] * len(face_locations)
+    used_tracks = set()
+    for iou, t, d in pairs:
+        if iou < iou_threshold:
+            break
+        if t in used_tracks or assigned[d] is not None:
+            continue
+        used_tracks.add(t)
+        assigned[d] = t
+    return assigned
+
+
+class FaceTracker:
+    """
+    Carries face identities across frames so that face_encodings (the expensive dlib step) only
+    runs for a face when its track is new, its identity is uncertain, or its re-verification
+    interval has passed. Detections are associated with tracks by greedy IoU matching.
+
+    Each track is a dict:
+        {"track_id": int, "box": (top, right, bottom, left), "result": dict or None,
+         "distance": float or None, "verified_at": float, "missed": int}
+    where "result" is the last face result produced for the track by find_and_log_recognized_faces.
+    """
+
+    def __init__(self, iou_threshold=DEFAULT_IOU_THRESHOLD, reverify_seconds=DEFAULT_REVERIFY_SECONDS,
+                 uncertain_reverify_seconds=DEFAULT_UNCERTAIN_REVERIFY_SECONDS,
+                 max_missed_frames=DEFAULT_MAX_MISSED_FRAMES):
+        self.iou_threshold = iou_threshold
+        self.reverify_seconds = reverify_seconds
+        self.uncertain_reverify_seconds = uncertain_reverify_seconds
+        self.max_missed_frames = max_missed_frames
+        self.tracks = []
+        self._next_track_id = itertools.count(1)
+        self.generation = None # (Face cache generation, exam gallery version) the carried identities were computed against
+        # Counters for judging how much encoding work the tracker saves
+        self.stats = {"frames": 0, "faces": 0, "encodings": 0}
+
+    def update(self, face_locations):
+        """
+        Associates this frame's detections with tracks, creating tracks for unmatched detections
+        and ageing out tracks that were not seen.
+        Returns a list of tracks parallel to `face_locations`.
+        """
+        matched = associate_boxes([track["box"] for track in self.tracks], face_locations, self.iou_threshold)
+        assigned = [None if t is None else self.tracks[t] for t in matched]
+        used_tracks = {t for t in matched if t is not None}
+
+        surviving = []
+        for t, track in enumerate(self.tracks):
+            if t in used_tracks:
+                track["missed"] = 0
+                surviving.append(track)
+            else:
+                track["missed"] += 1
+                if track["missed"] <= self.max_missed_frames:
+                    surviving.append(track)
+
+        for d, box in enumerate(face_locations):
+            if assigned[d] is None:
+                assigned[d] = {"track_id": next(self._next_track_id), "box": box, "result": None,
+                               "distance": None, "verified_at": 0.0, "missed": 0}
+                surviving.append(assigned[d])
+            else:
+                assigned[d]["box"] = box
+
+        self.tracks = surviving
+        self.stats["frames"] += 1
+        self.stats["faces"] += len(face_locations)
+        return assigned
+
+    def needs_encoding(self, track, now=None):
+        """True if the track's face must be (re-)encoded on this frame."""
+        if track["result"] is None:
+            return True # New track
+        now = time.monotonic() if now is None else now
+        uncertain = track["result"]["student_id"] is None or (track["distance"] or 0.0) > UNCERTAIN_DISTANCE
+        interval = self.uncertain_reverify_seconds if uncertain else self.reverify_seconds
+        return now - track["verified_at"] >= interval
+
+    def encoding_hints(self, now=None):
+        """
+        Picklable summary of the current tracks for a recognition worker process:
+        a list of (box, needs_encoding) pairs, where needs_encoding says whether a detection
+        continuing that track must be re-encoded. Detections matching no track always need encoding.
+        """
+        now = time.monotonic() if now is None else now
+        return [(track["box"], self.needs_encoding(track, now)) for track in self.tracks]
+
+    def record(self, track, result, distance, now=None):
+        """Stores a fresh recognition result on a track."""
+        track["result"] = result
+        track["distance"] = distance
+        track["verified_at"] = time.monotonic() if now is None else now
+        self.stats["encodings"] += 1
+
+    def reset(self):
+        """Forgets all tracks (e.g. after the known-faces cache changed)."""
+        self.tracks = []
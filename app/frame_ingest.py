@@ -0,0 +1,290 @@
+# app/frame_ingest.py
+
+import time
+import queue
+import atexit
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+import cv2
+import numpy as np
+from app.expiring_cache import ExpiringCache
+from app.face_tracking import FaceTracker
+
+DEFAULT_DECODE_THREADS = 4 # cv2.imdecode releases the GIL, so decodes of different clients overlap
+DEFAULT_MAX_BATCH = 12 # Frames recognized together; about one per entry point
+DEFAULT_BATCH_WAIT_SECONDS = 0.02 # How long the first frame of a batch waits for others to join it
+DEFAULT_MAX_PENDING = 48 # Frames accepted but not answered yet; beyond this, posts are refused (HTTP 503)
+DEFAULT_CLIENT_TTL_SECONDS = 60.0 # A client's face tracks are forgotten after this long without a frame
+DEFAULT_MAX_CLIENTS = 256
+_STOP = object() # Queue sentinel asking the batch thread to exit
+
+
+class FrameDecodeError(ValueError):
+    """The posted body is not a decodable image."""
+
+
+class _IngestFrame:
+    """One posted frame on its way through decoding and recognition."""
+
+    __slots__ = ("client_id", "exam_id", "data", "frame_rgb", "future", "received_at")
+
+    def __init__(self, client_id, exam_id, data):
+        self.client_id = client_id
+        self.exam_id = exam_id
+        self.data = data
+        self.frame_rgb = None
+        self.future = Future()
+        self.received_at = time.monotonic()
+
+
+class FrameIngestBatcher:
+    """
+    Face recognition for JPEG frames posted by browser cameras (tablets at exam hall entrances),
+    so one recognition server can serve many entry points without a camera of its own.
+
+    Posted frames are decoded on a small thread pool, then handed to a single batch thread. That
+    thread waits up to `batch_wait_seconds` after the first frame for frames from other clients and
+    recognizes up to `max_batch` frames together: with RECOGNITION_WORKERS enabled the batch's
+    detections and encodings are fanned out to the shared process pool at once (one frame per
+    worker in parallel), and the identification, logging and gallery checks then run for the whole
+    batch in one app context. Without workers the batch is recognized inline, frame after frame.
+
+    Each client keeps its own FaceTracker (keyed by client and exam), so a student standing in
+    front of a tablet is not re-encoded on every frame, exactly as with the attached camera. The
+    result of a frame is the list find_and_log_recognized_faces returns.
+
+    At most `max_pending` frames are accepted at a time; submit() returns None beyond that, and the
+    client simply sends its next frame later.
+    """
+
+    def __init__(self, app, decode_threads=DEFAULT_DECODE_THREADS, max_batch=DEFAULT_MAX_BATCH,
+                 batch_wait_seconds=DEFAULT_BATCH_WAIT_SECONDS, max_pending=DEFAULT_MAX_PENDING,
+                 client_ttl_seconds=DEFAULT_CLIENT_TTL_SECONDS, max_clients=DEFAULT_MAX_CLIENTS):
+        self.app = app
+        self.max_batch = max(1, int(max_batch))
+        self.batch_wait_seconds = batch_wait_seconds
+        self.max_pending = max_pending
+        self.detection_scale = app.config.get('FACE_DETECTION_SCALE', 1.0)
+        self._decode_pool = ThreadPoolExecutor(max_workers=decode_threads, thread_name_prefix="ingest-decode")
+        self._batch_queue = queue.Queue()
+        self._trackers = ExpiringCache(client_ttl_seconds, max_clients) # {(client_id, exam_id): FaceTracker}
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._unfinished = set() # Accepted frames whose future is not resolved yet (failed on stop)
+        self._seq = 0
+        self._stats = {
+            "received": 0, "refused": 0, "decode_failed": 0, "failed": 0, "recognized": 0, "faces": 0,
+            "batches": 0, "max_batch_size": 0, "avg_batch_size": None, "avg_latency_ms": None, "max_latency_ms": 0.0
+        }
+        self._stopped = False
+        from app.recognition_workers import resolve_worker_count, get_worker_pool
+        worker_count = resolve_worker_count(app.config.get('RECOGNITION_WORKERS'))
+        self._pool = get_worker_pool(worker_count) if worker_count > 0 else None
+        self._thread = threading.Thread(target=self._run, name="ingest-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, client_id, exam_id, data):
+        """
+        Queues one posted frame for decoding and recognition. Non-blocking.
+
+        Args:
+            client_id (str): Identifies the posting entry point (its face tracks are kept apart).
+            exam_id (int): The exam being authenticated at that entry point.
+            data (bytes): The encoded image (JPEG, or anything cv2.imdecode reads).
+
+        Returns:
+            concurrent.futures.Future or None: Resolves to the frame's face list (or raises
+            FrameDecodeError); None if too many frames are pending already.
+        """
+        with self._lock:
+            if self._stopped or self._pending >= self.max_pending:
+                self._stats["refused"] += 1
+                return None
+            self._pending += 1
+            self._stats["received"] += 1
+            item = _IngestFrame(client_id, exam_id, data)
+            self._unfinished.add(item)
+        try:
+            self._decode_pool.submit(self._decode, item)
+        except RuntimeError as e: # The pool shut down between the check above and here
+            self._finish(item, error=e, failed=True)
+        return item.future
+
+    def stats(self):
+        """Counters plus the current number of pending frames and tracked clients."""
+        with self._lock:
+            return dict(self._stats, pending=self._pending, clients=len(self._trackers))
+
+    def stop(self, timeout=5.0):
+        """
+        Refuses new frames, lets the batch thread finish its current batch and exits it. Frames
+        still waiting for a decode thread or a batch are failed, so no request waits for them.
+        """
+        with self._lock:
+            if self._stopped:
+                return
+            self._stopped = True
+        self._decode_pool.shutdown(wait=True, cancel_futures=True) # Cancelled decodes are failed below
+        self._batch_queue.put(_STOP)
+        self._thread.join(timeout)
+        with self._lock:
+            unfinished = list(self._unfinished)
+        for item in unfinished:
+            self._finish(item, error=RuntimeError("Frame ingest is shutting down."), failed=True)
+
+    # --- Decoding (thread pool) ---
+
+    def _decode(self, item):
+        # The executor would swallow an exception here, leaving the future (and a pending slot) unresolved
+        try:
+            frame = cv2.imdecode(np.frombuffer(item.data, dtype=np.uint8), cv2.IMREAD_COLOR)
+            item.data = None # The encoded bytes are not needed any more
+            if frame is None:
+                with self._lock:
+                    self._stats["decode_failed"] += 1
+                self._finish(item, error=FrameDecodeError("The posted frame is not a decodable image."))
+                return
+            # A new contiguous RGB array per frame: it may be pickled to a worker process after we return
+            item.frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        except Exception as e: # cv2.error on malformed input, MemoryError on absurd dimensions
+            self.app.logger.error(f"Decoding an ingested frame failed: {e}")
+            self._finish(item, error=e, failed=True)
+            return
+        self._batch_queue.put(item)
+
+    # --- Batching (one thread) ---
+
+    def _run(self):
+        while True:
+            item = self._batch_queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.batch_wait_seconds
+            stopping = False
+            while len(batch) < self.max_batch:
+                try:
+                    item = self._batch_queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            try:
+                self._recognize_batch(batch)
+            except Exception as e:
+                self.app.logger.error(f"Ingest batch of {len(batch)} frames failed: {e}", exc_info=True)
+                for item in batch:
+                    if not item.future.done():
+                        self._finish(item, error=e, failed=True)
+            if stopping:
+                break
+
+    def _tracker(self, item):
+        key = (item.client_id, item.exam_id)
+        tracker = self._trackers.get(key)
+        if tracker is None:
+            config = self.app.config
+            tracker = FaceTracker(
+                iou_threshold=config.get('FACE_TRACK_IOU_THRESHOLD', 0.3),
+                reverify_seconds=config.get('FACE_TRACK_REVERIFY_SECONDS', 5.0),
+                uncertain_reverify_seconds=config.get('FACE_TRACK_UNCERTAIN_REVERIFY_SECONDS', 0.5),
+                max_missed_frames=config.get('FACE_TRACK_MAX_MISSED_FRAMES', 3)
+            )
+        self._trackers.set(key, tracker) # (Re)starts the client's TTL
+        return tracker
+
+    def _recognize_batch(self, batch):
+        from app.face_rec_utils import find_and_log_recognized_faces, identify_and_log_faces
+        from app.recognition_workers import detect_and_encode
+        with self.app.app_context():
+            if self._pool is not None:
+                # Every frame of the batch goes to the worker pool before the first result is awaited
+                submitted = []
+                for item in batch:
+                    tracker = self._tracker(item)
+                    self._seq += 1
+                    future = self._pool.submit(detect_and_encode, self._seq, item.frame_rgb, self.detection_scale, None,
+                                               tracker.encoding_hints(), tracker.iou_threshold)
+                    submitted.append((item, tracker, future))
+                for item, tracker, future in submitted:
+                    try:
+                        result = future.result()
+                    except Exception as e: # e.g. BrokenProcessPool after a worker crashed
+                        self.app.logger.error(f"Recognition worker failed on an ingested frame: {e}")
+                        self._finish(item, error=e, failed=True)
+                        continue
+                    faces = identify_and_log_faces(
+                        result["face_locations"], lambda indices: [result["encodings"].get(i) for i in indices],
+                        item.exam_id, tracker=tracker
+                    )
+                    self._finish(item, faces=faces)
+            else:
+                for item in batch:
+                    faces = find_and_log_recognized_faces(item.frame_rgb, item.exam_id, tracker=self._tracker(item),
+                                                          detection_scale=self.detection_scale)
+                    self._finish(item, faces=faces)
+        with self._lock:
+            size = len(batch)
+            self._stats["batches"] += 1
+            self._stats["max_batch_size"] = max(self._stats["max_batch_size"], size)
+            previous = self._stats["avg_batch_size"]
+            self._stats["avg_batch_size"] = round(size if previous is None else 0.8 * previous + 0.2 * size, 2)
+
+    def _finish(self, item, faces=None, error=None, failed=False):
+        """Resolves a frame's future and updates the counters (once; later calls are ignored)."""
+        item.frame_rgb = None
+        latency_ms = (time.monotonic() - item.received_at) * 1000.0
+        with self._lock:
+            if item not in self._unfinished:
+                return # Already resolved, e.g. failed by stop() while its batch was running
+            self._unfinished.discard(item)
+            self._pending -= 1
+            if failed:
+                self._stats["failed"] += 1
+            elif error is None:
+                self._stats["recognized"] += 1
+                self._stats["faces"] += len(faces)
+                self._stats["max_latency_ms"] = round(max(self._stats["max_latency_ms"], latency_ms), 2)
+                previous = self._stats["avg_latency_ms"]
+                self._stats["avg_latency_ms"] = round(latency_ms if previous is None else 0.8 * previous + 0.2 * latency_ms, 2)
+        if error is not None:
+            item.future.set_exception(error)
+        else:
+            item.future.set_result(faces)
+
+
+# One batcher per process, created on first use by get_ingest_batcher.
+_INGEST_BATCHER = {"batcher": None}
+_INGEST_BATCHER_LOCK = threading.Lock()
+
+
+def get_ingest_batcher(app):
+    """Returns this process's FrameIngestBatcher, starting it (configured from `app`) on first use."""
+    with _INGEST_BATCHER_LOCK:
+        if _INGEST_BATCHER["batcher"] is None:
+            _INGEST_BATCHER["batcher"] = FrameIngestBatcher(
+                app,
+                decode_threads=app.config.get('INGEST_DECODE_THREADS', DEFAULT_DECODE_THREADS),
+                max_batch=app.config.get('INGEST_MAX_BATCH', DEFAULT_MAX_BATCH),
+                batch_wait_seconds=app.config.get('INGEST_BATCH_WAIT_SECONDS', DEFAULT_BATCH_WAIT_SECONDS),
+                max_pending=app.config.get('INGEST_MAX_PENDING', DEFAULT_MAX_PENDING),
+                client_ttl_seconds=app.config.get('INGEST_CLIENT_TTL_SECONDS', DEFAULT_CLIENT_TTL_SECONDS)
+            )
+        return _INGEST_BATCHER["batcher"]
+
+
+def ingest_stats():
+    """Stats of the running batcher, or None if no frame has been posted to this process yet."""
+    batcher = _INGEST_BATCHER["batcher"]
+    return batcher.stats() if batcher is not None else None
+
+
+def _stop_ingest_batcher():
+    batcher = _INGEST_BATCHER["batcher"]
+    if batcher is not None:
+        batcher.stop()
+
+
+atexit.register(_stop_ingest_batcher)
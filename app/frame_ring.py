@@ -0,0 +1,163 @@
+# app/frame_ring.py
+
+import os
+import json
+import struct
+from multiprocessing import shared_memory, resource_tracker
+
+RING_MAGIC = 0x45585247 # "EXRG"
+RING_VERSION = 1
+DEFAULT_SLOT_COUNT = 4 # Frames kept in the ring; readers only ever want the newest
+DEFAULT_SLOT_SIZE = 1024 * 1024 # Largest encoded frame (multipart chunk) a slot can hold
+STATUS_BYTES = 8192 # Room for the JSON status document published next to the frames
+
+# Header: magic, version, slot_count, slot_size, write_seq, status_seq, status_len, closed
+_HEADER = struct.Struct("<IIIIQQII")
+_HEADER_SIZE = 64
+_SLOT_HEADER = struct.Struct("<QI") # seq, length
+_SLOT_HEADER_SIZE = 16
+
+
+def ring_name(prefix, exam_id, generation):
+    """
+    Shared memory name of a frame ring the recognition daemon publishes for an exam.
+    Every stream start gets a new generation, so a stopping stream can never remove its successor's ring.
+    """
+    return f"{prefix}_{os.getpid()}_exam_{exam_id}_{generation}"
+
+
+class FrameRing:
+    """
+    Single-writer, many-reader ring of encoded frames in POSIX shared memory.
+
+    The recognition daemon writes every annotated frame of an exam stream into the next slot and
+    a small JSON status document (latest recognition status and pipeline stats) into a fixed area.
+    Web workers attach by name and copy out the newest frame; nothing is sent per frame over a
+    socket and readers never block the writer.
+
+    Consistency uses sequence numbers: a slot's seq is zeroed while it is being written and set to
+    the frame's seq afterwards, and the status seq is odd while the status is being written. Readers
+    retry when what they copied changed underneath them.
+    """
+
+    def __init__(self, shm, owner):
+        self._shm = shm
+        self._owner = owner
+        magic, version, self.slot_count, self.slot_size = struct.unpack_from("<IIII", shm.buf, 0)
+        if magic != RING_MAGIC or version != RING_VERSION:
+            raise ValueError(f"Shared memory {shm.name} is not a version {RING_VERSION} frame ring.")
+        self._status_offset = _HEADER_SIZE
+        self._slots_offset = _HEADER_SIZE + STATUS_BYTES
+
+    @classmethod
+    def create(cls, name, slot_count=DEFAULT_SLOT_COUNT, slot_size=DEFAULT_SLOT_SIZE):
+        """Creates (replacing a stale one left by a crashed daemon) and initializes a ring."""
+        size = _HEADER_SIZE + STATUS_BYTES + slot_count * (_SLOT_HEADER_SIZE + slot_size)
+        try:
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+        except FileNotFoundError:
+            pass
+        shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        _HEADER.pack_into(shm.buf, 0, RING_MAGIC, RING_VERSION, slot_count, slot_size, 0, 0, 0, 0)
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name):
+        """Attaches to an existing ring. Raises FileNotFoundError if it does not exist."""
+        shm = shared_memory.SharedMemory(name=name)
+        # Readers must not unlink the segment when they exit; only the creating daemon owns it.
+        # (Python registers every attach with the resource tracker, which would do exactly that.)
+        try:
+            resource_tracker.unregister(shm._name, "shared_memory")
+        except Exception:
+            pass
+        return cls(shm, owner=False)
+
+    @property
+    def name(self):
+        return self._shm.name
+
+    def _header(self):
+        return _HEADER.unpack_from(self._shm.buf, 0)
+
+    @property
+    def write_seq(self):
+        return self._header()[4]
+
+    @property
+    def closed(self):
+        """True once the writer has stopped publishing to this ring."""
+        return bool(self._header()[7])
+
+    def _slot_offset(self, seq):
+        return self._slots_offset + ((seq - 1) % self.slot_count) * (_SLOT_HEADER_SIZE + self.slot_size)
+
+    def write_frame(self, data):
+        """
+        Publishes one encoded frame. Returns its sequence number, or None if it does not fit a slot.
+        """
+        if len(data) > self.slot_size:
+            return None
+        seq = self.write_seq + 1
+        offset = self._slot_offset(seq)
+        _SLOT_HEADER.pack_into(self._shm.buf, offset, 0, 0) # Mark the slot as being written
+        self._shm.buf[offset + _SLOT_HEADER_SIZE:offset + _SLOT_HEADER_SIZE + len(data)] = data
+        _SLOT_HEADER.pack_into(self._shm.buf, offset, seq, len(data))
+        struct.pack_into("<Q", self._shm.buf, 16, seq)
+        return seq
+
+    def read_latest(self, after_seq=0):
+        """
+        Copies out the newest frame if it is newer than `after_seq`.
+        Returns (seq, bytes), or (after_seq, None) if there is no newer frame.
+        """
+        for _ in range(3): # The writer may lap the slot while we copy; retry with the new newest
+            seq = self.write_seq
+            if seq <= after_seq:
+                return after_seq, None
+            offset = self._slot_offset(seq)
+            slot_seq, length = _SLOT_HEADER.unpack_from(self._shm.buf, offset)
+            if slot_seq != seq:
+                continue
+            data = bytes(self._shm.buf[offset + _SLOT_HEADER_SIZE:offset + _SLOT_HEADER_SIZE + length])
+            if _SLOT_HEADER.unpack_from(self._shm.buf, offset)[0] == seq:
+                return seq, data
+        return after_seq, None
+
+    def write_status(self, document):
+        """Publishes a JSON-serializable status document (truncated documents are refused)."""
+        data = json.dumps(document, default=str).encode("utf-8")
+        if len(data) > STATUS_BYTES:
+            return False
+        status_seq = self._header()[5]
+        struct.pack_into("<Q", self._shm.buf, 24, status_seq + 1) # Odd: write in progress
+        self._shm.buf[self._status_offset:self._status_offset + len(data)] = data
+        struct.pack_into("<I", self._shm.buf, 32, len(data))
+        struct.pack_into("<Q", self._shm.buf, 24, status_seq + 2)
+        return True
+
+    def read_status(self):
+        """Returns the last published status document, or None if there is none (yet)."""
+        for _ in range(5):
+            _, _, _, _, _, status_seq, status_len, _ = self._header()
+            if status_seq == 0:
+                return None
+            if status_seq % 2:
+                continue
+            data = bytes(self._shm.buf[self._status_offset:self._status_offset + status_len])
+            if self._header()[5] == status_seq:
+                return json.loads(data.decode("utf-8"))
+        return None
+
+    def close(self):
+        """Detaches from the ring. The owner also marks it closed and removes it."""
+        if self._owner:
+            struct.pack_into("<I", self._shm.buf, 36, 1)
+        self._shm.close()
+        if self._owner:
+            try:
+                self._shm.unlink()
+            except FileNotFoundError:
+                pass
@@ -1,4 +1,5 @@
 from datetime import datetime
+import numpy as np
 from app import db, login_manager
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
@@ -21,12 +22,39 @@ class User(UserMixin, db.Model): # For Admins
     def __repr__(self):
         return f'<User {self.username}>'
 
+class Float32Embedding(db.TypeDecorator):
+    """
+    Stores a face embedding as raw little-endian float32 bytes (512 bytes for a 128-d embedding).
+    Loaded values are read-only float32 arrays viewing the fetched bytes (np.frombuffer), so no
+    unpickling or per-row float64 allocation happens when the gallery is loaded.
+    """
+    impl = db.LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return np.asarray(value, dtype='<f4').tobytes()
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return np.frombuffer(value, dtype='<f4')
+
+    def compare_values(self, x, y):
+        # The default `x == y` is element-wise (and ambiguous) for NumPy arrays
+        if x is None or y is None:
+            return x is y
+        return np.array_equal(x, y)
+
 class Student(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     student_id_number = db.Column(db.String(20), unique=True, nullable=False)
     name = db.Column(db.String(100), nullable=False)
     face_image_path = db.Column(db.String(200), nullable=True) # Path to the stored image
-    face_embedding = db.Column(db.PickleType, nullable=True) # Storing embedding as a pickled object (e.g., numpy array)
+    face_embedding = db.Column(Float32Embedding, nullable=True) # 128 float32 values as raw bytes (see Float32Embedding)
+    # Bumped on every change; lets the face cache pick up only rows changed since its last sync
+    updated_at = db.Column(db.DateTime, nullable=True, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     logs = db.relationship('Log', backref='student', lazy=True)
 
     def __repr__(self):
@@ -57,11 +85,19 @@ exam_registrations = db.Table('exam_registrations',
 )
 
 class Log(db.Model):
+    # One row per (exam, student, status) per dedup time bucket, enforced by the database so repeated
+    # sightings from any process (or after a restart) update the row instead of adding new ones
+    __table_args__ = (
+        db.UniqueConstraint('exam_id', 'student_id', 'status', 'bucket', name='uq_log_exam_student_status_bucket'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     student_id = db.Column(db.Integer, db.ForeignKey('student.id'), nullable=False)
     exam_id = db.Column(db.Integer, db.ForeignKey('exam.id'), nullable=False)
     timestamp = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     status = db.Column(db.String(50), nullable=False) # e.g., "Verified", "Not Found", "Error"
+    bucket = db.Column(db.Integer, nullable=False) # Seconds since the epoch of `timestamp` // LOG_DEDUP_BUCKET_SECONDS
+    seen_count = db.Column(db.Integer, nullable=False, default=1, server_default='1') # Sightings merged into this row
+    last_seen = db.Column(db.DateTime, nullable=True) # Latest of those sightings
 
     def __repr__(self):
         return f'<Log {self.student_id} for Exam {self.exam_id} at {self.timestamp} - Status: {self.status}>'
@@ -0,0 +1,251 @@
+# app/recognition_daemon.py
+
+import os
+import json
+import time
+import socket
+import threading
+import socketserver
+from app.frame_ring import FrameRing, ring_name
+from app.attendance_log import log_writer_stats
+
+DEFAULT_RING_PREFIX = "exam_auth"
+DEFAULT_VIEWER_LEASE_SECONDS = 15.0 # A viewer that has not renewed its lease for this long is dropped
+DEFAULT_CACHE_REFRESH_SECONDS = 30.0 # How often the daemon re-checks the face data / exam galleries
+CONTROL_TIMEOUT_SECONDS = 2.0 # Client-side timeout for one control request
+RING_VIEWER_ID = "frame-ring" # The daemon's own FrameHub subscriber that feeds the shared memory ring
+
+
+def daemon_request(socket_path, command, **params):
+    """
+    Sends one control request to the recognition daemon over its Unix socket.
+
+    The protocol is one JSON object per line in each direction, e.g.
+    {"cmd": "acquire", "exam_id": 3, "viewer_id": "ab12"} -> {"ok": true, "ring": "exam_auth_812_exam_3_1"}.
+
+    Returns:
+        dict: The daemon's reply. Raises OSError if the daemon is not reachable.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(CONTROL_TIMEOUT_SECONDS)
+        sock.connect(socket_path)
+        sock.sendall(json.dumps(dict(params, cmd=command)).encode("utf-8") + b"\n")
+        reply = sock.makefile("rb").readline()
+    if not reply:
+        raise OSError("Recognition daemon closed the connection without replying.")
+    return json.loads(reply.decode("utf-8"))
+
+
+class RecognitionDaemon:
+    """
+    Long-lived process that owns the camera and all recognition work for live authentication.
+
+    Each exam stream runs the same pipeline the web process uses in-process (a FrameHub driving
+    routes.generate_frames). Instead of HTTP viewers, the hub has a single subscriber that copies
+    every annotated frame, plus the latest recognition status and pipeline stats, into a
+    shared-memory FrameRing. Web workers only read that ring, so they can be scaled under gunicorn
+    without each opening the camera or loading dlib.
+
+    Web workers control the daemon over a Unix socket: `acquire` / `release` a viewer for an exam,
+    `renew` the viewer's lease while streaming, look up an exam's `ring`, and `stats`. A stream is
+    stopped once it has no viewers left; viewers whose lease expires (e.g. a crashed web worker)
+    are dropped.
+    """
+
+    def __init__(self, app, socket_path, ring_prefix=DEFAULT_RING_PREFIX,
+                 lease_seconds=DEFAULT_VIEWER_LEASE_SECONDS, cache_refresh_seconds=DEFAULT_CACHE_REFRESH_SECONDS):
+        self.app = app
+        self.socket_path = socket_path
+        self.ring_prefix = ring_prefix
+        self.lease_seconds = lease_seconds
+        self.cache_refresh_seconds = cache_refresh_seconds
+        self._lock = threading.Lock()
+        self._streams = {} # {exam_id: {"hub": FrameHub, "ring": FrameRing, "viewers": {viewer_id: expires_at}}}
+        self._ring_generation = 0
+        self._server = None
+        self._stopping = threading.Event()
+
+    # --- Control requests ---
+
+    def handle_request(self, request):
+        """Dispatches one decoded control request and returns the reply dict."""
+        command = request.get("cmd")
+        try:
+            if command == "ping":
+                return {"ok": True, "pid": os.getpid()}
+            if command == "acquire":
+                return self.acquire(int(request["exam_id"]), str(request["viewer_id"]))
+            if command == "renew":
+                return self.renew(int(request["exam_id"]), str(request["viewer_id"]))
+            if command == "ring":
+                return self.ring(int(request["exam_id"]))
+            if command == "release":
+                return self.release(int(request["exam_id"]), request.get("viewer_id"))
+            if command == "stats":
+                return {"ok": True, "streams": self.stats()}
+        except (KeyError, ValueError, TypeError) as e:
+            return {"ok": False, "error": f"Bad request: {e}"}
+        return {"ok": False, "error": f"Unknown command: {command}"}
+
+    def acquire(self, exam_id, viewer_id):
+        """Registers a viewer for an exam, starting the exam's stream if needed."""
+        from app.routes import subscribe_to_exam_stream
+        from app.face_rec_utils import load_known_faces_from_db, build_exam_gallery, clear_recent_logs_cache
+        with self._lock:
+            stream = self._streams.get(exam_id)
+            if stream is None or stream["hub"].stopped:
+                with self.app.app_context():
+                    load_known_faces_from_db() # No-op unless the face data changed
+                    if build_exam_gallery(exam_id) is None:
+                        return {"ok": False, "error": f"Exam {exam_id} not found."}
+                    clear_recent_logs_cache(exam_id=exam_id)
+                self._ring_generation += 1
+                ring = FrameRing.create(ring_name(self.ring_prefix, exam_id, self._ring_generation),
+                                        slot_count=self.app.config.get('RECOGNITION_DAEMON_RING_SLOTS', 4),
+                                        slot_size=self.app.config.get('RECOGNITION_DAEMON_RING_SLOT_BYTES', 1024 * 1024))
+                hub = subscribe_to_exam_stream(exam_id, RING_VIEWER_ID, self.app)
+                stream = {"hub": hub, "ring": ring, "viewers": {}}
+                self._streams[exam_id] = stream
+                threading.Thread(target=self._publish, args=(exam_id, stream), name=f"ring-writer-{exam_id}",
+                                 daemon=True).start()
+            stream["viewers"][viewer_id] = time.monotonic() + self.lease_seconds
+            return {"ok": True, "ring": stream["ring"].name, "viewers": len(stream["viewers"])}
+
+    def ring(self, exam_id):
+        """Name of the ring an exam is currently published to (for readers that did not acquire it)."""
+        with self._lock:
+            stream = self._streams.get(exam_id)
+            if stream is None:
+                return {"ok": False, "error": "No stream for this exam."}
+            return {"ok": True, "ring": stream["ring"].name}
+
+    def renew(self, exam_id, viewer_id):
+        """Extends a viewer's lease. Returns ok=False if the viewer (or stream) is gone."""
+        with self._lock:
+            stream = self._streams.get(exam_id)
+            if stream is None or viewer_id not in stream["viewers"]:
+                return {"ok": False, "error": "Unknown viewer."}
+            stream["viewers"][viewer_id] = time.monotonic() + self.lease_seconds
+            return {"ok": True}
+
+    def release(self, exam_id, viewer_id=None):
+        """Removes one viewer (or all viewers if viewer_id is None); stops the stream when none remain."""
+        with self._lock:
+            stream = self._streams.get(exam_id)
+            if stream is None:
+                return {"ok": True, "viewers": 0}
+            if viewer_id is None:
+                stream["viewers"].clear()
+            else:
+                stream["viewers"].pop(str(viewer_id), None)
+            remaining = len(stream["viewers"])
+            if remaining == 0:
+                self._stop_stream_locked(exam_id)
+        return {"ok": True, "viewers": remaining}
+
+    def stats(self):
+        """Per-exam viewer counts and the pipeline stats last published to each ring."""
+        with self._lock:
+            streams = dict(self._streams)
+        result = {}
+        for exam_id, stream in streams.items():
+            try:
+                result[str(exam_id)] = {"viewers": len(stream["viewers"]), "frames": stream["ring"].write_seq,
+                                        "status": stream["ring"].read_status()}
+            except (ValueError, TypeError):
+                pass # The stream ended and its ring was closed meanwhile
+        return result
+
+    # --- Streams ---
+
+    def _stop_stream_locked(self, exam_id):
+        stream = self._streams.pop(exam_id, None)
+        if stream is not None:
+            stream["hub"].unsubscribe(RING_VIEWER_ID) # Ends _publish, which closes the ring
+
+    def _publish(self, exam_id, stream):
+        """Copies the hub's frames, the recognition status and the pipeline stats into the ring."""
+        from app import routes
+        ring = stream["ring"]
+        try:
+            for chunk in stream["hub"].frames(RING_VIEWER_ID):
+                if ring.write_frame(chunk) is None:
+                    self.app.logger.warning(f"Frame of {len(chunk)} bytes does not fit the ring slot; skipped.")
+                status = routes.recognition_status_store(self.app).get(exam_id)
+                ring.write_status({
+                    "status": status,
+                    "status_age_seconds": time.time() - status["timestamp"] if status else None,
+                    "written_at": time.time(),
+                    "pipeline": dict(routes.PIPELINE_STATS.get(exam_id) or {}, log_writer=log_writer_stats(),
+                                     caches=routes.cache_stats(self.app))
+                })
+        finally:
+            ring.close()
+            with self._lock:
+                if self._streams.get(exam_id) is stream:
+                    self._streams.pop(exam_id, None) # The pipeline ended on its own (e.g. camera failure)
+            self.app.logger.info(f"Recognition daemon stopped publishing exam {exam_id}.")
+
+    def _housekeeping(self):
+        """Expires viewer leases and periodically refreshes the face cache and running exam galleries."""
+        from app.face_rec_utils import load_known_faces_from_db, build_exam_gallery
+        last_refresh = time.monotonic()
+        while not self._stopping.wait(1.0):
+            now = time.monotonic()
+            with self._lock:
+                for exam_id, stream in list(self._streams.items()):
+                    expired = [viewer for viewer, expires_at in stream["viewers"].items() if expires_at < now]
+                    for viewer in expired:
+                        stream["viewers"].pop(viewer, None)
+                        self.app.logger.info(f"Viewer {viewer} of exam {exam_id} timed out.")
+                    if not stream["viewers"]:
+                        self._stop_stream_locked(exam_id)
+                running = list(self._streams)
+            if now - last_refresh >= self.cache_refresh_seconds:
+                last_refresh = now
+                # Students and registrations are edited in the web process; pick those changes up here
+                with self.app.app_context():
+                    try:
+                        load_known_faces_from_db()
+                        for exam_id in running:
+                            build_exam_gallery(exam_id)
+                    except Exception as e:
+                        self.app.logger.error(f"Recognition daemon cache refresh failed: {e}")
+
+    # --- Server ---
+
+    def serve_forever(self):
+        """Runs the control socket until interrupted, then stops every stream."""
+        daemon = self
+
+        class _Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                line = self.rfile.readline()
+                try:
+                    reply = daemon.handle_request(json.loads(line.decode("utf-8")))
+                except ValueError:
+                    reply = {"ok": False, "error": "Malformed request."}
+                self.wfile.write(json.dumps(reply, default=str).encode("utf-8") + b"\n")
+
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path) # Left behind by a previous run
+        self._server = socketserver.ThreadingUnixStreamServer(self.socket_path, _Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._housekeeping, name="daemon-housekeeping", daemon=True).start()
+        self.app.logger.info(f"Recognition daemon listening on {self.socket_path}.")
+        try:
+            self._server.serve_forever()
+        finally:
+            self.shutdown()
+
+    def shutdown(self):
+        """Stops all streams, closes the control socket and removes it."""
+        self._stopping.set()
+        with self._lock:
+            for exam_id in list(self._streams):
+                self._stop_stream_locked(exam_id)
+        if self._server is not None:
+            self._server.server_close()
+            self._server = None
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
@@ -0,0 +1,182 @@
+# app/recognition_workers.py
+
+import os
+import time
+import atexit
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from app.face_tracking import associate_boxes, DEFAULT_IOU_THRESHOLD
+
+DEFAULT_QUEUE_SIZE = 2 # Frames waiting for a free worker; older ones are dropped for newer ones
+
+# Process pool shared by every stream pipeline of this process, created on first use.
+_WORKER_POOL = {"pool": None, "workers": 0}
+_WORKER_POOL_LOCK = threading.Lock()
+
+
+def resolve_worker_count(configured):
+    """RECOGNITION_WORKERS semantics: None means one worker per CPU core, 0 disables the pool."""
+    if configured is None:
+        return os.cpu_count() or 1
+    return max(0, int(configured))
+
+
+def get_worker_pool(workers):
+    """
+    Returns the shared recognition process pool, creating it with `workers` processes on first use.
+    Workers are started with the "spawn" method: the web process runs camera and streaming threads,
+    and forking a multi-threaded process can leave locks held in the child.
+    """
+    with _WORKER_POOL_LOCK:
+        if _WORKER_POOL["pool"] is None:
+            _WORKER_POOL["pool"] = ProcessPoolExecutor(max_workers=workers,
+                                                       mp_context=multiprocessing.get_context("spawn"))
+            _WORKER_POOL["workers"] = workers
+            for _ in range(workers):
+                _WORKER_POOL["pool"].submit(_warm_up) # Start the workers and load dlib before the first frame
+        return _WORKER_POOL["pool"]
+
+
+def _warm_up():
+    import face_recognition # noqa: F401 (loading dlib's models is the slow part of a worker's start)
+    import app.face_rec_utils # noqa: F401
+
+
+def shutdown_worker_pool():
+    """Stops the shared pool (registered with atexit; also usable from tests or CLI commands)."""
+    with _WORKER_POOL_LOCK:
+        pool = _WORKER_POOL["pool"]
+        _WORKER_POOL.update({"pool": None, "workers": 0})
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+atexit.register(shutdown_worker_pool)
+
+
+def detect_and_encode(seq, frame_rgb, detection_scale, roi, track_hints, iou_threshold):
+    """
+    Worker-side half of recognition: face detection plus encodings for the faces that need them.
+
+    Faces are associated with the caller's tracks (see FaceTracker.encoding_hints) exactly as the
+    tracker will associate them, so only new faces and tracks due for re-verification are encoded.
+    Matching against the gallery, the tracker update and attendance logging stay in the web process
+    (identify_and_log_faces), which holds the live face cache and the database session.
+
+    Returns:
+        dict: {"seq", "face_locations", "encodings": {face index: encoding}, "seconds"}
+    """
+    import face_recognition
+    from app.face_rec_utils import detect_face_locations # Imported here: loads the app package once per worker
+    started = time.monotonic()
+    face_locations = detect_face_locations(frame_rgb, scale=detection_scale, roi=roi)
+    matched = associate_boxes([box for box, _ in track_hints], face_locations, iou_threshold)
+    to_encode = [d for d, t in enumerate(matched) if t is None or track_hints[t][1]]
+    encodings = face_recognition.face_encodings(frame_rgb, [face_locations[d] for d in to_encode]) if to_encode else []
+    return {
+        "seq": seq,
+        "face_locations": face_locations,
+        "encodings": dict(zip(to_encode, encodings)),
+        "seconds": time.monotonic() - started
+    }
+
+
+class RecognitionExecutor:
+    """
+    Runs detect_and_encode for one stream pipeline on the shared process pool.
+
+    At most one frame per worker is in flight; further frames wait in a small bounded queue that
+    drops its oldest frame when full, so a backlog never builds up behind slow recognition.
+    Completed results are handed back in frame sequence order by `collect`; a result that arrives
+    after a newer one has already been collected is discarded as stale.
+    """
+
+    def __init__(self, workers, detection_scale=1.0, roi=None, iou_threshold=DEFAULT_IOU_THRESHOLD,
+                 queue_size=DEFAULT_QUEUE_SIZE, logger_instance=None):
+        self._pool = get_worker_pool(workers)
+        self.workers = _WORKER_POOL["workers"] # The shared pool may have been sized by an earlier pipeline
+        self.detection_scale = detection_scale
+        self.roi = roi
+        self.iou_threshold = iou_threshold
+        self._logger = logger_instance
+        self._lock = threading.RLock() # add_done_callback runs _on_done inline if the future already finished
+        self._waiting = deque()
+        self._queue_size = queue_size
+        self._in_flight = 0
+        self._results = {} # {seq: result} completed but not yet collected
+        self._last_collected_seq = 0
+        self._closed = False
+        # Counters for judging the pool's throughput and how many frames it could not take
+        self.stats = {"submitted": 0, "completed": 0, "dropped": 0, "stale": 0, "failed": 0}
+
+    def submit(self, seq, frame_rgb, track_hints):
+        """
+        Queues a frame for recognition. Non-blocking.
+
+        Args:
+            seq (int): Frame sequence number (increasing).
+            frame_rgb: Contiguous RGB frame; it must not be modified afterwards.
+            track_hints: FaceTracker.encoding_hints() at submission time.
+        """
+        with self._lock:
+            if self._closed:
+                return
+            if len(self._waiting) >= self._queue_size:
+                self._waiting.popleft()
+                self.stats["dropped"] += 1
+            self._waiting.append((seq, frame_rgb, track_hints))
+            self._dispatch_locked()
+
+    def _dispatch_locked(self):
+        while self._waiting and self._in_flight < self.workers:
+            seq, frame_rgb, track_hints = self._waiting.popleft()
+            try:
+                future = self._pool.submit(detect_and_encode, seq, frame_rgb, self.detection_scale, self.roi,
+                                           track_hints, self.iou_threshold)
+            except Exception as e: # e.g. BrokenProcessPool after a worker crashed
+                self.stats["failed"] += 1
+                if self._logger:
+                    self._logger.error(f"Could not submit frame to recognition workers: {e}")
+                return
+            self._in_flight += 1
+            self.stats["submitted"] += 1
+            future.add_done_callback(self._on_done)
+
+    def _on_done(self, future):
+        with self._lock:
+            self._in_flight -= 1
+            if self._closed or future.cancelled():
+                return
+            error = future.exception()
+            if error is not None:
+                self.stats["failed"] += 1
+                if self._logger:
+                    self._logger.error(f"Recognition worker failed: {error}")
+            else:
+                result = future.result()
+                self._results[result["seq"]] = result
+                self.stats["completed"] += 1
+            self._dispatch_locked()
+
+    def collect(self):
+        """Returns the completed results newer than the last collected one, oldest first."""
+        with self._lock:
+            ready = sorted(self._results.items())
+            self._results = {}
+        fresh = []
+        for seq, result in ready:
+            if seq <= self._last_collected_seq:
+                self.stats["stale"] += 1
+                continue
+            self._last_collected_seq = seq
+            fresh.append(result)
+        return fresh
+
+    def close(self):
+        """Drops waiting frames and ignores results still in flight. The shared pool keeps running."""
+        with self._lock:
+            self._closed = True
+            self._waiting.clear()
+            self._results = {}
@@ -1,4 +1,4 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request, Response, current_app, send_from_directory
+from flask import Blueprint, render_template, redirect, url_for, flash, request, Response, current_app, send_from_directory, stream_with_context
 from flask_login import login_user, logout_user, login_required, current_user
 from app.models import User, Student, Exam, Log, exam_registrations
 from app.forms import LoginForm, StudentForm, ExamForm, ExamRegistrationForm
@@ -8,29 +8,94 @@ from app.face_rec_utils import (
     load_known_faces_from_db, 
     find_and_log_recognized_faces, 
     get_active_or_upcoming_exams,
-    clear_face_cache,
-    clear_recent_logs_cache
+    clear_recent_logs_cache,
+    identify_and_log_faces,
+    build_exam_gallery,
+    clear_exam_galleries,
+    update_cached_face,
+    remove_cached_face,
+    RECENTLY_LOGGED_STUDENTS
 )
+from app.face_tracking import FaceTracker
+from app.video_pipeline import AdaptiveRecognitionScheduler, MotionGate, FrameBuffers
+from app.camera_capture import LatestFrameCapture
+from app.camera_hub import FrameHub
+from app.stream_profiles import StreamFrame, stream_profiles, resolve_stream_profile, multipart_chunk
+from app.recognition_workers import RecognitionExecutor, resolve_worker_count
+from app.recognition_daemon import daemon_request
+from app.frame_ring import FrameRing
+from app.attendance_log import flush_attendance_logs, log_writer_stats
+from app.frame_ingest import get_ingest_batcher, ingest_stats, FrameDecodeError
+from app.expiring_cache import ExpiringCache
+from app.status_board import SharedStatusBoard, default_status_board_name
+from app.shared_gallery import shared_gallery_supported
 import os
 import logging # Added for fallback logger
-from datetime import datetime, timedelta
+from datetime import datetime
 import cv2 # For OpenCV
 import numpy as np
 # import face_recognition # Already used in face_rec_utils & utils
 import base64
+import json
 import io
+import time
+import threading
+import functools
+import uuid
+from concurrent.futures import TimeoutError as FuturesTimeoutError
 
 bp = Blueprint('main', __name__)
 
-# Global camera object. Handled by initialize_camera and release_camera.
+# Global camera object (a LatestFrameCapture reading on its own thread). Handled by
+# initialize_camera and release_camera; streams share it through acquire_camera / drop_camera_reference.
 camera = None 
-
-# Dictionary to store the latest recognition status for each active exam session
-# Not suitable for multi-worker production environments without a proper shared cache (e.g., Redis, Memcached)
-# For simplicity in this context, we'll use a global dict.
-# Structure: {exam_id: {"name": "Student Name", "status": "StatusString", "timestamp": datetime}}
-LATEST_RECOGNITION_STATUS = {}
+camera_index = None # Index the global camera was opened at (selects the FACE_DETECTION_ROIS entry)
+camera_users = 0 # Number of running stream pipelines holding the camera
+camera_lock = threading.Lock()
+
+# One FrameHub per exam: a single capture/recognition/encode pipeline broadcast to every open viewer.
+# Structure: {exam_id: FrameHub}
+STREAM_HUBS = {}
+stream_hubs_lock = threading.Lock()
+
+# With RECOGNITION_DAEMON_SOCKET set, the camera and recognition live in the recognition daemon
+# (flask recognition-daemon) and this process only reads its shared memory frame rings.
+# Structure: {exam_id: FrameRing} attached by this web worker for status reads
+DAEMON_RINGS = {}
+daemon_rings_lock = threading.Lock()
+DAEMON_POLL_SECONDS = 0.02 # How often a daemon-backed stream checks its ring for a new frame
+DAEMON_FRAME_TIMEOUT_SECONDS = 10.0 # End a daemon-backed stream after this long without a new frame
+
+# Latest recognition status for each active exam session. Normally kept on a shared memory board
+# (app/status_board.py) so /live_auth_status is answered correctly by any worker, not just the one
+# running the exam's pipeline; this in-process store is used when RECOGNITION_STATUS_SHARED_MEMORY is off.
+# Entries expire after RECOGNITION_STATUS_TTL_SECONDS (a stale status reads as missing) and both
+# stores are bounded, so exams that are never polled again do not accumulate.
+# Structure: {exam_id: {"name": "Student Name", "status": "StatusString", "timestamp": epoch seconds}}
 RECOGNITION_STATUS_TTL_SECONDS = 10 # How long to keep a status before considering it stale
+RECOGNITION_STATUS_MAX_ENTRIES = 1000
+LATEST_RECOGNITION_STATUS = ExpiringCache(RECOGNITION_STATUS_TTL_SECONDS, RECOGNITION_STATUS_MAX_ENTRIES)
+# Face boxes of the latest recognition pass per exam, for pages drawing overlays themselves
+# (LIVE_AUTH_OVERLAY_MODE = 'client'). Kept next to the statuses, on a second shared board.
+# Structure: {exam_id: {"width": int, "height": int, "faces": [{"box", "name", "status"}], "timestamp": epoch seconds}}
+LIVE_OVERLAYS = ExpiringCache(RECOGNITION_STATUS_TTL_SECONDS, RECOGNITION_STATUS_MAX_ENTRIES)
+OVERLAY_BOARD_PAYLOAD_BYTES = 4096 # Room for about 30 faces per frame
+_STATUS_BOARD = {"status": None, "overlay": None}
+_status_board_lock = threading.Lock()
+# Open /live_auth_events streams of this worker, per exam. A status or overlay written by this
+# process bumps the exam's version and wakes only that exam's streams, which push it at once;
+# statuses written by other processes are noticed within SSE_POLL_SECONDS. All conditions share
+# _status_watch_lock, and an entry exists only while the exam has open streams.
+# Structure: {exam_id: {"condition": Condition, "status": version, "overlay": version, "streams": int}}
+_STATUS_WATCHERS = {}
+_status_watch_lock = threading.Lock()
+SSE_POLL_SECONDS = 0.25
+SSE_OVERLAY_POLL_SECONDS = 0.05 # Overlays follow the recognition rate, so other workers' boxes are checked more often
+SSE_HEARTBEAT_SECONDS = 15.0 # Comment line sent on an idle event stream so proxies keep it open
+
+# Latest recognition cadence decisions per exam stream (see AdaptiveRecognitionScheduler.snapshot).
+# Structure: {exam_id: {"recognition_interval": int, "recognition_fps": float, "output_fps": float, ...}}
+PIPELINE_STATS = {}
 
 @bp.route('/uploads/<path:filename>')
 def uploaded_file(filename):
@@ -40,12 +105,13 @@ def uploaded_file(filename):
 def initialize_camera(logger_instance):
     """
     Initializes the global camera object if not already initialized.
-    Tries common camera indices (0, -1, 1, 2).
+    Tries common camera indices (0, -1, 1, 2). The opened capture is handed to a
+    LatestFrameCapture, whose background thread keeps only the freshest frame.
     Logs success or failure using the provided logger instance.
     Returns:
         bool: True if camera is initialized or was already initialized, False on failure.
     """
-    global camera
+    global camera, camera_index
     if camera is None:
         camera_indices_to_try = [0, -1, 1, 2] # Common indices
         for index in camera_indices_to_try:
@@ -54,12 +120,15 @@ def initialize_camera(logger_instance):
                 logger_instance.info(f"Attempting to initialize camera at index {index}...")
                 cap = cv2.VideoCapture(index)
                 if cap and cap.isOpened(): # Check if cap is not None before cap.isOpened()
-                    camera = cap
-                    logger_instance.info(f"Camera initialized successfully at index {index}.")
                     # Optional: Set camera properties for performance/consistency
-                    # camera.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-                    # camera.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
-                    # camera.set(cv2.CAP_PROP_FPS, 15) # Lower FPS can reduce CPU load
+                    # cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
+                    # cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
+                    # cap.set(cv2.CAP_PROP_FPS, 15) # Lower FPS can reduce CPU load
+                    # Client-side overlays send the camera's own JPEGs when it delivers MJPG
+                    passthrough = current_app.config.get('LIVE_AUTH_OVERLAY_MODE', 'server') == 'client'
+                    camera = LatestFrameCapture(cap, logger_instance, jpeg_passthrough=passthrough)
+                    camera_index = index
+                    logger_instance.info(f"Camera initialized successfully at index {index}.")
                     return True
                 elif cap: # If cap was created but not opened
                     cap.release()
@@ -75,18 +144,40 @@ def initialize_camera(logger_instance):
 def release_camera(logger_instance):
     """
     Releases the global camera object if it's currently initialized.
-    Also clears face recognition caches associated with a live session.
+    Also clears the recent logs cache associated with a live session. The face cache is kept:
+    it is versioned and kept current by row-level updates, so the next session reuses it.
     Uses the provided logger instance.
     """
-    global camera
+    global camera, camera_index
     if camera is not None:
-        logger_instance.info("Releasing camera resource.")
+        logger_instance.info(f"Releasing camera resource. Capture stats: {camera.stats}")
         camera.release()
         camera = None
+        camera_index = None
         # Clear caches as they are relevant to a live camera session
-        clear_face_cache() 
         clear_recent_logs_cache() # Clears all recently logged students across exams
-        logger_instance.info("Face cache and recent logs cache cleared.")
+        logger_instance.info("Recent logs cache cleared.")
+
+def acquire_camera(logger_instance):
+    """
+    Takes a reference on the shared camera, initializing it for the first user.
+    Returns:
+        bool: True if the camera is available (the caller must later call drop_camera_reference).
+    """
+    global camera_users
+    with camera_lock:
+        if not initialize_camera(logger_instance) or camera is None:
+            return False
+        camera_users += 1
+        return True
+
+def drop_camera_reference(logger_instance):
+    """Drops a reference taken by acquire_camera; the camera is released when the last user leaves."""
+    global camera_users
+    with camera_lock:
+        camera_users = max(0, camera_users - 1)
+        if camera_users == 0:
+            release_camera(logger_instance)
 
 # --- Standard Admin Routes (Login, Dashboard etc.) ---
 @bp.route('/')
@@ -181,7 +272,7 @@ def add_student():
             )
             db.session.add(student)
             db.session.commit()
-            clear_face_cache() # Ensure the new student is loaded on next recognition
+            update_cached_face(student) # Add just this student to the live face cache
             flash('Student added successfully with face data!', 'success')
             return redirect(url_for('main.manage_students'))
             
@@ -218,6 +309,7 @@ def edit_student(student_id):
             flash('Student details updated successfully (photo unchanged).', 'success')
             
         db.session.commit()
+        update_cached_face(student) # Name, ID number or embedding may have changed
         return redirect(url_for('main.manage_students'))
 
     elif request.method == 'GET':
@@ -232,8 +324,10 @@ def delete_student(student_id):
     student = Student.query.get_or_404(student_id)
     if student.face_image_path:
         remove_student_image(student.face_image_path)
+    flush_attendance_logs() # Queued logs must not reference the student after it is gone
     db.session.delete(student)
     db.session.commit()
+    remove_cached_face(student_id)
     flash('Student deleted successfully.', 'success')
     return redirect(url_for('main.manage_students'))
 
@@ -282,9 +376,11 @@ def edit_exam(exam_id):
 @login_required
 def delete_exam(exam_id):
     exam = Exam.query.get_or_404(exam_id)
+    flush_attendance_logs() # Write queued logs first so they are deleted with the rest
     Log.query.filter_by(exam_id=exam.id).delete()
     db.session.delete(exam)
     db.session.commit()
+    clear_exam_galleries(exam_id)
     flash('Exam and associated logs deleted successfully.', 'success')
     return redirect(url_for('main.manage_exams'))
 
@@ -313,6 +409,7 @@ def manage_exam_registrations(exam_id):
                 not_found_students.append(sid_num)
 
         db.session.commit()
+        clear_exam_galleries(exam_id) # Registered set changed; rebuilt on next recognition
 
         if not_found_students:
             flash(f'Successfully registered {registered_count} students. Could not find students with ID numbers: {", ".join(not_found_students)}.', 'warning')
@@ -350,113 +447,256 @@ def select_exam_for_auth():
     exams = get_active_or_upcoming_exams()
     return render_template('select_exam_for_auth.html', exams=exams, title="Select Exam")
 
-def generate_frames(exam_id):
+def recognition_status_store(app):
+    """
+    The store live recognition statuses are written to and read from: the shared memory status
+    board (one per database) or, if RECOGNITION_STATUS_SHARED_MEMORY is off or unsupported,
+    this process's LATEST_RECOGNITION_STATUS. Both offer get / set / pop / stats.
     """
-    Generator function for video streaming.
-    Captures frames, performs face recognition, draws annotations, and yields JPEG frames.
+    if not app.config.get('RECOGNITION_STATUS_SHARED_MEMORY', True) or not shared_gallery_supported():
+        return LATEST_RECOGNITION_STATUS
+    return _shared_board(app, "status")
+
+def overlay_store(app):
+    """Like recognition_status_store, for the face boxes drawn by client-side overlays."""
+    if not app.config.get('RECOGNITION_STATUS_SHARED_MEMORY', True) or not shared_gallery_supported():
+        return LIVE_OVERLAYS
+    return _shared_board(app, "overlay", payload_bytes=OVERLAY_BOARD_PAYLOAD_BYTES)
+
+def _shared_board(app, kind, payload_bytes=None):
+    if _STATUS_BOARD[kind] is None:
+        with _status_board_lock:
+            if _STATUS_BOARD[kind] is None:
+                name = default_status_board_name(app.config['SQLALCHEMY_DATABASE_URI'])
+                if kind != "status":
+                    name = f"{name}_{kind[:2]}"
+                options = {"payload_bytes": payload_bytes} if payload_bytes else {}
+                _STATUS_BOARD[kind] = SharedStatusBoard(
+                    name, os.path.join(app.instance_path, f"{name}.lock"), RECOGNITION_STATUS_TTL_SECONDS,
+                    slot_count=app.config.get('RECOGNITION_STATUS_BOARD_SLOTS', 256), **options
+                )
+    return _STATUS_BOARD[kind]
+
+def update_latest_recognition_status(exam_id, recognized_data_list):
     """
-    global camera
-    # It's crucial to get a logger instance that's safe to use within a generator
-    # that might outlive a single request context if not careful.
-    # current_app._get_current_object() provides the actual app instance.
-    app_instance = current_app._get_current_object()
+    Updates the recognition status store with the most relevant face of a recognition pass.
+    The primary status aims to show the most "important" face status if multiple faces are detected:
+    it prioritizes known students (eligible or not) over unknown faces for the summary status.
+    """
+    # Faces still awaiting their first encoding carry no status worth reporting
+    recognized_data_list = [d for d in recognized_data_list if d['status'] != 'Pending']
+    if not recognized_data_list:
+        return
+    # Prioritize non-unknown students
+    eligible_or_not_eligible = [d for d in recognized_data_list if d['status'] != 'Unknown_Student' and d['student_id'] is not None]
+    if eligible_or_not_eligible:
+        primary_status_to_report = eligible_or_not_eligible[0]
+    else: # All are unknown or errors
+        primary_status_to_report = recognized_data_list[0]
+
+    recognition_status_store(current_app).set(exam_id, {
+        "name": primary_status_to_report['name'],
+        "status": primary_status_to_report['status'],
+        # student_id_number is now directly available from find_and_log_recognized_faces
+        "student_id_number": primary_status_to_report.get('student_id_number'),
+        "timestamp": time.time()
+    })
+    _notify_status_watchers(exam_id, "status")
+
+def _notify_status_watchers(exam_id, kind):
+    """Wakes this worker's event streams of one exam after its "status" or "overlay" changed."""
+    with _status_watch_lock:
+        watchers = _STATUS_WATCHERS.get(exam_id)
+        if watchers is None:
+            return # Nobody in this process is streaming the exam
+        watchers[kind] += 1
+        watchers["condition"].notify_all()
+
+def update_live_overlay(exam_id, frame_shape, recognized_data_list):
+    """Publishes the face boxes of a recognition pass for pages that draw the overlay themselves."""
+    overlay_store(current_app).set(exam_id, {
+        "width": int(frame_shape[1]),
+        "height": int(frame_shape[0]),
+        "faces": [{"box": [int(v) for v in data['box']], "name": data['name'], "status": data['status']}
+                  for data in recognized_data_list],
+        "timestamp": time.time()
+    })
+    _notify_status_watchers(exam_id, "overlay")
+
+def draw_face_annotations(frame, recognized_data_list):
+    """Draws a labelled, status-coloured box for every recognized face onto a BGR frame (in place)."""
+    for data in recognized_data_list:
+        top, right, bottom, left = data['box']
+        name_display = data['name']
+        status_display = data['status'] # e.g. Verified_Eligible, Unknown_Student
+
+        # Determine color based on status
+        if status_display == 'Verified_Eligible':
+            color = (0, 255, 0)  # Green
+            name_prefix = ""
+        elif status_display == 'Verified_Not_Eligible':
+            color = (0, 0, 255)  # Red
+            name_prefix = "NOT ELIGIBLE: "
+        elif status_display == 'Unknown_Student':
+            color = (0, 165, 255) # Orange for unknown
+            name_prefix = "UNKNOWN: "
+        elif status_display == 'Pending':
+            color = (200, 200, 200) # Grey while the face awaits its first encoding
+            name_prefix = ""
+        else: # Error or other states
+            color = (255, 0, 255) # Magenta for errors
+            name_prefix = "ERROR: "
+
+        cv2.rectangle(frame, (left, top), (right, bottom), color, 2)
+        cv2.rectangle(frame, (left, bottom - 25), (right, bottom), color, cv2.FILLED)
+        font = cv2.FONT_HERSHEY_DUPLEX
+        cv2.putText(frame, f"{name_prefix}{name_display}", (left + 6, bottom - 6), font, 0.6, (255, 255, 255), 1)
+
+def error_frame_chunk(message):
+    """A single multipart stream chunk showing an error message instead of camera video."""
+    img = np.zeros((480, 640, 3), dtype=np.uint8)
+    cv2.putText(img, message, (50, 240), cv2.FONT_HERSHEY_SIMPLEX, 1, (255,255,255), 2)
+    _, buffer = cv2.imencode('.jpg', img)
+    return multipart_chunk(buffer)
+
+def generate_frames(exam_id, app_instance):
+    """
+    Generator function for video streaming, run once per exam by that exam's FrameHub.
+    Captures frames, performs face recognition, draws annotations, and yields StreamFrames
+    (encoded for each viewer's stream profile by the hub).
+    Recognition runs on the frames chosen by an AdaptiveRecognitionScheduler so the stream holds
+    RECOGNITION_TARGET_FPS; the frames in between are drawn with the last known annotations.
+    A MotionGate skips detection entirely while the scene is static and no face is being tracked.
+    With RECOGNITION_WORKERS enabled, detection and encoding run on a process pool instead
+    (RecognitionExecutor) and the stream only applies results as they come back.
+    With LIVE_AUTH_OVERLAY_MODE = 'client', nothing is drawn: frames are sent as the camera encoded
+    them (or encoded once, undrawn) and the face boxes are published for the page to draw.
+    """
+    # Runs on the hub's thread, outside any request, so it pushes its own app context
+    # (database access and current_app.logger in face_rec_utils need one).
+    with app_instance.app_context():
+        yield from _generate_frames_in_context(exam_id, app_instance)
+
+def _generate_frames_in_context(exam_id, app_instance):
     logger = app_instance.logger
     
-    if not initialize_camera(logger) or camera is None: 
+    if not acquire_camera(logger): 
         logger.error("Camera not initialized for generate_frames.")
-        img = np.zeros((480, 640, 3), dtype=np.uint8)
-        cv2.putText(img, "Camera Error", (50, 240), cv2.FONT_HERSHEY_SIMPLEX, 1, (255,255,255), 2)
-        _, buffer = cv2.imencode('.jpg', img)
-        frame_bytes = buffer.tobytes()
-        yield (b'--frame\r\n'
-               b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
+        yield error_frame_chunk("Camera Error")
         return
 
     logger.info(f"Starting frame generation for exam ID: {exam_id}")
-    frame_skip = 0 
-    frame_count = 0
-
-    while True:
-        try:
-            success, frame = camera.read()
-            if not success:
-                logger.warning("Failed to grab frame from camera.")
-                break 
-            
-            frame_count += 1
-            if frame_skip > 0 and frame_count % (frame_skip + 1) != 1:
-                _, buffer = cv2.imencode('.jpg', frame)
-                raw_frame_bytes = buffer.tobytes()
-                yield (b'--frame\r\n'
-                       b'Content-Type: image/jpeg\r\n\r\n' + raw_frame_bytes + b'\r\n')
-                continue
-
-            rgb_frame = frame[:, :, ::-1]
-            
-            # Use app_instance for context if needed by find_and_log_recognized_faces
-            # or ensure find_and_log_recognized_faces uses its own logger or passed logger
-            recognized_data_list = find_and_log_recognized_faces(rgb_frame, exam_id) # This util uses current_app.logger internally
-
-            # Update LATEST_RECOGNITION_STATUS with the most relevant status
-            # For simplicity, if multiple faces, pick the first "interesting" one (not just unknown)
-            # or the first one if all are unknown.
-            primary_status_to_report = None
-            if recognized_data_list:
-                # Prioritize non-unknown students
-                eligible_or_not_eligible = [d for d in recognized_data_list if d['status'] != 'Unknown_Student' and d['student_id'] is not None]
-                if eligible_or_not_eligible:
-                    primary_status_to_report = eligible_or_not_eligible[0]
-                else: # All are unknown or errors
-                    primary_status_to_report = recognized_data_list[0]
-
-                if primary_status_to_report:
-                    LATEST_RECOGNITION_STATUS[exam_id] = {
-                        "name": primary_status_to_report['name'],
-                        "status": primary_status_to_report['status'],
-                        # student_id_number is now directly available from find_and_log_recognized_faces
-                        "student_id_number": primary_status_to_report.get('student_id_number'),
-                        "timestamp": datetime.utcnow()
-                    }
-
-            # Add a comment explaining the primary_status_to_report logic
-            # The primary_status_to_report aims to show the most "important" face status if multiple faces are detected.
-            # It prioritizes known students (eligible or not) over unknown faces for the summary status.
-            for data in recognized_data_list:
-                top, right, bottom, left = data['box']
-                name_display = data['name']
-                status_display = data['status'] # e.g. Verified_Eligible, Unknown_Student
-
-                # Determine color based on status
-                if status_display == 'Verified_Eligible':
-                    color = (0, 255, 0)  # Green
-                    name_prefix = ""
-                elif status_display == 'Verified_Not_Eligible':
-                    color = (0, 0, 255)  # Red
-                    name_prefix = "NOT ELIGIBLE: "
-                elif status_display == 'Unknown_Student':
-                    color = (0, 165, 255) # Orange for unknown
-                    name_prefix = "UNKNOWN: "
-                else: # Error or other states
-                    color = (255, 0, 255) # Magenta for errors
-                    name_prefix = "ERROR: "
-
-                cv2.rectangle(frame, (left, top), (right, bottom), color, 2)
-                cv2.rectangle(frame, (left, bottom - 25), (right, bottom), color, cv2.FILLED)
-                font = cv2.FONT_HERSHEY_DUPLEX
-                cv2.putText(frame, f"{name_prefix}{name_display}", (left + 6, bottom - 6), font, 0.6, (255, 255, 255), 1)
-
-            ret, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 70])
-            if not ret:
-                logger.error("cv2.imencode failed")
-                continue
-            frame_bytes = buffer.tobytes()
-            yield (b'--frame\r\n'
-                   b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
-        except Exception as e:
-            logger.error(f"Error in generate_frames loop: {e}", exc_info=True)
-            break # Exit loop on error to prevent broken pipe or other issues
-    
-    logger.info(f"generate_frames loop ended for exam ID: {exam_id}.")
+    scheduler = AdaptiveRecognitionScheduler(
+        target_fps=app_instance.config.get('RECOGNITION_TARGET_FPS', 10.0),
+        max_interval=app_instance.config.get('RECOGNITION_MAX_INTERVAL', 30)
+    )
+    recognized_data_list = [] # Last known annotations, redrawn on frames without recognition
+    # Carries identities across frames so a student standing still is not re-encoded every frame
+    tracker = FaceTracker(
+        iou_threshold=app_instance.config.get('FACE_TRACK_IOU_THRESHOLD', 0.3),
+        reverify_seconds=app_instance.config.get('FACE_TRACK_REVERIFY_SECONDS', 5.0),
+        uncertain_reverify_seconds=app_instance.config.get('FACE_TRACK_UNCERTAIN_REVERIFY_SECONDS', 0.5),
+        max_missed_frames=app_instance.config.get('FACE_TRACK_MAX_MISSED_FRAMES', 3)
+    )
+    detection_scale = app_instance.config.get('FACE_DETECTION_SCALE', 1.0)
+    detection_roi = app_instance.config.get('FACE_DETECTION_ROIS', {}).get(camera_index)
+    motion_gate = None
+    if app_instance.config.get('MOTION_GATE_ENABLED', True):
+        motion_gate = MotionGate(
+            pixel_threshold=app_instance.config.get('MOTION_PIXEL_THRESHOLD', 25),
+            area_threshold=app_instance.config.get('MOTION_AREA_THRESHOLD', 0.01),
+            max_idle_seconds=app_instance.config.get('MOTION_MAX_IDLE_SECONDS', 10.0)
+        )
+    executor = None
+    worker_count = resolve_worker_count(app_instance.config.get('RECOGNITION_WORKERS'))
+    if worker_count > 0:
+        executor = RecognitionExecutor(worker_count, detection_scale=detection_scale, roi=detection_roi,
+                                       iou_threshold=tracker.iou_threshold,
+                                       queue_size=app_instance.config.get('RECOGNITION_QUEUE_SIZE', 2),
+                                       logger_instance=logger)
+    overlay_on_client = app_instance.config.get('LIVE_AUTH_OVERLAY_MODE', 'server') == 'client'
+    buffers = FrameBuffers() # RGB / detection scratch arrays reused by every frame of this stream
+
+    try:
+        last_seq = 0 # Sequence number of the last captured frame this stream processed
+        while True:
+            try:
+                capture = camera # Checked each frame in case the camera was released underneath us
+                if capture is None:
+                    logger.info("Camera released; ending stream.")
+                    break
+                success, frame, camera_jpeg, last_seq = capture.read_with_jpeg(after_seq=last_seq)
+                frame_started = time.monotonic() # Waiting for the next capture is not frame cost
+                recognition_seconds = 0.0
+                recognized = False # Whether recognized_data_list was refreshed on this frame
+                if not success:
+                    logger.warning("Failed to grab frame from camera.")
+                    break 
+
+                if executor is not None:
+                    # Detection and encoding happen in the worker processes; submitting never blocks
+                    if motion_gate is None or motion_gate.should_detect(frame, tracks_active=bool(tracker.tracks)):
+                        # A new array per submission (not a FrameBuffers buffer): the pool pickles it later, on its own thread
+                        executor.submit(last_seq, cv2.cvtColor(frame, cv2.COLOR_BGR2RGB), tracker.encoding_hints())
+                    results = executor.collect()
+                    for result in results: # In frame order, so the tracker sees detections in sequence
+                        recognized_data_list = identify_and_log_faces(
+                            result["face_locations"], lambda indices: [result["encodings"].get(i) for i in indices],
+                            exam_id, tracker=tracker
+                        )
+                        scheduler.record_recognition(result["seconds"])
+                    if results:
+                        recognized = True
+                        update_latest_recognition_status(exam_id, recognized_data_list)
+                    PIPELINE_STATS[exam_id] = dict(scheduler.snapshot(), recognition_workers=executor.workers,
+                                                   worker_stats=dict(executor.stats),
+                                                   motion_skipped_frames=motion_gate.stats['skipped'] if motion_gate else 0)
+                elif scheduler.should_recognize() and motion_gate is not None \
+                        and not motion_gate.should_detect(frame, tracks_active=bool(tracker.tracks)):
+                    # Static scene with nobody tracked: nothing new to detect, keep the last annotations
+                    PIPELINE_STATS[exam_id] = dict(scheduler.snapshot(), motion_skipped_frames=motion_gate.stats['skipped'])
+                elif scheduler.should_recognize():
+                    rgb_frame = buffers.rgb(frame) # Contiguous, so dlib does not copy it again
+                    recognition_started = time.monotonic()
+                    # Use app_instance for context if needed by find_and_log_recognized_faces
+                    # or ensure find_and_log_recognized_faces uses its own logger or passed logger
+                    recognized_data_list = find_and_log_recognized_faces(
+                        rgb_frame, exam_id, tracker=tracker, detection_scale=detection_scale, roi=detection_roi,
+                        buffers=buffers
+                    ) # This util uses current_app.logger internally
+                    recognition_seconds = time.monotonic() - recognition_started
+                    scheduler.record_recognition(recognition_seconds)
+                    recognized = True
+                    update_latest_recognition_status(exam_id, recognized_data_list)
+                    PIPELINE_STATS[exam_id] = dict(scheduler.snapshot(),
+                                                   motion_skipped_frames=motion_gate.stats['skipped'] if motion_gate else 0)
+
+                if overlay_on_client:
+                    if recognized:
+                        update_live_overlay(exam_id, frame.shape, recognized_data_list)
+                    # Untouched camera JPEG for full-size viewers when the camera delivers MJPG
+                    stream_frame = StreamFrame(frame, jpeg=camera_jpeg)
+                else:
+                    if recognized_data_list:
+                        frame = frame.copy() # The captured frame is shared; annotations are drawn on our copy
+                        draw_face_annotations(frame, recognized_data_list)
+                    stream_frame = StreamFrame(frame) # Read-only from here on, so an unannotated frame needs no copy
+                scheduler.record_frame(time.monotonic() - frame_started - recognition_seconds)
+                # Encoded by the hub's viewers, once per distinct stream profile (see StreamFrame)
+                yield stream_frame
+            except Exception as e:
+                logger.error(f"Error in generate_frames loop: {e}", exc_info=True)
+                break # Exit loop on error to prevent broken pipe or other issues
+    finally:
+        logger.info(f"generate_frames loop ended for exam ID: {exam_id}. Face encodings: {tracker.stats['encodings']} "
+                    f"for {tracker.stats['faces']} detected faces over {tracker.stats['frames']} frames. "
+                    f"Motion gate skipped {motion_gate.stats['skipped'] if motion_gate else 0} detections. "
+                    f"Recognition cadence: {scheduler.snapshot()}. "
+                    f"Frame buffer allocations: {buffers.stats['allocations']}."
+                    + (f" Worker stats: {executor.stats}" if executor else ""))
+        if executor is not None:
+            executor.close()
+        drop_camera_reference(logger) # Runs when the hub closes this generator, too
 
 @bp.route('/live_auth/<int:exam_id>')
 @login_required
@@ -471,67 +711,384 @@ def live_auth(exam_id):
             flash('No student face data found in the database. Please register students with photos.', 'warning')
         else:
             flash(f'{faces_loaded_count} student face profiles loaded for recognition.', 'info')
+        build_exam_gallery(exam_id) # Registered students are matched first during this session
         clear_recent_logs_cache(exam_id=exam_id)
     
-    return render_template('live_auth.html', exam=exam, title=f"Live Auth: {exam.subject}")
+    # Identifies this page's stream so stop_video_feed only detaches this viewer
+    viewer_id = uuid.uuid4().hex
+    overlay_on_client = current_app.config.get('LIVE_AUTH_OVERLAY_MODE', 'server') == 'client'
+    profile, _ = resolve_stream_profile(current_app.config, request.args.get('profile'))
+    return render_template('live_auth.html', exam=exam, viewer_id=viewer_id, overlay_on_client=overlay_on_client,
+                           stream_profiles=list(stream_profiles(current_app.config)), stream_profile=profile.name,
+                           title=f"Live Auth: {exam.subject}")
+
+def _stream_hub_stopped(exam_id, hub):
+    """FrameHub on_stop callback (bound to its exam): forgets the hub (if still registered) and the exam's stream stats."""
+    with stream_hubs_lock:
+        if STREAM_HUBS.get(exam_id) is hub:
+            STREAM_HUBS.pop(exam_id, None)
+            PIPELINE_STATS.pop(exam_id, None)
+
+def subscribe_to_exam_stream(exam_id, viewer_id, app_instance, profile=None):
+    """
+    Attaches a viewer to the exam's FrameHub, creating the hub (and so the pipeline) if needed.
+    `profile` (StreamProfile, optional) sets the viewer's frame rate, width and JPEG quality.
+    Returns:
+        FrameHub: The hub the viewer is subscribed to.
+    """
+    with stream_hubs_lock:
+        hub = STREAM_HUBS.get(exam_id)
+        if hub is None or not hub.subscribe(viewer_id, profile):
+            hub = FrameHub(f"exam-{exam_id}", lambda: generate_frames(exam_id, app_instance),
+                           on_stop=functools.partial(_stream_hub_stopped, exam_id),
+                           queue_size=app_instance.config.get('STREAM_VIEWER_QUEUE_SIZE', 2),
+                           logger_instance=app_instance.logger)
+            STREAM_HUBS[exam_id] = hub
+            hub.subscribe(viewer_id, profile)
+    return hub
+
+def generate_daemon_frames(exam_id, viewer_id, socket_path, logger_instance, profile=None):
+    """
+    Generator for a video stream served by the recognition daemon: registers the viewer, then
+    copies the newest frame out of the exam's shared memory ring, renewing the viewer's lease
+    periodically. No camera access or recognition happens in this process.
+    The ring holds the daemon's full-size encode, so only the frame rate of `profile` applies:
+    the viewer waits out its frame interval and then takes the newest frame.
+    """
+    try:
+        reply = daemon_request(socket_path, "acquire", exam_id=exam_id, viewer_id=viewer_id)
+    except OSError as e:
+        logger_instance.error(f"Recognition daemon not reachable at {socket_path}: {e}")
+        yield error_frame_chunk("Recognition Service Down")
+        return
+    if not reply.get("ok"):
+        logger_instance.error(f"Recognition daemon refused exam {exam_id}: {reply.get('error')}")
+        yield error_frame_chunk("Recognition Error")
+        return
+
+    ring = FrameRing.attach(reply["ring"])
+    lease_renew_seconds = current_app.config.get('RECOGNITION_DAEMON_LEASE_SECONDS', 15.0) / 3.0
+    frame_interval = 1.0 / profile.max_fps if profile is not None and profile.max_fps else 0.0
+    last_seq = 0
+    last_frame_at = last_renew_at = time.monotonic()
+    try:
+        while True:
+            last_seq, chunk = ring.read_latest(after_seq=last_seq)
+            now = time.monotonic()
+            if chunk is not None:
+                last_frame_at = now
+                yield chunk
+                if frame_interval:
+                    time.sleep(max(0.0, frame_interval - (time.monotonic() - now)))
+            elif ring.closed or now - last_frame_at > DAEMON_FRAME_TIMEOUT_SECONDS:
+                logger_instance.info(f"Daemon stream for exam {exam_id} ended.")
+                break
+            else:
+                time.sleep(DAEMON_POLL_SECONDS)
+            if now - last_renew_at >= lease_renew_seconds:
+                last_renew_at = now
+                if not daemon_request(socket_path, "renew", exam_id=exam_id, viewer_id=viewer_id).get("ok"):
+                    break # Released by stop_video_feed or expired
+    except OSError as e:
+        logger_instance.error(f"Lost the recognition daemon during the stream for exam {exam_id}: {e}")
+    finally:
+        ring.close()
+        try:
+            daemon_request(socket_path, "release", exam_id=exam_id, viewer_id=viewer_id)
+        except OSError:
+            pass
+
+def read_daemon_status(exam_id):
+    """
+    Returns the status document the recognition daemon last published for an exam
+    (see RecognitionDaemon._publish), or None if the exam is not being streamed.
+    """
+    with daemon_rings_lock: # Concurrent status polls must not each attach (and leak) a mapping
+        ring = DAEMON_RINGS.get(exam_id)
+        if ring is None or ring.closed:
+            if ring is not None:
+                ring.close()
+                DAEMON_RINGS.pop(exam_id, None)
+            try:
+                reply = daemon_request(current_app.config['RECOGNITION_DAEMON_SOCKET'], "ring", exam_id=exam_id)
+                if not reply.get("ok"):
+                    return None
+                ring = DAEMON_RINGS[exam_id] = FrameRing.attach(reply["ring"])
+            except (OSError, ValueError) as e: # ValueError: malformed reply from the daemon
+                current_app.logger.warning(f"Could not read recognition daemon status for exam {exam_id}: {e}")
+                return None
+    return ring.read_status()
 
 @bp.route('/video_feed/<int:exam_id>')
 @login_required
 def video_feed(exam_id):
-    """Provides the video stream for a given exam ID."""
+    """
+    Provides the video stream for a given exam ID.
+    All viewers of an exam share one capture/recognition pipeline (see FrameHub);
+    the optional `viewer` query parameter lets stop_video_feed detach just this viewer, and
+    `profile` picks one of STREAM_PROFILES (frame rate, width, JPEG quality) for this viewer.
+    """
     exam = Exam.query.get_or_404(exam_id) 
-    return Response(generate_frames(exam_id=exam.id),
-                    mimetype='multipart/x-mixed-replace; boundary=frame')
+    viewer_id = request.args.get('viewer') or uuid.uuid4().hex
+    profile, known_profile = resolve_stream_profile(current_app.config, request.args.get('profile'))
+    if not known_profile:
+        current_app.logger.warning(f"Unknown stream profile '{request.args.get('profile')}'; using '{profile.name}'.")
+    daemon_socket = current_app.config.get('RECOGNITION_DAEMON_SOCKET')
+    if daemon_socket:
+        return Response(stream_with_context(generate_daemon_frames(exam.id, viewer_id, daemon_socket, current_app.logger,
+                                                                   profile=profile)),
+                        mimetype='multipart/x-mixed-replace; boundary=frame')
+    hub = subscribe_to_exam_stream(exam.id, viewer_id, current_app._get_current_object(), profile=profile)
+    return Response(hub.frames(viewer_id), mimetype='multipart/x-mixed-replace; boundary=frame')
 
 @bp.route('/stop_video_feed', methods=['POST'])
 @login_required
 def stop_video_feed():
-    """Endpoint to explicitly stop the camera and release resources."""
-    # Use current_app.logger as this is a direct request context
-    release_camera(current_app.logger) 
-    flash("Camera session ended and resources released.", "info")
-
+    """
+    Endpoint to stop a viewer's stream. With a viewer_id only that viewer is detached; other
+    viewers keep streaming and the camera is released once the last pipeline stops.
+    Without one, every stream of the exam is stopped.
+    """
+    logger_instance = current_app.logger if current_app else logging.getLogger(__name__)
     exam_id_to_clear = None
+    viewer_id = None
     if request.is_json:
         data = request.get_json()
         if data:
             exam_id_to_clear = data.get('exam_id')
+            viewer_id = data.get('viewer_id')
     elif request.form: # Fallback if it was sent as form data for some reason
         exam_id_to_clear = request.form.get('exam_id')
+        viewer_id = request.form.get('viewer_id')
+    elif request.data: # navigator.sendBeacon posts a text/plain JSON string
+        try:
+            data = json.loads(request.data)
+            exam_id_to_clear = data.get('exam_id')
+            viewer_id = data.get('viewer_id')
+        except (ValueError, AttributeError):
+            pass
 
     if exam_id_to_clear:
         try:
             # Ensure exam_id_to_clear is an integer if it comes from JSON as string
-            LATEST_RECOGNITION_STATUS.pop(int(exam_id_to_clear), None)
-            logger_instance = current_app.logger if current_app else logging.getLogger(__name__)
-            logger_instance.info(f"Cleared LATEST_RECOGNITION_STATUS for exam_id: {exam_id_to_clear}")
+            exam_id_to_clear = int(exam_id_to_clear)
         except ValueError:
-            logger_instance = current_app.logger if current_app else logging.getLogger(__name__)
             logger_instance.warning(f"Could not parse exam_id '{exam_id_to_clear}' to int for clearing status.")
+            return {"status": "error", "message": "Invalid exam_id."}, 400
+        daemon_socket = current_app.config.get('RECOGNITION_DAEMON_SOCKET')
+        if daemon_socket:
+            try:
+                daemon_request(daemon_socket, "release", exam_id=exam_id_to_clear, viewer_id=viewer_id)
+            except OSError as e:
+                logger_instance.warning(f"Could not reach the recognition daemon to release exam {exam_id_to_clear}: {e}")
+        with stream_hubs_lock:
+            hub = STREAM_HUBS.get(exam_id_to_clear)
+        if hub is not None:
+            if viewer_id:
+                hub.unsubscribe(viewer_id)
+            else:
+                hub.stop()
+        if hub is None or hub.viewer_count == 0:
+            recognition_status_store(current_app).pop(exam_id_to_clear, None)
+            PIPELINE_STATS.pop(exam_id_to_clear, None)
+            logger_instance.info(f"Cleared recognition status for exam_id: {exam_id_to_clear}")
+    flash("Camera session ended and resources released.", "info")
 
-    return {"status": "success", "message": "Camera released."}, 200
+    return {"status": "success", "message": "Viewer detached; camera released when no streams remain."}, 200
 
 @bp.route('/live_auth_status/<int:exam_id>')
 @login_required
 def live_auth_status(exam_id):
     """Endpoint for the frontend to poll for the latest recognition status."""
-    status_info = LATEST_RECOGNITION_STATUS.get(exam_id)
+    return current_status_payload(exam_id), 200
+
+def current_status_payload(exam_id):
+    """The status document shown on the live authentication page (shared by polling and events)."""
+    if current_app.config.get('RECOGNITION_DAEMON_SOCKET'):
+        document = read_daemon_status(exam_id) or {}
+        status_info = document.get("status")
+        if status_info:
+            # Age when the daemon published it, plus the time since then
+            age_seconds = document["status_age_seconds"] + (time.time() - document["written_at"])
+            if age_seconds > RECOGNITION_STATUS_TTL_SECONDS:
+                status_info = None
+    else:
+        # Whichever worker runs the exam's pipeline, the shared board has its status; None once stale
+        status_info = recognition_status_store(current_app).get(exam_id)
 
     if status_info:
-        # Check if the status is stale
-        if (datetime.utcnow() - status_info.get("timestamp", datetime.min)) > timedelta(seconds=RECOGNITION_STATUS_TTL_SECONDS):
-            # If stale, remove it and report no current status
-            LATEST_RECOGNITION_STATUS.pop(exam_id, None)
-            return {"status": "NoDetection", "name": None, "student_id_number": None}, 200
-
         return {
             "name": status_info.get("name", "Unknown"),
             "status": status_info.get("status", "Unknown_Student"),
             "student_id_number": status_info.get("student_id_number", None)
-        }, 200
+        }
     else:
         # No status recorded yet for this exam, or it was cleared/stale
-        return {"status": "NoDetection", "name": None, "student_id_number": None}, 200
+        return {"status": "NoDetection", "name": None, "student_id_number": None}
+
+def generate_status_events(exam_id, poll_seconds=SSE_POLL_SECONDS, heartbeat_seconds=SSE_HEARTBEAT_SECONDS,
+                           overlay=False):
+    """
+    Server-Sent Events stream of an exam's recognition status.
+
+    An event is sent only when the status changes; changes that happen between two checks are
+    coalesced into the latest one. Statuses written by this process wake the stream immediately,
+    others are picked up within `poll_seconds` (a shared memory read, no request per check).
+    A comment line is sent after `heartbeat_seconds` without events to keep proxies from timing out.
+    With `overlay`, "faces" events carry the face boxes of every recognition pass as well.
+    """
+    yield "retry: 3000\n\n" # Browser reconnect delay if the stream drops
+    with _status_watch_lock:
+        watchers = _STATUS_WATCHERS.get(exam_id)
+        if watchers is None:
+            watchers = _STATUS_WATCHERS[exam_id] = {
+                "condition": threading.Condition(_status_watch_lock), "status": 0, "overlay": 0, "streams": 0
+            }
+        watchers["streams"] += 1
+    kinds = ("status", "overlay") if overlay else ("status",) # Status-only streams sleep through overlay writes
+    last_sent = None
+    last_faces = None
+    last_write = time.monotonic()
+    event_id = 0
+    try:
+        while True:
+            # Versions are taken before the reads, so a write landing after them still ends the wait below
+            with _status_watch_lock:
+                seen = [watchers[kind] for kind in kinds]
+            payload = current_status_payload(exam_id)
+            faces = current_overlay_payload(exam_id) if overlay else None
+            if payload != last_sent:
+                event_id += 1
+                last_sent = payload
+                last_write = time.monotonic()
+                yield f"id: {event_id}\nevent: status\ndata: {json.dumps(payload)}\n\n"
+            if overlay and faces != last_faces:
+                event_id += 1
+                last_faces = faces
+                last_write = time.monotonic()
+                yield f"id: {event_id}\nevent: faces\ndata: {json.dumps(faces)}\n\n"
+            elif time.monotonic() - last_write >= heartbeat_seconds:
+                last_write = time.monotonic()
+                yield ": heartbeat\n\n"
+            with _status_watch_lock:
+                watchers["condition"].wait_for(lambda: [watchers[kind] for kind in kinds] != seen, poll_seconds)
+    finally:
+        with _status_watch_lock:
+            watchers["streams"] -= 1
+            if watchers["streams"] == 0 and _STATUS_WATCHERS.get(exam_id) is watchers:
+                del _STATUS_WATCHERS[exam_id]
+
+def current_overlay_payload(exam_id):
+    """Face boxes of the exam's latest recognition pass (none once stale), for client-side overlays."""
+    overlay = overlay_store(current_app).get(exam_id)
+    if not overlay:
+        return {"width": None, "height": None, "faces": []}
+    return {"width": overlay["width"], "height": overlay["height"], "faces": overlay["faces"]}
+
+@bp.route('/live_auth_events/<int:exam_id>')
+@login_required
+def live_auth_events(exam_id):
+    """
+    Pushes recognition status changes to the live authentication page (replaces 2 s polling).
+    `?overlay=1` adds "faces" events for pages drawing the face boxes themselves.
+    """
+    if request.args.get('overlay') == '1':
+        events = generate_status_events(exam_id, poll_seconds=SSE_OVERLAY_POLL_SECONDS, overlay=True)
+    else:
+        events = generate_status_events(exam_id)
+    response = Response(stream_with_context(events), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no' # Stop nginx from buffering the stream
+    return response
+
+def cache_stats(app):
+    """Hit/miss/eviction counters of the bounded stores used by live authentication."""
+    return {
+        "recently_logged_students": RECENTLY_LOGGED_STUDENTS.stats(),
+        "latest_recognition_status": recognition_status_store(app).stats()
+    }
+
+@bp.route('/live_auth_pipeline_stats/<int:exam_id>')
+@login_required
+def live_auth_pipeline_stats(exam_id):
+    """Endpoint exposing the adaptive recognition cadence (effective recognition rate etc.) of a stream."""
+    if current_app.config.get('RECOGNITION_DAEMON_SOCKET'):
+        stats = (read_daemon_status(exam_id) or {}).get("pipeline")
+        if not stats:
+            return {"status": "NoStream"}, 200
+        return dict(stats, status="Streaming", source="recognition-daemon"), 200
+    stats = PIPELINE_STATS.get(exam_id)
+    if not stats:
+        return {"status": "NoStream"}, 200
+    with stream_hubs_lock:
+        hub = STREAM_HUBS.get(exam_id)
+    viewers = hub.viewer_count if hub else 0
+    dropped = hub.stats["dropped"] if hub else 0
+    return dict(stats, status="Streaming", viewers=viewers, viewer_dropped_frames=dropped,
+                stream=dict(hub.stats, viewers=hub.viewer_stats()) if hub else None,
+                log_writer=log_writer_stats(), caches=cache_stats(current_app)), 200
+
+# --- Browser Camera Ingest Routes ---
+@bp.route('/ingest_camera/<int:exam_id>')
+@login_required
+def ingest_camera(exam_id):
+    """
+    Entry point page for a tablet or laptop: captures its own camera with getUserMedia and posts
+    frames to ingest_frame, drawing the returned faces over the preview.
+    """
+    exam = Exam.query.get_or_404(exam_id)
+    with current_app.app_context():
+        faces_loaded_count = load_known_faces_from_db()
+        if faces_loaded_count == 0:
+            flash('No student face data found in the database. Please register students with photos.', 'warning')
+        build_exam_gallery(exam_id)
+    return render_template('ingest_camera.html', exam=exam, client_id=uuid.uuid4().hex,
+                           entry_name=request.args.get('entry', ''),
+                           frame_interval_ms=int(1000.0 / current_app.config.get('INGEST_CLIENT_FPS', 4.0)),
+                           jpeg_quality=current_app.config.get('INGEST_CLIENT_JPEG_QUALITY', 0.7),
+                           title=f"Entry Camera: {exam.subject}")
+
+@bp.route('/ingest_frame/<int:exam_id>', methods=['POST'])
+@login_required
+def ingest_frame(exam_id):
+    """
+    Recognizes one frame posted by a browser camera and logs attendance for it.
+    The body is the JPEG itself (e.g. a canvas.toBlob() upload) or a multipart form with a `frame`
+    file; the `client` query parameter identifies the entry point so its face tracks stay apart.
+    Frames of all clients are decoded in parallel and recognized in micro-batches (FrameIngestBatcher).
+
+    Returns:
+        JSON: {"status": "ok", "faces": [...]} with the same face dictionaries find_and_log_recognized_faces
+        returns (box as [top, right, bottom, left]); 400 for a missing or undecodable image, 413 for an
+        oversized one, 503 while the server is saturated and 504 if recognition took too long.
+    """
+    Exam.query.get_or_404(exam_id)
+    data = request.files['frame'].read() if 'frame' in request.files else request.get_data()
+    if not data:
+        return {"status": "error", "message": "No frame in the request."}, 400
+    if len(data) > current_app.config.get('INGEST_MAX_FRAME_BYTES', 2 * 1024 * 1024):
+        return {"status": "error", "message": "Frame too large."}, 413
+    client_id = request.args.get('client') or request.form.get('client') or request.remote_addr or "unknown"
+    future = get_ingest_batcher(current_app._get_current_object()).submit(client_id, exam_id, data)
+    if future is None:
+        return {"status": "busy", "message": "Recognition server is saturated; send the next frame later."}, 503
+    try:
+        faces = future.result(timeout=current_app.config.get('INGEST_RESULT_TIMEOUT_SECONDS', 10.0))
+    except FrameDecodeError as e:
+        return {"status": "error", "message": str(e)}, 400
+    except FuturesTimeoutError:
+        return {"status": "error", "message": "Recognition timed out."}, 504
+    except Exception as e:
+        current_app.logger.error(f"Recognition of an ingested frame for exam {exam_id} failed: {e}")
+        return {"status": "error", "message": "Recognition failed."}, 500
+    update_latest_recognition_status(exam_id, faces) # The exam's live status / SSE page follows entry cameras too
+    return {"status": "ok", "faces": [dict(face, box=list(face['box'])) for face in faces]}, 200
+
+@bp.route('/ingest_stats')
+@login_required
+def ingest_frame_stats():
+    """Batching, latency and backpressure counters of this process's browser camera ingest."""
+    return {"ingest": ingest_stats()}, 200
 
 # --- Log Viewing Route ---
 @bp.route('/view_logs')
@@ -549,7 +1106,8 @@ def view_logs():
         'exam_subject': Exam.subject,
         'exam_date': Exam.date,
         'timestamp': Log.timestamp,
-        'status': Log.status
+        'status': Log.status,
+        'seen_count': Log.seen_count
     }
 
     if sort_by not in sortable_columns:
@@ -562,6 +1120,8 @@ def view_logs():
         Log.id.label('log_id'),
         Log.timestamp,
         Log.status,
+        Log.seen_count,
+        Log.last_seen,
         Student.name.label('student_name'),
         Student.student_id_number,
         Exam.subject.label('exam_subject'),
@@ -0,0 +1,221 @@
+# app/shared_gallery.py
+
+import os
+import json
+import struct
+import hashlib
+import contextlib
+import numpy as np
+from multiprocessing import shared_memory, resource_tracker
+try:
+    import fcntl
+except ImportError: # Windows: no flock, and named shared memory does not outlive its last handle
+    fcntl = None
+
+GALLERY_MAGIC = 0x45584741 # "EXGA"
+GALLERY_VERSION = 1
+# Control segment: magic, version, seq (odd while a new generation is being swapped in), generation
+_CONTROL = struct.Struct("<IIQQ")
+_CONTROL_SIZE = 64
+# Data segment header: magic, version, generation, count, dim, meta_len; followed by
+# ids (int64 x count), embeddings (float32 x count x dim), squared norms (float32 x count), meta JSON
+_DATA_HEADER = struct.Struct("<IIQQII")
+_DATA_HEADER_SIZE = 64
+
+
+def shared_gallery_supported():
+    """Shared memory stores (this gallery, the live status board) need POSIX flock."""
+    return fcntl is not None
+
+
+@contextlib.contextmanager
+def exclusive_file_lock(lock_path):
+    """Holds an exclusive flock on `lock_path` (created if needed), serializing writers across processes."""
+    directory = os.path.dirname(lock_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(lock_path, "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def default_gallery_name(database_uri):
+    """Shared memory name for the gallery of one database, so apps on different databases never share one."""
+    return "exgal_" + hashlib.sha1(database_uri.encode("utf-8")).hexdigest()[:10]
+
+
+def _data_name(name, generation):
+    return f"{name}_{generation}"
+
+
+class _Segment(shared_memory.SharedMemory):
+    """
+    SharedMemory whose mapping may outlive this object: NumPy arrays built on `buf` keep the
+    mapping alive, so a failed close while they exist is expected rather than an error.
+    """
+
+    def __del__(self):
+        try:
+            self.close()
+        except BufferError:
+            if self._fd >= 0: # The mapping holds its own descriptor; only ours is released here
+                os.close(self._fd)
+                self._fd = -1
+        except OSError:
+            pass
+
+
+def _untrack(segment):
+    # Segments must survive the process that created or attached them (a gunicorn worker being
+    # recycled must not take the published gallery with it); the next publisher removes them.
+    try:
+        resource_tracker.unregister(segment._name, "shared_memory")
+    except Exception:
+        pass
+
+
+def open_shared_segment(name, size=None):
+    """Attaches to (or, with `size`, creates) a named segment that outlives this process."""
+    segment = _Segment(name=name, create=size is not None, size=size or 0)
+    _untrack(segment)
+    return segment
+
+
+def unlink_shared_segment(name):
+    """Removes a named segment if it exists."""
+    try:
+        segment = _Segment(name=name) # Tracked until unlink(), which untracks it again
+    except FileNotFoundError:
+        return
+    segment.close()
+    segment.unlink() # Processes that still map it keep their mapping until they move on
+
+
+def _array_views(buf, count, dim):
+    """(ids, embeddings, sq_norms, meta_offset) views over a data segment's buffer."""
+    offset = _DATA_HEADER_SIZE
+    ids = np.ndarray((count,), dtype=np.int64, buffer=buf, offset=offset)
+    offset += count * 8
+    embeddings = np.ndarray((count, dim), dtype=np.float32, buffer=buf, offset=offset)
+    offset += count * dim * 4
+    sq_norms = np.ndarray((count,), dtype=np.float32, buffer=buf, offset=offset)
+    offset += count * 4
+    return ids, embeddings, sq_norms, offset
+
+
+class SharedGallery:
+    """
+    Publishes a FaceGallery into POSIX shared memory so every process of the app (gunicorn
+    workers, the recognition daemon, CLI commands) maps one copy of the embedding matrix.
+
+    Each publication is an immutable "generation" in its own segment. A small control segment
+    holds the current generation number, updated under a sequence lock, so readers switch from
+    one generation to the next atomically: a process keeps matching against the mapping it has
+    until it adopts the new one, and the publisher unlinks the previous segment without pulling
+    it from under anyone (unlinked segments stay mapped until their last reader moves on).
+
+    Publishing is serialized between processes with an flock on `lock_path`. Adopting costs one
+    attach plus parsing the names and student numbers; checking for a new generation is a single
+    64-byte read, cheap enough to do on every recognition pass.
+    """
+
+    def __init__(self, name, lock_path):
+        self.name = name
+        self.lock_path = lock_path
+        self._control = None
+        self.adopted_generation = 0 # Generation this process's gallery currently mirrors
+
+    def _control_segment(self, create=False):
+        if self._control is None:
+            try:
+                self._control = open_shared_segment(self.name)
+            except FileNotFoundError:
+                if not create:
+                    return None
+                self._control = open_shared_segment(self.name, size=_CONTROL_SIZE)
+                _CONTROL.pack_into(self._control.buf, 0, GALLERY_MAGIC, GALLERY_VERSION, 0, 0)
+        return self._control
+
+    def published_generation(self):
+        """The generation currently published, or 0 if nothing has been published yet."""
+        control = self._control_segment()
+        if control is None:
+            return 0
+        for _ in range(5):
+            magic, version, seq, generation = _CONTROL.unpack_from(control.buf, 0)
+            if magic != GALLERY_MAGIC or version != GALLERY_VERSION:
+                return 0
+            if seq % 2 == 0 and _CONTROL.unpack_from(control.buf, 0)[2] == seq:
+                return generation
+        return 0 # A publisher is mid-swap; the caller will look again on its next check
+
+    def publish(self, gallery, meta):
+        """
+        Writes the gallery's rows plus `meta` (JSON-serializable, e.g. the DB fingerprint it was
+        synced to) as a new generation and makes it current. Returns the new generation number.
+        """
+        with exclusive_file_lock(self.lock_path):
+            control = self._control_segment(create=True)
+            _, _, seq, previous = _CONTROL.unpack_from(control.buf, 0)
+            generation = previous + 1
+            count, dim = len(gallery), gallery.dim
+            meta_bytes = json.dumps(dict(meta, names=gallery.names, student_id_numbers=gallery.student_id_numbers),
+                                    default=str).encode("utf-8")
+            size = _DATA_HEADER_SIZE + count * (8 + dim * 4 + 4) + len(meta_bytes)
+            segment = open_shared_segment(_data_name(self.name, generation), size=size)
+            try:
+                ids, embeddings, sq_norms, meta_offset = _array_views(segment.buf, count, dim)
+                ids[:] = gallery.ids
+                embeddings[:] = gallery.embeddings
+                sq_norms[:] = gallery.sq_norms
+                segment.buf[meta_offset:meta_offset + len(meta_bytes)] = meta_bytes
+                _DATA_HEADER.pack_into(segment.buf, 0, GALLERY_MAGIC, GALLERY_VERSION, generation, count, dim, len(meta_bytes))
+                del ids, embeddings, sq_norms
+            finally:
+                segment.close()
+
+            struct.pack_into("<Q", control.buf, 8, seq + 1) # Odd: swap in progress
+            struct.pack_into("<Q", control.buf, 16, generation)
+            struct.pack_into("<Q", control.buf, 8, seq + 2)
+            if previous:
+                unlink_shared_segment(_data_name(self.name, previous))
+        return generation
+
+    def adopt(self, gallery):
+        """
+        Loads the current generation into `gallery` (zero-copy, read-only) if it is newer than the
+        one this process already mirrors. Returns the generation's meta dict, or None if nothing changed.
+        """
+        generation = self.published_generation()
+        if generation == 0 or generation == self.adopted_generation:
+            return None
+        try:
+            segment = open_shared_segment(_data_name(self.name, generation))
+        except FileNotFoundError:
+            return None # Superseded while we looked; the next check picks up the newer one
+        magic, version, segment_generation, count, dim, meta_len = _DATA_HEADER.unpack_from(segment.buf, 0)
+        if (magic != GALLERY_MAGIC or version != GALLERY_VERSION or segment_generation != generation
+                or dim != gallery.dim):
+            return None
+        ids, embeddings, sq_norms, meta_offset = _array_views(segment.buf, count, dim)
+        meta = json.loads(bytes(segment.buf[meta_offset:meta_offset + meta_len]).decode("utf-8"))
+        for array in (ids, embeddings, sq_norms):
+            array.flags.writeable = False
+        gallery.load_shared(ids, embeddings, sq_norms, meta.pop("names"), meta.pop("student_id_numbers"), backing=segment)
+        self.adopted_generation = generation
+        return meta
+
+    def unlink(self):
+        """Removes the published gallery (e.g. before switching databases); readers keep their mapping."""
+        with exclusive_file_lock(self.lock_path):
+            generation = self.published_generation()
+            if generation:
+                unlink_shared_segment(_data_name(self.name, generation))
+            if self._control is not None:
+                self._control.close()
+                self._control = None
+            unlink_shared_segment(self.name)
+        self.adopted_generation = 0
@@ -0,0 +1,190 @@
+# app/status_board.py
+
+import json
+import time
+import struct
+import hashlib
+import threading
+from app.shared_gallery import open_shared_segment, unlink_shared_segment, exclusive_file_lock
+
+BOARD_MAGIC = 0x45585342 # "EXSB"
+BOARD_VERSION = 1
+DEFAULT_SLOT_COUNT = 256 # Exams that can have a live status at the same time
+DEFAULT_PAYLOAD_BYTES = 480 # Largest JSON status document a slot holds
+# Header: magic, version, slot_count, payload_bytes
+_HEADER = struct.Struct("<IIII")
+_HEADER_SIZE = 64
+# Slot header: key (exam_id + 1; 0 = never used), seq (odd while being written), written_at (epoch seconds), length
+_SLOT_HEADER = struct.Struct("<QQdI")
+_SLOT_HEADER_SIZE = 32
+
+
+def default_status_board_name(database_uri):
+    """Shared memory name of the live status board for one database."""
+    return "exsb_" + hashlib.sha1(database_uri.encode("utf-8")).hexdigest()[:10]
+
+
+class SharedStatusBoard:
+    """
+    Latest recognition status per exam in POSIX shared memory, readable by every worker.
+
+    The board is a fixed array of slots addressed by open addressing on the exam ID, so a lookup
+    touches one slot in the common case. Each slot holds a small JSON document plus the time it
+    was written; a document older than `ttl_seconds` reads as missing, and the slot of an expired
+    exam is reused by the next exam that needs one. Several writers may update one exam (the
+    stream pipeline, the ingest batcher, other workers), so every write, clear and slot claim is
+    serialized across processes and threads with an flock on `lock_path`; a slot's sequence number
+    is odd while it is written, and readers retry instead of waiting for the lock.
+
+    Offers the same get / set / pop / stats interface as ExpiringCache, which is used instead when
+    shared memory is disabled.
+    """
+
+    def __init__(self, name, lock_path, ttl_seconds, slot_count=DEFAULT_SLOT_COUNT,
+                 payload_bytes=DEFAULT_PAYLOAD_BYTES):
+        self.name = name
+        self.lock_path = lock_path
+        self.ttl_seconds = ttl_seconds
+        self._slot_count = slot_count
+        self._payload_bytes = payload_bytes
+        self._segment = None
+        self._open_lock = threading.Lock()
+        self._slot_of = {} # {exam_id: slot} as last seen by this process (verified on every access)
+        self._stats = {"hits": 0, "misses": 0, "expired": 0, "evicted": 0, "oversized": 0}
+
+    def _buffer(self):
+        """The board's buffer, creating the segment on first use by any process."""
+        if self._segment is None:
+            with self._open_lock:
+                if self._segment is None:
+                    with exclusive_file_lock(self.lock_path):
+                        try:
+                            segment = open_shared_segment(self.name)
+                        except FileNotFoundError:
+                            size = _HEADER_SIZE + self._slot_count * (_SLOT_HEADER_SIZE + self._payload_bytes)
+                            segment = open_shared_segment(self.name, size=size)
+                            _HEADER.pack_into(segment.buf, 0, BOARD_MAGIC, BOARD_VERSION, self._slot_count, self._payload_bytes)
+                    magic, version, slot_count, payload_bytes = _HEADER.unpack_from(segment.buf, 0)
+                    if magic != BOARD_MAGIC or version != BOARD_VERSION:
+                        raise ValueError(f"Shared memory {self.name} is not a version {BOARD_VERSION} status board.")
+                    self._slot_count, self._payload_bytes = slot_count, payload_bytes # The creator's layout wins
+                    self._segment = segment
+        return self._segment.buf
+
+    def _offset(self, slot):
+        return _HEADER_SIZE + slot * (_SLOT_HEADER_SIZE + self._payload_bytes)
+
+    def _probe(self, exam_id):
+        start = exam_id % self._slot_count
+        for step in range(self._slot_count):
+            yield (start + step) % self._slot_count
+
+    def _find(self, buf, exam_id):
+        """The slot currently holding `exam_id`, or None."""
+        key = exam_id + 1
+        slot = self._slot_of.get(exam_id)
+        if slot is not None and _SLOT_HEADER.unpack_from(buf, self._offset(slot))[0] == key:
+            return slot
+        for slot in self._probe(exam_id):
+            slot_key = _SLOT_HEADER.unpack_from(buf, self._offset(slot))[0]
+            if slot_key == key:
+                self._slot_of[exam_id] = slot
+                return slot
+            if slot_key == 0:
+                return None # Slots are never emptied again, so the probe chain ends here
+        return None
+
+    def _claim(self, buf, exam_id, now):
+        """Takes a never-used or expired slot for `exam_id`. The caller holds the board's flock."""
+        for slot in self._probe(exam_id):
+            slot_key, seq, written_at, _ = _SLOT_HEADER.unpack_from(buf, self._offset(slot))
+            if slot_key == 0 or written_at + self.ttl_seconds < now:
+                if slot_key != 0:
+                    self._stats["evicted"] += 1
+                # Stamped now, so the claim itself cannot be mistaken for an expired slot and taken
+                _SLOT_HEADER.pack_into(buf, self._offset(slot), exam_id + 1, seq, now, 0)
+                self._slot_of[exam_id] = slot
+                return slot
+        return None # Every slot holds a live status
+
+    def set(self, exam_id, document):
+        """Publishes an exam's status document (JSON-serializable), restarting its TTL."""
+        data = json.dumps(document, default=str).encode("utf-8")
+        if len(data) > self._payload_bytes:
+            self._stats["oversized"] += 1
+            return
+        buf = self._buffer()
+        with exclusive_file_lock(self.lock_path):
+            now = time.time()
+            slot = self._find(buf, exam_id)
+            if slot is None:
+                slot = self._claim(buf, exam_id, now)
+                if slot is None:
+                    self._stats["evicted"] += 1 # Board full: this status is dropped
+                    return
+            offset = self._offset(slot)
+            key, seq, written_at, length = _SLOT_HEADER.unpack_from(buf, offset)
+            seq = (seq + 1) | 1 # Odd: write in progress
+            # The old written_at stays, so the slot never looks expired (and claimable) mid-write
+            _SLOT_HEADER.pack_into(buf, offset, key, seq, written_at, length)
+            buf[offset + _SLOT_HEADER_SIZE:offset + _SLOT_HEADER_SIZE + len(data)] = data
+            _SLOT_HEADER.pack_into(buf, offset, key, seq + 1, now, len(data))
+
+    def get(self, exam_id, default=None):
+        """Returns the exam's live status document, or `default` if it has none or it expired."""
+        buf = self._buffer()
+        slot = self._find(buf, exam_id)
+        if slot is not None:
+            offset = self._offset(slot)
+            for _ in range(5):
+                key, seq, written_at, length = _SLOT_HEADER.unpack_from(buf, offset)
+                if key != exam_id + 1:
+                    break # Reclaimed for another exam meanwhile
+                if seq % 2:
+                    continue
+                data = bytes(buf[offset + _SLOT_HEADER_SIZE:offset + _SLOT_HEADER_SIZE + length])
+                if _SLOT_HEADER.unpack_from(buf, offset)[1] != seq:
+                    continue
+                if not length:
+                    break # Cleared (pop) or claimed but not written yet
+                if written_at + self.ttl_seconds < time.time():
+                    self._stats["expired"] += 1
+                    break
+                try:
+                    document = json.loads(data.decode("utf-8"))
+                except ValueError:
+                    continue # Torn read that slipped past the sequence check; read again
+                self._stats["hits"] += 1
+                return document
+        self._stats["misses"] += 1
+        return default
+
+    def pop(self, exam_id, default=None):
+        """Clears an exam's status (the slot stays claimed until it is reused). Returns the old document."""
+        document = self.get(exam_id, default)
+        buf = self._buffer()
+        with exclusive_file_lock(self.lock_path):
+            slot = self._find(buf, exam_id)
+            if slot is not None:
+                offset = self._offset(slot)
+                key, seq, _, _ = _SLOT_HEADER.unpack_from(buf, offset)
+                _SLOT_HEADER.pack_into(buf, offset, key, (seq | 1) + 1, 0.0, 0)
+        return document
+
+    def stats(self):
+        """This process's counters plus the number of live statuses on the board (a full scan)."""
+        buf = self._buffer()
+        now = time.time()
+        live = 0
+        for slot in range(self._slot_count):
+            key, _, written_at, length = _SLOT_HEADER.unpack_from(buf, self._offset(slot))
+            if key and length and written_at + self.ttl_seconds >= now:
+                live += 1
+        return dict(self._stats, entries=live, max_entries=self._slot_count, ttl_seconds=self.ttl_seconds)
+
+    def unlink(self):
+        """Removes the board from shared memory (other processes keep their mapping)."""
+        if self._segment is not None:
+            self._segment.close()
+            self._segment = None
+        unlink_shared_segment(self.name)
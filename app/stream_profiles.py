@@ -0,0 +1,109 @@
+# app/stream_profiles.py
+
+import threading
+from collections import namedtuple
+import cv2
+
+DEFAULT_JPEG_QUALITY = 70 # Quality of the stream's own encode (profiles with quality None)
+DEFAULT_PROFILE_NAME = "full"
+
+# A viewer's stream settings. None means "no limit" (max_fps, max_width) or "the stream's own
+# encode" (quality: the camera's JPEG when it is passed through, else DEFAULT_JPEG_QUALITY).
+StreamProfile = namedtuple("StreamProfile", ["name", "max_fps", "max_width", "quality"])
+
+DEFAULT_STREAM_PROFILES = {
+    "full": {"max_fps": None, "max_width": None, "quality": None},
+    "medium": {"max_fps": 10, "max_width": 640, "quality": 60},
+    "low": {"max_fps": 5, "max_width": 320, "quality": 45}
+}
+
+
+def stream_profiles(config):
+    """{name: StreamProfile} from the STREAM_PROFILES setting (DEFAULT_STREAM_PROFILES if unset)."""
+    profiles = config.get('STREAM_PROFILES') or DEFAULT_STREAM_PROFILES
+    return {
+        name: StreamProfile(name, settings.get("max_fps"), settings.get("max_width"), settings.get("quality"))
+        for name, settings in profiles.items()
+    }
+
+
+def resolve_stream_profile(config, name=None):
+    """
+    The profile called `name`, or the STREAM_DEFAULT_PROFILE if `name` is empty or unknown.
+    Returns:
+        tuple: (StreamProfile, bool) - the profile, and whether `name` was recognized.
+    """
+    profiles = stream_profiles(config)
+    default = profiles.get(config.get('STREAM_DEFAULT_PROFILE', DEFAULT_PROFILE_NAME)) \
+        or StreamProfile(DEFAULT_PROFILE_NAME, None, None, None)
+    if not name:
+        return default, True
+    profile = profiles.get(name)
+    return (profile, True) if profile is not None else (default, False)
+
+
+_PART_HEADER = b'--frame\r\nContent-Type: image/jpeg\r\n\r\n'
+_PART_TRAILER = b'\r\n'
+
+
+def multipart_chunk(jpeg):
+    """
+    Wraps one JPEG (bytes, or a uint8 array such as cv2.imencode's output) as a part of the
+    multipart/x-mixed-replace video stream. The JPEG is copied exactly once, straight into the
+    finished chunk, instead of once by tobytes() and again by each concatenation.
+    """
+    return b''.join((_PART_HEADER, jpeg, _PART_TRAILER))
+
+
+class StreamFrame:
+    """
+    One frame of an exam stream, encoded on demand for each viewer profile.
+
+    The pipeline publishes the (annotated) frame once; each viewer asks for the chunk matching
+    its profile. Encoded variants are cached on the frame by (width, quality), so any number of
+    viewers on identical profiles cost one resize + encode per frame, and variants nobody asks
+    for are never encoded. The frame must not be modified once published.
+    """
+
+    def __init__(self, frame, jpeg=None, jpeg_quality=DEFAULT_JPEG_QUALITY):
+        """
+        Args:
+            frame (numpy.ndarray): BGR frame as it should be shown at full size.
+            jpeg (bytes-like, optional): An existing encode of `frame` (e.g. the camera's own JPEG), used
+                for full-size profiles that do not ask for a specific quality.
+            jpeg_quality (int): Quality of the stream's own encode when `jpeg` is None.
+        """
+        self.frame = frame
+        self.jpeg_quality = jpeg_quality
+        self._lock = threading.Lock() # Serializes encodes, so concurrent viewers of a variant share one
+        self._variants = {} # {(width, quality): multipart chunk}
+        if jpeg is not None:
+            self._variants[(frame.shape[1], None)] = multipart_chunk(jpeg)
+
+    def render(self, profile):
+        """
+        The multipart chunk for a viewer profile, encoding it if no viewer asked for it yet.
+        Returns:
+            tuple: (bytes or None, bool) - the chunk (None if encoding failed), and whether this
+            call encoded it (False for a cache hit).
+        """
+        height, width = self.frame.shape[:2]
+        target_width = min(width, profile.max_width) if profile.max_width else width
+        key = (target_width, profile.quality)
+        chunk = self._variants.get(key)
+        if chunk is not None:
+            return chunk, False
+        with self._lock:
+            chunk = self._variants.get(key)
+            if chunk is not None:
+                return chunk, False # Encoded by another viewer while we waited
+            image = self.frame
+            if target_width < width:
+                target_height = max(1, round(height * target_width / width))
+                image = cv2.resize(image, (target_width, target_height), interpolation=cv2.INTER_AREA)
+            quality = profile.quality if profile.quality is not None else self.jpeg_quality
+            ret, buffer = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, int(quality)])
+            if not ret:
+                return None, True
+            chunk = self._variants[key] = multipart_chunk(buffer)
+            return chunk, True
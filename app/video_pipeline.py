@@ -0,0 +1,253 @@
+# app/video_pipeline.py
+
+import math
+import time
+import tracemalloc
+from collections import deque
+import cv2
+import numpy as np
+
+DEFAULT_TARGET_FPS = 10.0 # Output frame rate the stream should hold
+DEFAULT_MAX_RECOGNITION_INTERVAL = 30 # Never go longer than this many frames without recognition
+LATENCY_SMOOTHING = 0.2 # Weight of the newest sample in the latency moving averages
+RATE_WINDOW_SECONDS = 5.0 # Window for the measured output / recognition rates
+MOTION_SAMPLE_WIDTH = 160 # Width of the grayscale thumbnail used for frame differencing
+DEFAULT_MOTION_PIXEL_THRESHOLD = 25 # Per-pixel intensity change (0-255) that counts as changed
+DEFAULT_MOTION_AREA_THRESHOLD = 0.01 # Fraction of changed pixels that counts as a scene change
+DEFAULT_MOTION_MAX_IDLE_SECONDS = 10.0 # Run detection at least this often even on a static scene
+
+
+class AdaptiveRecognitionScheduler:
+    """
+    Decides on which frames face recognition runs so that the stream holds a target output FPS.
+
+    It keeps moving averages of the recognition latency and of the cost of an ordinary frame
+    (capture, annotation, JPEG encode). With a frame budget of 1 / target_fps, recognition runs
+    every `interval` frames, where interval = ceil(recognition_latency / spare_time_per_frame).
+    Frames in between are annotated with the last known results.
+    """
+
+    def __init__(self, target_fps=DEFAULT_TARGET_FPS, max_interval=DEFAULT_MAX_RECOGNITION_INTERVAL):
+        self.target_fps = target_fps
+        self.max_interval = max_interval
+        self.interval = 1
+        self.recognition_seconds = None # Moving average of one recognition pass
+        self.frame_seconds = None # Moving average of a frame excluding recognition
+        self._frames_since_recognition = None # None forces recognition on the first frame
+        self._frame_times = deque()
+        self._recognition_times = deque()
+
+    def should_recognize(self):
+        """True if recognition should run on the current frame."""
+        return self._frames_since_recognition is None or self._frames_since_recognition + 1 >= self.interval
+
+    def record_recognition(self, seconds):
+        """Records the latency of a recognition pass run on the current frame."""
+        self.recognition_seconds = _moving_average(self.recognition_seconds, seconds)
+        self._frames_since_recognition = -1 # record_frame for this same frame brings it to 0
+        self._recognition_times.append(time.monotonic())
+        self._update_interval()
+
+    def record_frame(self, seconds):
+        """Records the cost of the current frame, excluding any recognition time."""
+        self.frame_seconds = _moving_average(self.frame_seconds, seconds)
+        if self._frames_since_recognition is not None:
+            self._frames_since_recognition += 1
+        self._frame_times.append(time.monotonic())
+        self._update_interval()
+
+    def _update_interval(self):
+        if not self.recognition_seconds:
+            return
+        spare_seconds = 1.0 / self.target_fps - (self.frame_seconds or 0.0)
+        if spare_seconds <= 0:
+            self.interval = self.max_interval # Even plain frames miss the target; recognise rarely
+        else:
+            self.interval = max(1, min(self.max_interval, math.ceil(self.recognition_seconds / spare_seconds)))
+
+    def snapshot(self):
+        """Current decisions and measured rates, for logging and the pipeline stats endpoint."""
+        now = time.monotonic()
+        for times in (self._frame_times, self._recognition_times):
+            while times and now - times[0] > RATE_WINDOW_SECONDS:
+                times.popleft()
+        return {
+            "target_fps": self.target_fps,
+            "recognition_interval": self.interval,
+            "recognition_latency_ms": round(self.recognition_seconds * 1000.0, 1) if self.recognition_seconds else None,
+            "frame_latency_ms": round(self.frame_seconds * 1000.0, 1) if self.frame_seconds else None,
+            "output_fps": _rate(self._frame_times, now),
+            "recognition_fps": _rate(self._recognition_times, now)
+        }
+
+
+class FrameBuffers:
+    """
+    Preallocated scratch arrays for the per-frame conversions of one stream.
+
+    Converting every camera frame to RGB (for dlib) or downscaling it for detection used to
+    allocate a fresh frame-sized array each time, e.g. np.ascontiguousarray(frame[:, :, ::-1]).
+    Here each conversion writes into a named buffer through OpenCV's `dst=` argument; a buffer
+    is only reallocated when the frame size changes. The contents of a buffer are overwritten by
+    the next frame, so they must not be kept or handed to another thread or process.
+    """
+
+    def __init__(self):
+        self._buffers = {} # {name: numpy.ndarray}
+        self.stats = {"allocations": 0}
+
+    def get(self, name, shape, dtype=np.uint8):
+        """The buffer called `name`, (re)allocated if it does not have this shape and dtype yet."""
+        buffer = self._buffers.get(name)
+        if buffer is None or buffer.shape != tuple(shape) or buffer.dtype != dtype:
+            buffer = self._buffers[name] = np.empty(shape, dtype=dtype)
+            self.stats["allocations"] += 1
+        return buffer
+
+    def rgb(self, frame_bgr):
+        """The frame converted to contiguous RGB, written into this stream's RGB buffer."""
+        return cv2.cvtColor(frame_bgr, cv2.COLOR_BGR2RGB, dst=self.get("rgb", frame_bgr.shape))
+
+
+class MotionGate:
+    """
+    Cheap scene-change gate in front of face detection.
+
+    Each checked frame is reduced to a small blurred grayscale thumbnail and compared with the
+    thumbnail of the previous check. Detection is only worth running when enough pixels changed,
+    when a face track is still active (a seated student may not move), or when the scene has been
+    static for longer than max_idle_seconds (a safety net for slow changes such as lighting).
+    """
+
+    def __init__(self, pixel_threshold=DEFAULT_MOTION_PIXEL_THRESHOLD, area_threshold=DEFAULT_MOTION_AREA_THRESHOLD,
+                 max_idle_seconds=DEFAULT_MOTION_MAX_IDLE_SECONDS):
+        self.pixel_threshold = pixel_threshold
+        self.area_threshold = area_threshold
+        self.max_idle_seconds = max_idle_seconds
+        self._previous = None
+        self._last_detection = 0.0
+        self._buffers = FrameBuffers()
+        self._thumbnail_index = 0 # Thumbnails alternate between two buffers: this frame's and the previous one's
+        # Counters for judging how much detection work the gate saves
+        self.stats = {"checked": 0, "skipped": 0}
+
+    def _thumbnail(self, frame_bgr):
+        height, width = frame_bgr.shape[:2]
+        scale = MOTION_SAMPLE_WIDTH / float(width)
+        size = (max(1, int(height * scale)), MOTION_SAMPLE_WIDTH)
+        small = cv2.resize(frame_bgr, size[::-1], dst=self._buffers.get("small", size + (3,)), interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY, dst=self._buffers.get("gray", size))
+        self._thumbnail_index ^= 1
+        # Suppresses sensor noise that would read as motion
+        return cv2.GaussianBlur(gray, (5, 5), 0, dst=self._buffers.get(f"thumbnail{self._thumbnail_index}", size))
+
+    def changed_fraction(self, frame_bgr):
+        """Fraction of thumbnail pixels that changed since the previous call (1.0 on the first call)."""
+        thumbnail = self._thumbnail(frame_bgr)
+        previous, self._previous = self._previous, thumbnail
+        if previous is None or previous.shape != thumbnail.shape:
+            return 1.0
+        diff = cv2.absdiff(thumbnail, previous, dst=self._buffers.get("diff", thumbnail.shape))
+        # THRESH_BINARY keeps pixels strictly above the threshold, like `diff > pixel_threshold`
+        cv2.threshold(diff, self.pixel_threshold, 255, cv2.THRESH_BINARY, dst=diff)
+        return cv2.countNonZero(diff) / float(diff.size)
+
+    def should_detect(self, frame_bgr, tracks_active=False, now=None):
+        """
+        True if face detection should run on this frame.
+
+        Args:
+            frame_bgr: The camera frame (BGR, as returned by cv2).
+            tracks_active: True while the face tracker still holds tracks.
+            now: Optional time.monotonic() timestamp.
+        """
+        now = time.monotonic() if now is None else now
+        self.stats["checked"] += 1
+        moved = self.changed_fraction(frame_bgr) >= self.area_threshold
+        if moved or tracks_active or now - self._last_detection >= self.max_idle_seconds:
+            self._last_detection = now
+            return True
+        self.stats["skipped"] += 1
+        return False
+
+
+def measure_frame_allocations(frames=200, width=640, height=480, detection_scale=0.5, warmup=20, seed=0):
+    """
+    Traces (tracemalloc) the memory the per-frame conversions of the live pipeline allocate, for the
+    old copying steps and for the FrameBuffers / single-copy steps the pipeline uses now: RGB
+    conversion, downscaling for detection, the motion gate and JPEG + multipart wrapping. Face
+    detection itself (dlib) is left out; it allocates the same either way.
+
+    Returns:
+        list: (label, mean_peak_kib_per_frame, retained_kib) tuples, where the peak is the most memory
+        one frame had allocated at once and `retained` is how much traced memory grew from the end of
+        the warm-up to the last frame (flat, i.e. about 0, when nothing accumulates per frame).
+    """
+    from app.stream_profiles import StreamFrame, StreamProfile
+    rng = np.random.default_rng(seed)
+    # A handful of distinct frames, so the encoder and motion gate see changing content
+    source_frames = [rng.integers(0, 255, (height, width, 3), dtype=np.uint8) for _ in range(4)]
+    detection_size = (max(1, int(round(width * detection_scale))), max(1, int(round(height * detection_scale))))
+    full_profile = StreamProfile("full", None, None, None)
+
+    def copying_step(frame, gate, buffers):
+        rgb = np.ascontiguousarray(frame[:, :, ::-1])
+        cv2.resize(np.ascontiguousarray(rgb), detection_size, interpolation=cv2.INTER_AREA)
+        gate.should_detect(frame)
+        ret, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 70])
+        return b'--frame\r\nContent-Type: image/jpeg\r\n\r\n' + buffer.tobytes() + b'\r\n'
+
+    def buffered_step(frame, gate, buffers):
+        rgb = buffers.rgb(frame)
+        cv2.resize(rgb, detection_size, dst=buffers.get("detection", detection_size[::-1] + (3,)),
+                   interpolation=cv2.INTER_AREA)
+        gate.should_detect(frame)
+        return StreamFrame(frame).render(full_profile)[0]
+
+    def legacy_gate():
+        # The motion gate as it was before FrameBuffers: new thumbnail, diff and mask arrays per frame
+        gate = MotionGate()
+        def changed_fraction(frame_bgr):
+            small = cv2.resize(frame_bgr, (MOTION_SAMPLE_WIDTH, int(height * MOTION_SAMPLE_WIDTH / width)),
+                               interpolation=cv2.INTER_AREA)
+            thumbnail = cv2.GaussianBlur(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY), (5, 5), 0)
+            previous, gate._previous = gate._previous, thumbnail
+            return 1.0 if previous is None else float((cv2.absdiff(thumbnail, previous) > gate.pixel_threshold).mean())
+        gate.changed_fraction = changed_fraction
+        return gate
+
+    results = []
+    was_tracing = tracemalloc.is_tracing()
+    if not was_tracing:
+        tracemalloc.start()
+    try:
+        for label, step, gate in (("copying", copying_step, legacy_gate()), ("buffered", buffered_step, MotionGate())):
+            peak_total = 0 # A running sum: a growing list of samples would itself show up as retained memory
+            baseline = None
+            buffers = FrameBuffers()
+            for i in range(warmup + frames):
+                if i == warmup:
+                    baseline = tracemalloc.get_traced_memory()[0]
+                before = tracemalloc.get_traced_memory()[0]
+                tracemalloc.reset_peak()
+                chunk = step(source_frames[i % len(source_frames)], gate, buffers)
+                del chunk
+                if i >= warmup:
+                    peak_total += tracemalloc.get_traced_memory()[1] - before
+            retained = tracemalloc.get_traced_memory()[0] - baseline
+            results.append((label, peak_total / frames / 1024.0, retained / 1024.0))
+    finally:
+        if not was_tracing:
+            tracemalloc.stop()
+    return results
+
+
+def _rate(times, now):
+    """Events per second over the retained window (or over the time since the first event if shorter)."""
+    if not times:
+        return 0.0
+    return round(len(times) / max(min(now - times[0], RATE_WINDOW_SECONDS), 1e-3), 2)
+
+
+def _moving_average(current, sample):
+    return sample if current is None else (1.0 - LATENCY_SMOOTHING) * current + LATENCY_SMOOTHING * sample
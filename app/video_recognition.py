@@ -0,0 +1,243 @@
+# app/video_recognition.py
+
+import os
+import json
+import time
+import hashlib
+from datetime import datetime, timedelta, timezone
+import cv2
+from app import db
+from app.attendance_log import attendance_bucket, merge_log_rows, upsert_log_statement, DEFAULT_BUCKET_SECONDS
+from app.face_tracking import associate_boxes, DEFAULT_IOU_THRESHOLD
+
+DEFAULT_CHUNK_SECONDS = 30.0 # Video time handled by one worker task
+DEFAULT_SAMPLE_FPS = 5.0 # Frames per second of video that are actually decoded and searched for faces
+DEFAULT_REENCODE_SECONDS = 1.0 # A face followed from frame to frame is re-encoded at most this often
+STATE_VERSION = 1
+
+
+def probe_video(path):
+    """
+    Frame rate, frame count and duration of a video file.
+    Returns:
+        dict: {"fps", "frame_count", "duration"}. Raises ValueError if OpenCV cannot read the file.
+    """
+    capture = cv2.VideoCapture(path)
+    try:
+        if not capture.isOpened():
+            raise ValueError(f"Cannot open video {path}.")
+        fps = capture.get(cv2.CAP_PROP_FPS) or 0.0
+        frame_count = int(capture.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+    finally:
+        capture.release()
+    if fps <= 0 or frame_count <= 0:
+        raise ValueError(f"Video {path} does not report its frame rate and length.")
+    return {"fps": fps, "frame_count": frame_count, "duration": frame_count / fps}
+
+
+def plan_chunks(frame_count, fps, chunk_seconds):
+    """Splits a video into [start_frame, end_frame) chunks of about `chunk_seconds` each."""
+    frames_per_chunk = max(1, int(round(chunk_seconds * fps)))
+    return [(index, start, min(start + frames_per_chunk, frame_count))
+            for index, start in enumerate(range(0, frame_count, frames_per_chunk))]
+
+
+def detect_chunk(path, chunk_index, start_frame, end_frame, fps, sample_fps, detection_scale, reencode_seconds,
+                 iou_threshold=DEFAULT_IOU_THRESHOLD):
+    """
+    Worker-side half of offline recognition: detection and encodings for one chunk of a video.
+
+    Frames between samples are only grabbed, not decoded. Faces that continue a box of the previous
+    sample (by IoU, as the live FaceTracker associates them) are re-encoded at most every
+    `reencode_seconds`; matching, the cooldown and logging happen in the parent, which sees the
+    chunks in order.
+
+    Returns:
+        dict: {"chunk", "sampled_frames", "faces", "encodings": [(offset_seconds, [encoding, ...]), ...]}
+    """
+    import face_recognition
+    from app.face_rec_utils import detect_face_locations # Imported here: loads the app package once per worker
+    capture = cv2.VideoCapture(path)
+    capture.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+    step = max(1.0, fps / sample_fps) if sample_fps else 1.0
+    next_sample = float(start_frame)
+    tracks = [] # [(box, last_encoded_offset)] of the previous sample
+    encodings = []
+    sampled = faces = 0
+    try:
+        for frame_number in range(start_frame, end_frame):
+            if frame_number < next_sample:
+                if not capture.grab():
+                    break
+                continue
+            success, frame = capture.read()
+            if not success:
+                break
+            next_sample += step
+            sampled += 1
+            offset = frame_number / fps
+            frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            locations = detect_face_locations(frame_rgb, scale=detection_scale)
+            faces += len(locations)
+            matched = associate_boxes([box for box, _ in tracks], locations, iou_threshold)
+            last_encoded = [tracks[t][1] if t is not None else None for t in matched]
+            to_encode = [i for i, last in enumerate(last_encoded) if last is None or offset - last >= reencode_seconds]
+            if to_encode:
+                found = face_recognition.face_encodings(frame_rgb, [locations[i] for i in to_encode])
+                encodings.append((offset, found))
+                for i in to_encode:
+                    last_encoded[i] = offset
+            tracks = list(zip(locations, last_encoded))
+    finally:
+        capture.release()
+    return {"chunk": chunk_index, "sampled_frames": sampled, "faces": faces, "encodings": encodings}
+
+
+def default_state_path(instance_path, video_path, exam_id, chunk_seconds, sample_fps):
+    """Resume state file of one (video, exam, chunking) run, under the instance folder."""
+    key = f"{os.path.abspath(video_path)}|{exam_id}|{chunk_seconds}|{sample_fps}"
+    return os.path.join(instance_path, "video_recognition", hashlib.sha1(key.encode("utf-8")).hexdigest()[:16] + ".json")
+
+
+def _load_state(state_path):
+    try:
+        with open(state_path) as state_file:
+            state = json.load(state_file)
+    except FileNotFoundError:
+        return None
+    return state if state.get("version") == STATE_VERSION else None
+
+
+def _save_state(state_path, state):
+    """Writes the state atomically, so an interruption leaves either the old or the new file."""
+    os.makedirs(os.path.dirname(os.path.abspath(state_path)), exist_ok=True)
+    temporary_path = state_path + ".tmp"
+    with open(temporary_path, "w") as state_file:
+        json.dump(state, state_file)
+    os.replace(temporary_path, state_path)
+
+
+def recording_start(video_path, duration, start=None):
+    """
+    Naive UTC datetime the recording started at (the Log table's timestamp convention).
+    `start` is an ISO 8601 string; without a UTC offset it is taken as this machine's local time.
+    Without `start`, the file's modification time minus the video's duration is assumed.
+    """
+    if start:
+        moment = datetime.fromisoformat(start)
+        return moment.astimezone(timezone.utc).replace(tzinfo=None) # Naive values are treated as local time
+    modified = datetime.fromtimestamp(os.path.getmtime(video_path), tz=timezone.utc).replace(tzinfo=None)
+    return modified - timedelta(seconds=duration)
+
+
+def recognize_video(app, exam_id, video_path, start=None, chunk_seconds=DEFAULT_CHUNK_SECONDS,
+                    sample_fps=DEFAULT_SAMPLE_FPS, workers=None, state_path=None, restart=False, progress=None):
+    """
+    Recognizes students in a recorded video and writes their attendance logs, as live mode would
+    have if the camera had been running while the video was recorded.
+
+    The video is split into chunks that run detect_chunk on a process pool; chunk results are
+    consumed in video order, identified against the exam gallery with the live matching rules
+    (identify_encodings) and the live per-student cooldown (LOG_COOLDOWN_SECONDS, measured in video
+    time), and upserted into the Log table in one statement per chunk with timestamps of the
+    recording start plus the video offset. After each chunk's commit the progress (completed
+    chunks and the cooldown state) is saved to a JSON state file, so an interrupted run continues
+    where it stopped when started again with the same arguments.
+
+    Args:
+        app: The Flask app (the caller must have pushed its app context).
+        exam_id (int): Exam to log attendance for.
+        video_path (str): Any video file OpenCV can read.
+        start (str, optional): Recording start time, see recording_start.
+        chunk_seconds (float): Video time per worker task.
+        sample_fps (float): Frames per second of video searched for faces.
+        workers (int, optional): Worker processes; None uses RECOGNITION_WORKERS (one per CPU core if
+            unset), 0 processes the chunks in this process.
+        state_path (str, optional): Resume state file (default under instance/video_recognition/).
+        restart (bool): Ignore any saved progress and start from the first chunk.
+        progress (callable, optional): Called with a dict after every chunk.
+
+    Returns:
+        dict: The final state (chunks, logs written, sampled frames, faces, ...).
+    """
+    from app.models import Exam
+    from app.face_rec_utils import load_known_faces_from_db, build_exam_gallery, identify_encodings, LOG_COOLDOWN_SECONDS
+    from app.recognition_workers import resolve_worker_count, get_worker_pool
+
+    if db.session.get(Exam, exam_id) is None:
+        raise ValueError(f"Exam {exam_id} not found.")
+    video = probe_video(video_path)
+    chunks = plan_chunks(video["frame_count"], video["fps"], chunk_seconds)
+    state_path = state_path or default_state_path(app.instance_path, video_path, exam_id, chunk_seconds, sample_fps)
+    fingerprint = {"size": os.path.getsize(video_path), "mtime": os.path.getmtime(video_path),
+                   "frame_count": video["frame_count"]}
+
+    state = None if restart else _load_state(state_path)
+    if state is not None and state.get("video") != fingerprint:
+        raise ValueError(f"{video_path} changed since the saved progress in {state_path}; rerun with --restart.")
+    if state is None:
+        state = {
+            "version": STATE_VERSION, "video": fingerprint, "exam_id": exam_id,
+            "recording_start": recording_start(video_path, video["duration"], start).isoformat(),
+            "chunks": len(chunks), "completed_chunks": [], "cooldown": {}, # {student_id: video offset of the last log}
+            "logs_written": 0, "sampled_frames": 0, "faces": 0, "encodings": 0
+        }
+        _save_state(state_path, state)
+    started_at = datetime.fromisoformat(state["recording_start"])
+    completed = set(state["completed_chunks"])
+    pending = [chunk for chunk in chunks if chunk[0] not in completed]
+
+    load_known_faces_from_db()
+    if build_exam_gallery(exam_id) is None:
+        raise ValueError(f"Exam {exam_id} not found.")
+    bucket_seconds = app.config.get('LOG_DEDUP_BUCKET_SECONDS', DEFAULT_BUCKET_SECONDS)
+    detection_scale = app.config.get('FACE_DETECTION_SCALE', 1.0)
+    worker_count = resolve_worker_count(app.config.get('RECOGNITION_WORKERS') if workers is None else workers)
+    task_args = [(video_path, index, start_frame, end_frame, video["fps"], sample_fps, detection_scale,
+                  DEFAULT_REENCODE_SECONDS) for index, start_frame, end_frame in pending]
+    if worker_count > 0:
+        pool = get_worker_pool(worker_count)
+        results = pool.map(detect_chunk, *zip(*task_args)) if task_args else [] # Computed ahead, yielded in order
+    else:
+        results = (detect_chunk(*args) for args in task_args)
+
+    run_started = time.monotonic()
+    for done, result in enumerate(results, start=1):
+        rows = []
+        for offset, encodings in result["encodings"]:
+            for face_data, _ in identify_encodings(encodings, exam_id) or []:
+                student_id = face_data['student_id']
+                if student_id is None:
+                    continue # Live mode does not log unknown faces either
+                last_logged = state["cooldown"].get(str(student_id))
+                if last_logged is not None and offset - last_logged < LOG_COOLDOWN_SECONDS:
+                    continue
+                state["cooldown"][str(student_id)] = offset
+                timestamp = started_at + timedelta(seconds=offset)
+                rows.append({"student_id": student_id, "exam_id": exam_id, "timestamp": timestamp,
+                             "status": face_data['status'], "bucket": attendance_bucket(timestamp, bucket_seconds),
+                             "seen_count": 1, "last_seen": timestamp})
+        if rows:
+            db.session.execute(upsert_log_statement(db.engine.dialect.name), merge_log_rows(rows))
+        db.session.commit()
+
+        # Cooldowns that ended before this chunk's end cannot suppress anything later; keep the state small
+        chunk_end = chunks[result["chunk"]][2] / video["fps"]
+        state["cooldown"] = {student: offset for student, offset in state["cooldown"].items()
+                             if chunk_end - offset < LOG_COOLDOWN_SECONDS}
+        state["completed_chunks"].append(result["chunk"])
+        state["logs_written"] += len(rows)
+        state["sampled_frames"] += result["sampled_frames"]
+        state["faces"] += result["faces"]
+        state["encodings"] += sum(len(encodings) for _, encodings in result["encodings"])
+        _save_state(state_path, state)
+
+        if progress is not None:
+            elapsed = time.monotonic() - run_started
+            progress({
+                "chunk": result["chunk"], "completed": len(state["completed_chunks"]), "chunks": len(chunks),
+                "video_seconds": chunk_end, "duration": video["duration"], "logs": len(rows),
+                "logs_written": state["logs_written"],
+                "eta_seconds": elapsed / done * (len(pending) - done)
+            })
+    return dict(state, state_path=state_path)
@@ -0,0 +1,73 @@
+"""Store student.face_embedding as raw float32 bytes instead of a pickled array
+
+Revision ID: d01_float32_face_embedding
+Revises: c01_add_student_updated_at
+Create Date: 2026-10-17 10:00:00.000000
+"""
+import pickle
+
+from alembic import op
+import numpy as np
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd01_float32_face_embedding'
+down_revision = 'c01_add_student_updated_at'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 500 # Rows converted per round trip; keeps memory flat on large galleries
+
+student = sa.table(
+    'student',
+    sa.column('id', sa.Integer),
+    sa.column('face_embedding', sa.LargeBinary),
+    sa.column('face_embedding_new', sa.LargeBinary)
+)
+
+
+def _convert_in_batches(convert):
+    """Reads face_embedding in id order and writes convert(blob) into face_embedding_new, batch by batch."""
+    bind = op.get_bind()
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(student.c.id, student.c.face_embedding)
+            .where(student.c.id > last_id)
+            .where(student.c.face_embedding.isnot(None))
+            .order_by(student.c.id)
+            .limit(BATCH_SIZE)
+        ).fetchall()
+        if not rows:
+            break
+        bind.execute(
+            student.update()
+            .where(student.c.id == sa.bindparam('row_id'))
+            .values(face_embedding_new=sa.bindparam('converted')),
+            [{'row_id': row.id, 'converted': convert(bytes(row.face_embedding))} for row in rows]
+        )
+        last_id = rows[-1].id
+
+
+def _replace_column():
+    """Drops the old face_embedding column and renames face_embedding_new into its place."""
+    with op.batch_alter_table('student', schema=None) as batch_op:
+        batch_op.drop_column('face_embedding')
+        batch_op.alter_column('face_embedding_new', new_column_name='face_embedding')
+
+
+def upgrade():
+    with op.batch_alter_table('student', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('face_embedding_new', sa.LargeBinary(), nullable=True))
+
+    _convert_in_batches(lambda blob: np.asarray(pickle.loads(blob), dtype='<f4').tobytes())
+    _replace_column()
+
+
+def downgrade():
+    with op.batch_alter_table('student', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('face_embedding_new', sa.PickleType(), nullable=True))
+
+    _convert_in_batches(lambda blob: pickle.dumps(np.frombuffer(blob, dtype='<f4').astype(np.float64)))
+    _replace_column()
@@ -0,0 +1,83 @@
+"""Deduplicate attendance logs per time bucket (bucket, seen_count, last_seen + unique key)
+
+Revision ID: e01_log_dedup_buckets
+Revises: d01_float32_face_embedding
+Create Date: 2026-10-17 15:00:00.000000
+"""
+import calendar
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e01_log_dedup_buckets'
+down_revision = 'd01_float32_face_embedding'
+branch_labels = None
+depends_on = None
+
+BUCKET_SECONDS = 60 # Default LOG_DEDUP_BUCKET_SECONDS at the time of this migration
+BATCH_SIZE = 500
+
+log_table = sa.table(
+    'log',
+    sa.column('id', sa.Integer),
+    sa.column('student_id', sa.Integer),
+    sa.column('exam_id', sa.Integer),
+    sa.column('timestamp', sa.DateTime),
+    sa.column('status', sa.String),
+    sa.column('bucket', sa.Integer),
+    sa.column('seen_count', sa.Integer),
+    sa.column('last_seen', sa.DateTime),
+)
+
+
+def upgrade():
+    with op.batch_alter_table('log', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('bucket', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('seen_count', sa.Integer(), server_default='1', nullable=False))
+        batch_op.add_column(sa.Column('last_seen', sa.DateTime(), nullable=True))
+
+    # Backfill buckets and merge the duplicates the old in-process cooldown let through: the oldest
+    # row of each (exam, student, status, bucket) group is kept and counts the others.
+    bind = op.get_bind()
+    groups = {} # {(exam_id, student_id, status, bucket): [keep_id, seen_count, last_seen]}
+    duplicates = []
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(log_table.c.id, log_table.c.exam_id, log_table.c.student_id, log_table.c.status,
+                      log_table.c.timestamp)
+            .where(log_table.c.id > last_id).order_by(log_table.c.id).limit(BATCH_SIZE)
+        ).fetchall()
+        if not rows:
+            break
+        for log_id, exam_id, student_id, status, timestamp in rows:
+            bucket = calendar.timegm(timestamp.utctimetuple()) // BUCKET_SECONDS
+            group = groups.get((exam_id, student_id, status, bucket))
+            if group is None:
+                groups[(exam_id, student_id, status, bucket)] = [log_id, 1, timestamp]
+            else:
+                group[1] += 1
+                group[2] = max(group[2], timestamp)
+                duplicates.append(log_id)
+        last_id = rows[-1][0]
+
+    for (exam_id, student_id, status, bucket), (keep_id, seen_count, last_seen) in groups.items():
+        bind.execute(log_table.update().where(log_table.c.id == keep_id)
+                     .values(bucket=bucket, seen_count=seen_count, last_seen=last_seen))
+    for start in range(0, len(duplicates), BATCH_SIZE):
+        bind.execute(log_table.delete().where(log_table.c.id.in_(duplicates[start:start + BATCH_SIZE])))
+
+    # Every row has a bucket now; NULLs would be distinct in the unique key and skip deduplication
+    with op.batch_alter_table('log', schema=None) as batch_op:
+        batch_op.alter_column('bucket', existing_type=sa.Integer(), nullable=False)
+        batch_op.create_unique_constraint('uq_log_exam_student_status_bucket', ['exam_id', 'student_id', 'status', 'bucket'])
+
+
+def downgrade():
+    # Merged duplicates are not restored; each remaining row keeps its first sighting's timestamp
+    with op.batch_alter_table('log', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_log_exam_student_status_bucket', type_='unique')
+        batch_op.drop_column('last_seen')
+        batch_op.drop_column('seen_count')
+        batch_op.drop_column('bucket')
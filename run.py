@@ -74,6 +74,109 @@ def create_admin_command(username, password):
     db.session.commit()
     print(f"Admin user {username} created successfully.")
 
+@app.cli.command("build-face-index")
+@click.option("--lists", "n_lists", default=None, type=int, help="Number of k-means lists (default ~4*sqrt(N)).")
+@click.option("--iterations", default=10, help="k-means iterations.")
+@click.option("--output", default=None, help="Output path (default: FACE_INDEX_PATH).")
+def build_face_index_command(n_lists, iterations, output):
+    """Builds the approximate nearest-neighbour face index from stored student embeddings."""
+    import numpy as np
+    from app.face_index import build_ivf_index
+    students = Student.query.filter(Student.face_embedding.isnot(None)).all()
+    if not students:
+        print("No student embeddings found; nothing to index.")
+        return
+    embeddings = np.array([student.face_embedding for student in students], dtype=np.float32)
+    index = build_ivf_index(embeddings, [student.id for student in students], n_lists=n_lists, iterations=iterations)
+    output_path = output or app.config['FACE_INDEX_PATH']
+    index.save(output_path)
+    print(f"Face index with {index.n_lists} lists over {len(students)} embeddings written to {output_path}.")
+
+@app.cli.command("export-embeddings")
+@click.option("--output", default=None, help="Output .npy path (default: FACE_SNAPSHOT_PATH).")
+def export_embeddings_command(output):
+    """Exports student embeddings to a memory-mapped snapshot for fast cold starts."""
+    from app.face_rec_utils import export_face_snapshot
+    output_path = output or app.config['FACE_SNAPSHOT_PATH']
+    count = export_face_snapshot(output_path)
+    print(f"Exported {count} embeddings to {output_path} (+ .meta.json sidecar).")
+
+@app.cli.command("benchmark-matching")
+@click.option("--sizes", default="100,1000,8000,20000", help="Comma-separated gallery sizes to benchmark.")
+@click.option("--faces", default=3, help="Faces per frame.")
+@click.option("--repeats", default=50, help="Frames to time per gallery size.")
+def benchmark_matching_command(sizes, faces, repeats):
+    """Times per-frame face matching against synthetic galleries of increasing size."""
+    from app.face_gallery import benchmark_match
+    gallery_sizes = [int(size) for size in sizes.split(',') if size.strip()]
+    print(f"{'Gallery size':>12}  {'ms / frame':>10}  ({faces} faces per frame)")
+    for size, ms_per_frame in benchmark_match(gallery_sizes, faces_per_frame=faces, repeats=repeats):
+        print(f"{size:>12}  {ms_per_frame:>10.3f}")
+
+@app.cli.command("benchmark-frame-allocations")
+@click.option("--frames", default=200, help="Frames to trace per variant.")
+@click.option("--width", default=640, help="Frame width.")
+@click.option("--height", default=480, help="Frame height.")
+@click.option("--detection-scale", default=0.5, help="Downscale factor applied before detection.")
+def benchmark_frame_allocations_command(frames, width, height, detection_scale):
+    """Traces per-frame allocations of the stream's conversions, copying vs. preallocated buffers."""
+    from app.video_pipeline import measure_frame_allocations
+    print(f"{'Variant':>10}  {'KiB / frame':>11}  {'Retained KiB':>12}  ({frames} frames of {width}x{height})")
+    for label, peak_kib, retained_kib in measure_frame_allocations(frames, width, height, detection_scale):
+        print(f"{label:>10}  {peak_kib:>11.1f}  {retained_kib:>12.1f}")
+
+@app.cli.command("recognize-video")
+@click.argument("exam_id", type=int)
+@click.argument("video_path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--start", default=None,
+              help="Recording start time, ISO 8601 (e.g. 2026-06-01T08:45:00; local time unless an offset is given). "
+                   "Default: the file's modification time minus the video's duration.")
+@click.option("--chunk-seconds", default=30.0, help="Video time per worker task.")
+@click.option("--sample-fps", default=5.0, help="Frames per second of video searched for faces.")
+@click.option("--workers", default=None, type=int, help="Worker processes (default: RECOGNITION_WORKERS; 0 = in-process).")
+@click.option("--state", "state_path", default=None, help="Resume state file (default: instance/video_recognition/).")
+@click.option("--restart", is_flag=True, help="Ignore saved progress and process the whole video again.")
+def recognize_video_command(exam_id, video_path, start, chunk_seconds, sample_fps, workers, state_path, restart):
+    """Logs attendance from recorded footage; rerun the same command to resume an interrupted run."""
+    from app.video_recognition import recognize_video
+    from app.recognition_workers import shutdown_worker_pool
+
+    def report(update):
+        print(f"Chunk {update['completed']}/{update['chunks']} "
+              f"({update['video_seconds']:.0f}s / {update['duration']:.0f}s of video): "
+              f"{update['logs']} new logs, {update['logs_written']} in total, ETA {update['eta_seconds']:.0f}s")
+
+    try:
+        result = recognize_video(app, exam_id, video_path, start=start, chunk_seconds=chunk_seconds,
+                                 sample_fps=sample_fps, workers=workers, state_path=state_path, restart=restart,
+                                 progress=report)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    except KeyboardInterrupt:
+        print("Interrupted. Completed chunks are saved; run the same command again to resume.")
+        return
+    finally:
+        shutdown_worker_pool()
+    print(f"Done: {len(result['completed_chunks'])}/{result['chunks']} chunks, {result['sampled_frames']} frames searched, "
+          f"{result['faces']} faces, {result['encodings']} encodings, {result['logs_written']} logs written "
+          f"(recording start {result['recording_start']} UTC). Progress file: {result['state_path']}")
+
+@app.cli.command("recognition-daemon")
+@click.option("--socket", "socket_path", default=None,
+              help="Control socket path (default: RECOGNITION_DAEMON_SOCKET, else instance/recognition.sock).")
+def recognition_daemon_command(socket_path):
+    """Runs the camera and face recognition as a standalone process for the web workers to read from."""
+    import os
+    from app.recognition_daemon import RecognitionDaemon
+    socket_path = socket_path or app.config.get('RECOGNITION_DAEMON_SOCKET') or os.path.join(app.instance_path, 'recognition.sock')
+    os.makedirs(os.path.dirname(os.path.abspath(socket_path)), exist_ok=True)
+    daemon = RecognitionDaemon(app, socket_path, lease_seconds=app.config.get('RECOGNITION_DAEMON_LEASE_SECONDS', 15.0))
+    print(f"Recognition daemon listening on {socket_path}. Set RECOGNITION_DAEMON_SOCKET to this path for the web app.")
+    try:
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        print("Recognition daemon stopped.")
+
 if __name__ == '__main__':
     # Initialize hardware before starting the Flask development server
     initialize_app_hardware()